@@ -0,0 +1,274 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+
+from event_trace import (read_records, PACKET_SENT, BACKPRESSURE_SENT, CRITICAL_BACKPRESSURE_SENT, PACKET_DROPPED,
+                         PACKET_REQUEUED, PACKET_HELD, CREDIT_RESTORED, RESTORE_SENT, BACKPRESSURE_CONTINUED)
+
+READ_BUFFER_SIZE = 1 << 20
+
+# Text "sent" lines do not carry the packet size; every device sends 512-bit packets.
+TEXT_LOG_PACKET_SIZE = 512
+
+SWITCH_PATTERNS = (
+    (b" sent. Remaining", PACKET_SENT,
+     re.compile(rb"Switch: \w+ packet from Device (\d+) to Device (\d+) sent\. .*: (-?\d+) bits\.")),
+    (b"Restored credit", CREDIT_RESTORED,
+     re.compile(rb"Switch: Restored credit for Device (\d+) by ([\d.]+) bytes\. Current credit size: ([-\d.]+)")),
+    (b"Sent RESTORE", RESTORE_SENT, re.compile(rb"Switch: Sent RESTORE signal for Device (\d+)")),
+    (b"Backpressure signal sent", BACKPRESSURE_SENT,
+     re.compile(rb"Switch: Backpressure signal sent to devices for Device (\d+)")),
+    (b"Continued backpressure", BACKPRESSURE_CONTINUED,
+     re.compile(rb"Switch: Continued backpressure for Device (\d+)")),
+    (b"dropped due to", PACKET_DROPPED,
+     re.compile(rb"Switch: Packet from Device (\d+) to Device (\d+) dropped .*remaining: (-?\d+) bits, "
+                rb"Packet size: (\d+)")),
+    (b"Re-queued packet", PACKET_REQUEUED, re.compile(rb"Switch: Re-queued packet \S+ from Device (\d+) back")),
+    (b"held in its", PACKET_HELD, re.compile(rb"Switch: Packet \S+ from Device (\d+) to Device (\d+) held")),
+    (b"Critical backpressure", CRITICAL_BACKPRESSURE_SENT,
+     re.compile(rb"Switch: Critical backpressure signal sent to all devices to stop sending to Device (\d+)")),
+)
+
+DEVICE_SENT_PATTERN = re.compile(rb"Device (\d+): Sent (\d+) packets to the switch\.")
+DEVICE_PROCESSED_PATTERN = re.compile(rb"Device (\d+): Processed packets: \[(.*)\]\.")
+DEVICE_SIGNAL_PATTERN = re.compile(rb"Device (\d+): Received (\w+) signal\.")
+
+
+class FlowStats:
+    def __init__(self):
+        self.packets = 0
+        self.bits = 0
+        self.drops = 0
+        self.requeues = 0
+        self.held = 0
+
+
+class LogAnalyzer:
+    def __init__(self):
+        self.flows = {}
+        self.credit_series = {}
+        self.episodes = {}
+        self.congested_since = {}
+        self.last_drop = {}
+        self.device_sent = {}
+        self.device_processed = {}
+        self.device_signals = {}
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.lines = 0
+
+    def flow(self, source_device, target_device):
+        stats = self.flows.get((source_device, target_device))
+        if stats is None:
+            stats = self.flows[(source_device, target_device)] = FlowStats()
+        return stats
+
+    def observe_time(self, timestamp):
+        # Inputs are fed one file after another, so the span is tracked as a min / max rather than by order.
+        if self.first_timestamp is None or timestamp < self.first_timestamp:
+            self.first_timestamp = timestamp
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+
+    def record_credit(self, timestamp, target_device, credit):
+        # One (min, last) sample per destination per second keeps the series bounded by run length.
+        series = self.credit_series.setdefault(target_device, {})
+        second = int(timestamp)
+        sample = series.get(second)
+        series[second] = (credit, credit) if sample is None else (min(sample[0], credit), credit)
+
+    def congestion_started(self, timestamp, target_device):
+        if target_device not in self.congested_since:
+            self.congested_since[target_device] = timestamp
+
+    def congestion_ended(self, timestamp, target_device):
+        start = self.congested_since.pop(target_device, None)
+        if start is not None:
+            self.episodes.setdefault(target_device, []).append(timestamp - start)
+
+    def switch_event(self, timestamp, event, source_device, target_device, credit, amount):
+        self.observe_time(timestamp)
+        if event == PACKET_SENT:
+            stats = self.flow(source_device, target_device)
+            stats.packets += 1
+            stats.bits += amount
+            self.record_credit(timestamp, target_device, credit)
+        elif event == PACKET_DROPPED:
+            self.flow(source_device, target_device).drops += 1
+            self.last_drop[source_device] = target_device
+        elif event == PACKET_REQUEUED:
+            self.flow(source_device, self.last_drop.get(source_device, target_device)).requeues += 1
+        elif event == PACKET_HELD:
+            self.flow(source_device, target_device).held += 1
+        elif event == CREDIT_RESTORED:
+            self.record_credit(timestamp, target_device, credit)
+        elif event in (BACKPRESSURE_SENT, CRITICAL_BACKPRESSURE_SENT, BACKPRESSURE_CONTINUED):
+            self.congestion_started(timestamp, target_device)
+        elif event == RESTORE_SENT:
+            self.congestion_ended(timestamp, target_device)
+
+    def feed_switch_message(self, timestamp, message):
+        for marker, event, pattern in SWITCH_PATTERNS:
+            if marker in message:
+                match = pattern.search(message)
+                if match is None:
+                    return
+                groups = match.groups()
+                if event == PACKET_SENT:
+                    self.switch_event(timestamp, event, int(groups[0]), int(groups[1]), int(groups[2]),
+                                      TEXT_LOG_PACKET_SIZE)
+                elif event == PACKET_DROPPED:
+                    self.switch_event(timestamp, event, int(groups[0]), int(groups[1]), int(groups[2]),
+                                      int(groups[3]))
+                elif event == PACKET_REQUEUED:
+                    self.switch_event(timestamp, event, int(groups[0]), 0, 0, 0)
+                elif event == PACKET_HELD:
+                    self.switch_event(timestamp, event, int(groups[0]), int(groups[1]), 0, 0)
+                elif event == CREDIT_RESTORED:
+                    self.switch_event(timestamp, event, 0, int(groups[0]), float(groups[2]) * 8,
+                                      float(groups[1]) * 8)
+                else:
+                    self.switch_event(timestamp, event, 0, int(groups[0]), 0, 0)
+                return
+
+    def feed_device_message(self, timestamp, message):
+        if b"Sent" in message:
+            match = DEVICE_SENT_PATTERN.search(message)
+            if match:
+                device_id = int(match.group(1))
+                self.device_sent[device_id] = self.device_sent.get(device_id, 0) + int(match.group(2))
+        elif b"Processed packets" in message:
+            match = DEVICE_PROCESSED_PATTERN.search(message)
+            if match:
+                device_id = int(match.group(1))
+                count = match.group(2).count(b",") + 1 if match.group(2) else 0
+                self.device_processed[device_id] = self.device_processed.get(device_id, 0) + count
+        elif b"Received" in message:
+            match = DEVICE_SIGNAL_PATTERN.search(message)
+            if match:
+                key = (int(match.group(1)), match.group(2).decode())
+                self.device_signals[key] = self.device_signals.get(key, 0) + 1
+
+    def feed_text_log(self, path):
+        # Log timestamps are HH:MM:SS, so a run crossing midnight is unwrapped by adding a day.
+        day_offset = 0
+        previous = None
+        with open(path, "rb", buffering=READ_BUFFER_SIZE) as f:
+            for line in f:
+                if line[:1] != b"[" or line[9:10] != b"]":
+                    continue
+                self.lines += 1
+                clock = line[1:9]
+                if clock != previous:
+                    try:
+                        seconds = int(clock[0:2]) * 3600 + int(clock[3:5]) * 60 + int(clock[6:8])
+                    except ValueError:
+                        continue
+                    if previous is not None and seconds + day_offset < current:
+                        day_offset += 86400
+                    current = seconds + day_offset
+                    previous = clock
+                message_start = line.find(b"] ", line.find(b"] [", 11) + 3)
+                message = line[message_start + 2:]
+                if message.startswith(b"Switch: "):
+                    self.feed_switch_message(current, message)
+                elif message.startswith(b"Device "):
+                    self.observe_time(current)
+                    self.feed_device_message(current, message)
+
+    def feed_trace(self, path):
+        # Trace timestamps are epoch seconds. They are counted from the local midnight of the first record
+        # instead, the time base of the text logs, so a trace and the memory.log of its run can be mixed.
+        midnight = None
+        for timestamp, event, _, source, target, _, credit, amount, _ in read_records(path):
+            if midnight is None:
+                local = time.localtime(timestamp)
+                midnight = int(timestamp) - (local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec)
+            self.lines += 1
+            self.switch_event(timestamp - midnight, event, source, target, credit, amount)
+
+    def finish(self):
+        if self.last_timestamp is not None:
+            for target_device in list(self.congested_since):
+                self.congestion_ended(self.last_timestamp, target_device)
+
+    def duration(self):
+        if self.first_timestamp is None:
+            return 0
+        return max(self.last_timestamp - self.first_timestamp, 1)
+
+    def report(self, output=sys.stdout):
+        duration = self.duration()
+        output.write(f"Analyzed {self.lines} lines covering {round(duration, 1):g} s.\n\n")
+
+        output.write("Per-flow throughput:\n")
+        output.write(f"{'flow':>12} {'packets':>9} {'pkt/s':>9} {'bits/s':>11} {'drops':>7} {'requeues':>9} "
+                     f"{'held':>6}\n")
+        for (source_device, target_device), stats in sorted(self.flows.items()):
+            output.write(
+                f"{f'{source_device}->{target_device}':>12} {stats.packets:>9} {stats.packets / duration:>9.2f} "
+                f"{stats.bits / duration:>11.1f} {stats.drops:>7} {stats.requeues:>9} {stats.held:>6}\n"
+            )
+
+        output.write("\nBackpressure episodes per destination:\n")
+        output.write(f"{'device':>8} {'episodes':>9} {'total s':>9} {'mean s':>9} {'max s':>9}\n")
+        for target_device, episodes in sorted(self.episodes.items()):
+            total = sum(episodes)
+            output.write(f"{target_device:>8} {len(episodes):>9} {total:>9.2f} {total / len(episodes):>9.2f} "
+                         f"{max(episodes):>9.2f}\n")
+
+        output.write("\nCredit per destination (bits):\n")
+        output.write(f"{'device':>8} {'samples':>8} {'min':>9} {'mean':>11} {'final':>9}\n")
+        for target_device, series in sorted(self.credit_series.items()):
+            minima = [sample[0] for sample in series.values()]
+            lasts = [sample[1] for sample in series.values()]
+            output.write(f"{target_device:>8} {len(series):>8} {min(minima):>9.0f} "
+                         f"{sum(lasts) / len(lasts):>11.1f} {lasts[-1]:>9.0f}\n")
+
+        if self.device_sent or self.device_processed:
+            output.write("\nDevices:\n")
+            output.write(f"{'device':>8} {'sent':>8} {'processed':>10} {'BP recv':>8} {'RESTORE recv':>13} "
+                         f"{'CRITICAL recv':>14}\n")
+            for device_id in sorted(set(self.device_sent) | set(self.device_processed)):
+                output.write(
+                    f"{device_id:>8} {self.device_sent.get(device_id, 0):>8} "
+                    f"{self.device_processed.get(device_id, 0):>10} "
+                    f"{self.device_signals.get((device_id, 'BACKPRESSURE'), 0):>8} "
+                    f"{self.device_signals.get((device_id, 'RESTORE'), 0):>13} "
+                    f"{self.device_signals.get((device_id, 'CRITICAL_BACKPRESSURE'), 0):>14}\n"
+                )
+
+    def write_credit_csv(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for target_device, series in self.credit_series.items():
+            with open(os.path.join(directory, f"credit_device{target_device}.csv"), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["second", "min_credit_bits", "last_credit_bits"])
+                for second, (minimum, last) in sorted(series.items()):
+                    writer.writerow([second, minimum, last])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize simulation.log / memory.log / simulation.trace.")
+    parser.add_argument("paths", nargs="*", default=["simulation.log", "memory.log"],
+                        help="log files (.log) or binary traces (.trace) to analyze")
+    parser.add_argument("--csv-dir", help="write per-destination credit time series as CSV into this directory")
+    args = parser.parse_args()
+
+    analyzer = LogAnalyzer()
+    for path in args.paths:
+        if path.endswith(".trace"):
+            analyzer.feed_trace(path)
+        else:
+            analyzer.feed_text_log(path)
+    analyzer.finish()
+    analyzer.report()
+    if args.csv_dir:
+        analyzer.write_credit_csv(args.csv_dir)
+
+
+if __name__ == "__main__":
+    main()
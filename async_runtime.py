@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import threading
+import time
+
+from device import SEND_INTERVAL, PROCESS_INTERVAL
+from topology import build_network, default_topology
+
+
+class AsyncReadySet:
+    # ReadySet for the asyncio engine: the same bookkeeping, but the consumer awaits an asyncio.Event.
+    # Producers and consumer all run on the event loop's thread, so nothing needs a lock. Must be
+    # created inside the running loop.
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.ready = {}
+        self.woken = False
+        self.closed = False
+
+    def mark(self, owner):
+        self.ready[owner] = None
+        self.event.set()
+
+    def wake(self):
+        self.woken = True
+        self.event.set()
+
+    def take(self):
+        ready, self.ready = self.ready, {}
+        self.woken = False
+        self.event.clear()
+        return ready
+
+    async def wait(self):
+        await self.event.wait()
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+    def __len__(self):
+        return len(self.ready) + self.woken
+
+
+class TaskNameFilter(logging.Filter):
+    # Names each record after the task that logged it (or the actor set by a dispatcher), so the
+    # logs read like the threaded engine's.
+    def __init__(self):
+        super().__init__()
+        self.actor = None
+
+    def current(self):
+        # The actor's name, or None outside any task.
+        if self.actor is not None:
+            return self.actor
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return task.get_name() if task is not None else None
+
+    def filter(self, record):
+        name = self.current()
+        if name is not None:
+            record.threadName = name
+        return True
+
+
+class AsyncSimulation:
+    # Runs the switch and every device as coroutines on one event loop, in real time. Each loop waits on
+    # an asyncio event or sleep, so a device costs two small tasks instead of three OS threads, and
+    # the run ends by cancelling the tasks rather than by polling running flags. The ingress stays
+    # unbounded, as in the discrete-event engine, because a send must not block the loop.
+    def __init__(self, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION, topology=None,
+                 tracer=None, latency=None, class_weights=None, check_credit=False, seed=None, recorder=None):
+        self.simulation_logger = simulation_logger
+        self.memory_logger = memory_logger
+        self.STATE = STATE
+        self.RATIO = RATIO
+        self.PRIORITY_OPTION = PRIORITY_OPTION
+        self.DURATION = DURATION
+        self.topology = topology if topology is not None else default_topology()
+        self.tracer = tracer
+        self.latency = latency
+        self.class_weights = class_weights
+        self.check_credit = check_credit
+        self.seed = seed
+        self.recorder = recorder
+        self.log_filter = TaskNameFilter()
+        if tracer is not None:
+            tracer.actor = lambda: self.log_filter.current() or threading.current_thread().name
+        self.switch = None
+        self.devices = []
+
+    async def switch_listen(self):
+        self.simulation_logger.info("Switch: Listening for incoming packets...")
+        while True:
+            await self.switch.ingress_ready.wait()
+            self.switch.listen_once()
+
+    async def switch_restore(self):
+        self.simulation_logger.info("Switch: Buffer restoration thread started.")
+        credit_ready = self.switch.credit_updates.ready_set
+        while True:
+            await credit_ready.wait()
+            credit_ready.take()
+            self.switch.restore_once()
+
+    async def deliver_alerts(self):
+        # One task serves every device's control channel; only signalled devices are visited.
+        devices_by_id = {device.device_id: device for device in self.devices}
+        while True:
+            await self.pending_alerts.wait()
+            for device_id in self.pending_alerts.take():
+                self.log_filter.actor = f"Device{device_id}AlertHandler"
+                try:
+                    devices_by_id[device_id].check_alerts_once()
+                finally:
+                    self.log_filter.actor = None
+
+    async def device_send(self, device):
+        while True:
+            device.send_once()
+            await asyncio.sleep(SEND_INTERVAL)
+
+    async def device_process(self, device):
+        while True:
+            device.process_once()
+            await asyncio.sleep(PROCESS_INTERVAL)
+
+    async def main(self):
+        asyncio.current_task().set_name("MainThread")
+        self.pending_alerts = AsyncReadySet()
+        self.switch, self.devices = build_network(self.topology, self.simulation_logger, self.memory_logger,
+                                                  self.STATE, self.RATIO, self.PRIORITY_OPTION, self.DURATION,
+                                                  signal_ready=self.pending_alerts, tracer=self.tracer,
+                                                  latency=self.latency, class_weights=self.class_weights,
+                                                  check_credit=self.check_credit, ingress_capacity=0,
+                                                  ingress_ready=AsyncReadySet(), credit_ready=AsyncReadySet(),
+                                                  seed=self.seed, recorder=self.recorder)
+        tasks = [asyncio.create_task(self.switch_listen(), name="SwitchListener"),
+                 asyncio.create_task(self.switch_restore(), name="BufferRestorer"),
+                 asyncio.create_task(self.deliver_alerts(), name="AlertDispatcher")]
+        for device in self.devices:
+            tasks.append(asyncio.create_task(self.device_send(device), name=f"Device{device.device_id}Sender"))
+            tasks.append(asyncio.create_task(self.device_process(device),
+                                             name=f"Device{device.device_id}Processor"))
+
+        # A task only finishes early by raising, which ends the run at once.
+        done, _ = await asyncio.wait(tasks, timeout=self.DURATION, return_when=asyncio.FIRST_EXCEPTION)
+        self.simulation_logger.info("Stopping simulation...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.switch.running = False
+        for device in self.devices:
+            device.running = False
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    def run(self):
+        self.simulation_logger.addFilter(self.log_filter)
+        self.memory_logger.addFilter(self.log_filter)
+        start_time = time.time()
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.simulation_logger.removeFilter(self.log_filter)
+            self.memory_logger.removeFilter(self.log_filter)
+        return time.time() - start_time
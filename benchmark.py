@@ -0,0 +1,230 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+from analyze_logs import LogAnalyzer
+from controller import run_simulation
+from device import TRANSMISSION_RATES
+from packet import PACKET_POOL, PACKET_SIZE, TYPE1, TYPE2, BACKPRESSURE, RESTORE, signal
+from sweep import STATE_RATIOS
+from topology import Topology, build_network
+
+DEPTHS = [16, 256, 4096]
+ROUNDS = 5
+MACRO_DURATION = 60
+# (STATE, PRIORITY_OPTION) of every macro run; priority options only apply to state 2.
+MACRO_CASES = [(1, 1), (2, 1), (2, 2), (2, 3)]
+DEFAULT_THRESHOLD = 0.10
+BASELINE_VERSION = 1
+
+
+def quiet_logger():
+    # Micro benchmarks measure the code, not the log file: records are built but never written.
+    logger = logging.getLogger("BenchmarkLogger")
+    logger.setLevel(logging.CRITICAL + 1)
+    logger.propagate = False
+    return logger
+
+
+def bench_network(depth, STATE=2, PRIORITY_OPTION=3):
+    # The default four devices with every port able to take `depth` packets at once.
+    logger = quiet_logger()
+    topology = Topology({device_id: depth * PACKET_SIZE for device_id in TRANSMISSION_RATES}, TRANSMISSION_RATES)
+    return build_network(topology, logger, logger, STATE, STATE_RATIOS[STATE], PRIORITY_OPTION, 1,
+                         ingress_capacity=0)
+
+
+def make_packets(depth, source_device, targets):
+    return [PACKET_POOL.acquire(index, PACKET_SIZE, source_device, targets[index % len(targets)],
+                                TYPE2 if index % 3 == 2 else TYPE1)
+            for index in range(depth)]
+
+
+def micro_switch_serve(depth):
+    switch, _ = bench_network(depth)
+    for packet in make_packets(depth, 2, [1]):
+        switch.output_queues[1].push(2, packet)
+    start = time.perf_counter_ns()
+    switch.serve([1])
+    return time.perf_counter_ns() - start, depth
+
+
+def micro_switch_listen(depth):
+    switch, devices = bench_network(depth)
+    for device in devices:
+        device.switch_queue.put_many(make_packets(depth // len(devices), device.device_id, list(device.max_rates)))
+    start = time.perf_counter_ns()
+    switch.listen_once()
+    return time.perf_counter_ns() - start, depth // len(devices) * len(devices)
+
+
+def micro_device_check_alerts(depth):
+    _, devices = bench_network(depth)
+    device = devices[0]
+    targets = list(device.max_rates)
+    device.control_signals.put_many([signal(BACKPRESSURE if index % 2 else RESTORE, targets[index % len(targets)])
+                                     for index in range(depth)])
+    start = time.perf_counter_ns()
+    device.check_alerts_once()
+    return time.perf_counter_ns() - start, depth
+
+
+def micro_device_process(depth):
+    _, devices = bench_network(depth)
+    device = devices[0]
+    device.process_rate = depth
+    device.received_packets.put_many(make_packets(depth, 2, [device.device_id]))
+    start = time.perf_counter_ns()
+    device.process_once()
+    return time.perf_counter_ns() - start, depth
+
+
+def micro_device_send(depth):
+    _, devices = bench_network(depth)
+    device = devices[0]
+    targets = list(device.max_rates)
+    device.current_rates = {target_device: depth // len(targets) for target_device in targets}
+    start = time.perf_counter_ns()
+    device.send_once()
+    return time.perf_counter_ns() - start, depth // len(targets) * len(targets)
+
+
+MICRO_BENCHMARKS = {
+    "switch.serve": micro_switch_serve,
+    "switch.listen": micro_switch_listen,
+    "device.check_alerts": micro_device_check_alerts,
+    "device.process": micro_device_process,
+    "device.send": micro_device_send,
+}
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_micro(name, depth, rounds):
+    # Every round sets up a fresh network; the best round is reported.
+    best = None
+    for _ in range(rounds):
+        elapsed_ns, packets = MICRO_BENCHMARKS[name](depth)
+        if best is None or elapsed_ns < best[0]:
+            best = (elapsed_ns, packets)
+    return best
+
+
+def run_macro(STATE, PRIORITY_OPTION, duration):
+    with tempfile.TemporaryDirectory() as log_dir:
+        start = time.perf_counter_ns()
+        run_simulation(STATE, STATE_RATIOS[STATE], PRIORITY_OPTION, duration, engine=2, log_dir=log_dir)
+        elapsed_ns = time.perf_counter_ns() - start
+        analyzer = LogAnalyzer()
+        analyzer.feed_text_log(os.path.join(log_dir, "simulation.log"))
+    return elapsed_ns, sum(stats.packets for stats in analyzer.flows.values())
+
+
+def run_case(case):
+    # Runs in a process of its own (see main), so the peak RSS belongs to this case alone.
+    kind, arguments = case
+    elapsed_ns, packets = run_micro(*arguments) if kind == "micro" else run_macro(*arguments)
+    return {
+        "packets": packets,
+        "ns_per_packet": round(elapsed_ns / packets, 1) if packets else None,
+        "packets_per_s": round(packets * 1e9 / elapsed_ns, 1) if elapsed_ns else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def cases(args):
+    selected = []
+    if args.only in (None, "micro"):
+        for name in MICRO_BENCHMARKS:
+            for depth in args.depths:
+                selected.append((f"micro/{name}@{depth}", ("micro", (name, depth, args.rounds))))
+    if args.only in (None, "macro"):
+        for STATE, PRIORITY_OPTION in MACRO_CASES:
+            selected.append((f"macro/state{STATE}-priority{PRIORITY_OPTION}",
+                             ("macro", (STATE, PRIORITY_OPTION, args.macro_duration))))
+    return selected
+
+
+def regressions(name, result, baseline, threshold):
+    # Slower per packet or more memory than the baseline by more than `threshold` (a fraction).
+    found = []
+    for metric in ("ns_per_packet", "peak_rss_kb"):
+        before = baseline.get(metric)
+        after = result.get(metric)
+        if before and after is not None and after > before * (1 + threshold):
+            found.append(f"{name}: {metric} {before} -> {after} (+{100 * (after / before - 1):.1f}%)")
+    return found
+
+
+def print_table(results, baseline, output=sys.stdout):
+    width = max(len(name) for name in results)
+    output.write(f"{'benchmark':<{width}} {'packets':>8} {'ns/packet':>11} {'packets/s':>12} {'peak RSS MB':>12} "
+                 f"{'vs baseline':>12}\n")
+    for name, result in results.items():
+        change = ""
+        before = baseline.get(name, {}).get("ns_per_packet")
+        if before and result["ns_per_packet"] is not None:
+            change = f"{100 * (result['ns_per_packet'] / before - 1):+.1f}%"
+        rss = f"{result['peak_rss_kb'] / 1024:.1f}" if result["peak_rss_kb"] is not None else "-"
+        output.write(f"{name:<{width}} {result['packets']:>8} {str(result['ns_per_packet']):>11} "
+                     f"{str(result['packets_per_s']):>12} {rss:>12} {change:>12}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the switch and device hot paths (micro) and full "
+                                                 "discrete-event runs (macro).")
+    parser.add_argument("--only", choices=["micro", "macro"], help="run only one part of the suite")
+    parser.add_argument("--depths", type=int, nargs="+", default=DEPTHS, help="queue depths of the micro benchmarks")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="rounds per micro benchmark (best is kept)")
+    parser.add_argument("--macro-duration", type=int, default=MACRO_DURATION, help="simulated seconds per macro run")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline of a previous run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown or memory growth flagged as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    # One fresh process per case keeps the peak RSS of one case from hiding another's.
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for name, case in cases(args):
+            results[name] = pool.apply(run_case, (case,))
+            print(f"{name}: {results[name]['ns_per_packet']} ns/packet", file=sys.stderr)
+    print_table(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"version": BASELINE_VERSION, "python": platform.python_version(), "machine": platform.machine(),
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+
+    found = [line for name, result in results.items() if name in baseline
+             for line in regressions(name, result, baseline[name], args.threshold)]
+    if found:
+        print(f"\n{len(found)} regression(s) beyond {100 * args.threshold:.0f}%:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
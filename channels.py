@@ -0,0 +1,145 @@
+import collections
+import threading
+
+
+class ReadySet:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.ready = {}
+        self.woken = False
+        self.closed = False
+
+    def mark(self, owner):
+        with self.condition:
+            self.ready[owner] = None
+            self.condition.notify()
+
+    def wake(self):
+        # Wakes the consumer without marking an owner, e.g. when credit returns for queued packets.
+        with self.condition:
+            self.woken = True
+            self.condition.notify()
+
+    def take(self):
+        with self.condition:
+            ready, self.ready = self.ready, {}
+            self.woken = False
+        return ready
+
+    def wait(self, timeout=None):
+        with self.condition:
+            return bool(self.condition.wait_for(lambda: self.ready or self.woken or self.closed, timeout))
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.ready) + self.woken
+
+
+class IngressQueue:
+    # A FIFO channel moved in batches: put_many and get_many take the lock once per batch, and every
+    # put reports the owner to a shared ReadySet so the consumer sleeps until something arrives and
+    # then only visits channels that actually hold something. With a capacity, put_many blocks while
+    # the channel is full, which pushes back on the producer. put_many's optional `stamp` is called with
+    # each part of the batch just before the consumer can see it.
+    def __init__(self, owner, ready_set=None, capacity=0):
+        self.owner = owner
+        self.ready_set = ready_set
+        self.capacity = capacity
+        self.items = collections.deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def put(self, item, timeout=None):
+        return self.put_many((item,), timeout)
+
+    def put_many(self, items, timeout=None, stamp=None):
+        # Returns how many items were enqueued; fewer than len(items) only if the timeout expired.
+        items = list(items)
+        count = 0
+        with self.lock:
+            while count < len(items):
+                if self.capacity:
+                    space = self.capacity - len(self.items)
+                    if space <= 0:
+                        if not self.not_full.wait_for(lambda: len(self.items) < self.capacity, timeout):
+                            break
+                        continue
+                    chunk = items[count:count + space]
+                else:
+                    chunk = items[count:] if count else items
+                if stamp is not None:
+                    stamp(chunk)
+                self.items.extend(chunk)
+                count += len(chunk)
+                self.not_empty.notify()
+                # Marked before any wait for space, so a consumer asleep on the ReadySet drains us.
+                if self.ready_set is not None:
+                    self.ready_set.mark(self.owner)
+        return count
+
+    def get_many(self, max_items=None, timeout=0):
+        # Returns up to `max_items` (default: everything queued), waiting up to `timeout` seconds for the
+        # first item.
+        with self.lock:
+            if timeout and not self.items:
+                self.not_empty.wait_for(lambda: self.items, timeout)
+            if max_items is None or max_items >= len(self.items):
+                items = list(self.items)
+                self.items.clear()
+            else:
+                items = [self.items.popleft() for _ in range(max_items)]
+            if items and self.capacity:
+                self.not_full.notify_all()
+        return items
+
+    def get_all(self, timeout=0):
+        return self.get_many(None, timeout)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.items)
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+
+class VirtualOutputQueues:
+    # The packets waiting for one output port, in one FIFO per source. Sources with waiting
+    # packets are served round-robin, one packet each, so a busy source cannot starve the others.
+    def __init__(self):
+        self.queues = {}
+        self.backlogged = collections.deque()
+        self.length = 0
+
+    def push(self, source, packet):
+        source_queue = self.queues.get(source)
+        if source_queue is None:
+            source_queue = self.queues[source] = collections.deque()
+        if not source_queue:
+            self.backlogged.append(source)
+        source_queue.append(packet)
+        self.length += 1
+
+    def head(self):
+        source = self.backlogged[0]
+        return source, self.queues[source][0]
+
+    def pop(self):
+        source = self.backlogged.popleft()
+        source_queue = self.queues[source]
+        packet = source_queue.popleft()
+        if source_queue:
+            self.backlogged.append(source)
+        self.length -= 1
+        return source, packet
+
+    def __len__(self):
+        return self.length
@@ -1,28 +1,28 @@
+import argparse
+import os
+import sys
 import threading
-import queue
 import time
 import logging
-from switch import Switch
-from device1 import Device as Device1
-from device2 import Device as Device2
-from device3 import Device as Device3
-from device4 import Device as Device4
+import sim_logging  # noqa: F401  registers the PROCESS log level
+from async_runtime import AsyncSimulation
+from event_trace import BinaryTrace
+from latency import LatencyRecorder
+from metrics import MetricsServer, METRICS_HOST, DEFAULT_METRICS_PORT
+from process_runtime import run_multiprocess
+from profiling import RuntimeProfiler
+from simulator import DiscreteEventSimulation, DEFAULT_SEED
+from socket_transport import SocketNetwork
+from topology import build_network, default_topology, load_topology
+from traffic_record import IngressRecorder
 
 STATE = 1
 RATIO = 1
 DURATION = 5
 PRIORITY_OPTION = 1
-
-PROCESS_LEVEL_NUM = 25
-logging.addLevelName(PROCESS_LEVEL_NUM, "PROCESS")
-
-
-def process(self, message, *args, **kws):
-    if self.isEnabledFor(PROCESS_LEVEL_NUM):
-        self._log(PROCESS_LEVEL_NUM, message, args, **kws)
-
-
-logging.Logger.process = process
+ENGINE = 1
+TOPOLOGY = None
+TRACE_OPTION = 1
 
 
 def get_simulation_duration():
@@ -83,13 +83,73 @@ def get_priority_option():
             print("Invalid input. Please enter 1, 2 or 3.\n")
 
 
-def setup_loggers():
+def get_topology():
+    global TOPOLOGY
+    while True:
+        user_input = input("Enter the path of a topology file (leave empty for the default 4-device network):\n")
+        if not user_input.strip():
+            TOPOLOGY = default_topology()
+            return
+        try:
+            TOPOLOGY = load_topology(user_input.strip())
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not load topology: {e}\n")
+
+
+def get_engine_option():
+    global ENGINE
+    while True:
+        try:
+            user_input = input("Choose simulation engine:\n"
+                               "1) Real-time threads (the simulation takes DURATION seconds of wall-clock time).\n"
+                               "2) Discrete-event engine with a virtual clock (runs as fast as possible, "
+                               "deterministic output).\n"
+                               "3) Real-time processes: the switch and every device run in their own process and "
+                               "talk through shared memory.\n"
+                               "4) Real-time asyncio: the switch and all devices run as coroutines on one event loop "
+                               "(scales to thousands of devices).\n"
+                               "5) Real-time threads connected over loopback TCP sockets (reports syscalls per "
+                               "packet).\n"
+                               "Enter 1, 2, 3, 4 or 5:\n")
+
+            ENGINE = int(user_input)
+            if ENGINE in [1, 2, 3, 4, 5]:
+                return
+            else:
+                print("Please enter a valid option (1, 2, 3, 4 or 5).\n")
+        except ValueError:
+            print("Invalid input. Please enter 1, 2, 3, 4 or 5.\n")
+
+
+def get_trace_option():
+    global TRACE_OPTION
+    while True:
+        try:
+            user_input = input("Choose how switch packet events are recorded:\n"
+                               "1) Text lines in simulation.log.\n"
+                               "2) Binary trace in simulation.trace "
+                               "(render it with: python event_trace.py simulation.trace).\n"
+                               "Enter 1 or 2:\n")
+
+            TRACE_OPTION = int(user_input)
+            if TRACE_OPTION in [1, 2]:
+                return
+            else:
+                print("Please enter a valid option (1 or 2).\n")
+        except ValueError:
+            print("Invalid input. Please enter 1 or 2.\n")
+
+
+def setup_loggers(log_dir="."):
     simulation_logger = logging.getLogger("SimulationLogger")
     simulation_logger.setLevel(logging.DEBUG)
+    close_logger(simulation_logger)
 
-    open('simulation.log', 'w').close()
+    simulation_log = os.path.join(log_dir, "simulation.log")
+    open(simulation_log, 'w').close()
 
-    fh_sim = logging.FileHandler("simulation.log")
+    fh_sim = logging.FileHandler(simulation_log)
     fh_sim.setLevel(logging.DEBUG)
     formatter_sim = logging.Formatter(
         fmt='[%(asctime)s] [%(threadName)s] [%(levelname)s] %(message)s',
@@ -102,10 +162,12 @@ def setup_loggers():
 
     memory_logger = logging.getLogger("MemoryLogger")
     memory_logger.setLevel(logging.DEBUG)
+    close_logger(memory_logger)
 
-    open('memory.log', 'w').close()
+    memory_log = os.path.join(log_dir, "memory.log")
+    open(memory_log, 'w').close()
 
-    fh_mem = logging.FileHandler("memory.log")
+    fh_mem = logging.FileHandler(memory_log)
     fh_mem.setLevel(logging.DEBUG)
     formatter_mem = logging.Formatter(
         fmt='[%(asctime)s] [%(threadName)s] [%(levelname)s] %(message)s',
@@ -122,62 +184,46 @@ def setup_loggers():
     return simulation_logger, memory_logger
 
 
-simulation_logger, memory_logger = setup_loggers()
+def close_logger(logger):
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
 
 
 def stop_simulation(switch, devices, logger):
     logger.info("Stopping simulation...")
-    switch.running = False
+    switch.stop()
     for device in devices:
         device.running = False
 
 
-if __name__ == "__main__":
+def log_throughput(logger, forwarded, elapsed):
+    logger.info(f"Switch: Forwarded {forwarded} packets in {elapsed:.1f} s ({forwarded / elapsed:.1f} packets/s).")
 
-    get_simulation_duration()
-    get_simulation_RATIO()
 
-    simulation_logger.info("Starting simulation...")
-
-    incoming_queues = {
-        1: queue.Queue(),
-        2: queue.Queue(),
-        3: queue.Queue(),
-        4: queue.Queue()
-    }
-
-    devices = [
-        Device1(1, incoming_queues[1], memory_logger, RATIO, DURATION),
-        Device2(2, incoming_queues[2], memory_logger, RATIO, DURATION),
-        Device3(3, incoming_queues[3], memory_logger, RATIO, DURATION),
-        Device4(4, incoming_queues[4], memory_logger, RATIO, DURATION)
-    ]
-
-    outgoing_queues = {
-        1: devices[0].received_packets,
-        2: devices[1].received_packets,
-        3: devices[2].received_packets,
-        4: devices[3].received_packets
-    }
-
-    switch = Switch(incoming_queues, outgoing_queues, simulation_logger, STATE, PRIORITY_OPTION)
+def run_threaded(switch, devices, simulation_logger, DURATION, profiler=None):
     switch_thread = threading.Thread(target=switch.listen, name="SwitchListener")
     buffer_thread = threading.Thread(target=switch.restore_buffers, name="BufferRestorer")
 
     device_threads = []
     for device in devices:
-        device_thread_sender = threading.Thread(target=device.send_packets, name=f"Device{device.device_id}Sender")
+        device_thread_sender = threading.Thread(target=device.send_packets,
+                                                name=f"Device{device.device_id}Sender")
         device_thread_processor = threading.Thread(target=device.process_incoming,
                                                    name=f"Device{device.device_id}Processor")
-        device_thread_alert = threading.Thread(target=device.check_alerts, name=f"Device{device.device_id}AlertHandler")
+        device_thread_alert = threading.Thread(target=device.check_alerts,
+                                               name=f"Device{device.device_id}AlertHandler")
         device_threads.append(device_thread_sender)
         device_threads.append(device_thread_processor)
         device_threads.append(device_thread_alert)
 
+    start_time = time.time()
     switch_thread.start()
     buffer_thread.start()
     for thread in device_threads:
         thread.start()
+    if profiler is not None:
+        profiler.start([switch_thread, buffer_thread] + device_threads)
 
     time.sleep(DURATION)
 
@@ -187,6 +233,129 @@ if __name__ == "__main__":
     buffer_thread.join()
     for thread in device_threads:
         thread.join()
+    if profiler is not None:
+        profiler.stop()
+    log_throughput(simulation_logger, switch.packets_forwarded, time.time() - start_time)
+
+
+def start_metrics(metrics_port, network, logger):
+    # `network` returns the running (switch, devices), or None until they exist; see metrics.py.
+    if metrics_port is None:
+        return None
+    server = MetricsServer(network, metrics_port)
+    server.start()
+    logger.info(f"Metrics: Serving http://{METRICS_HOST}:{server.port}/metrics")
+    return server
+
+
+def run_simulation(STATE, RATIO, PRIORITY_OPTION, DURATION, topology=None, engine=1, trace_option=1, log_dir=".",
+                   seed=DEFAULT_SEED, measure_latency=True, class_weights=None,
+                   check_credit=False, profile=False, metrics_port=None, record_path=None):
+    if topology is None:
+        topology = default_topology()
+    simulation_logger, memory_logger = setup_loggers(log_dir)
+    trace_path = os.path.join(log_dir, "simulation.trace") if trace_option == 2 else None
+    # The multi-process engine opens the trace in the switch's process instead.
+    tracer = BinaryTrace(trace_path) if trace_path is not None and engine != 3 else None
+    # So does the ingress recorder, which replay.py can feed back into a switch.
+    recorder = (IngressRecorder(record_path, DURATION, STATE, PRIORITY_OPTION)
+                if record_path is not None and engine != 3 else None)
+    latency = LatencyRecorder() if measure_latency else None
+
+    simulation_logger.info("Starting simulation...")
+    if profile and engine != 1:
+        simulation_logger.warning("Profiling is only available with the threaded engine; running without it.")
+    if metrics_port is not None and engine == 3:
+        simulation_logger.warning("Metrics are not available with the multi-process engine; running without them.")
+        metrics_port = None
+    metrics = None
+
+    if engine == 2:
+        simulation = DiscreteEventSimulation(simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION,
+                                             DURATION, topology=topology, seed=seed, tracer=tracer,
+                                             latency=latency, class_weights=class_weights,
+                                             check_credit=check_credit, recorder=recorder)
+        metrics = start_metrics(metrics_port, lambda: (simulation.switch, simulation.devices), simulation_logger)
+        simulation.run()
+        summary = simulation.switch.signaler.summary()
+    elif engine == 3:
+        start_time = time.time()
+        summary, forwarded = run_multiprocess(topology, simulation_logger, memory_logger, STATE, RATIO,
+                                              PRIORITY_OPTION, DURATION, trace_path=trace_path, latency=latency,
+                                              class_weights=class_weights, check_credit=check_credit, seed=seed,
+                                              record_path=record_path)
+        log_throughput(simulation_logger, forwarded, time.time() - start_time)
+    elif engine == 4:
+        simulation = AsyncSimulation(simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                                     topology=topology, tracer=tracer, latency=latency, class_weights=class_weights,
+                                     check_credit=check_credit, seed=seed, recorder=recorder)
+        metrics = start_metrics(metrics_port, lambda: None if simulation.switch is None else
+                                (simulation.switch, simulation.devices), simulation_logger)
+        elapsed = simulation.run()
+        log_throughput(simulation_logger, simulation.switch.packets_forwarded, elapsed)
+        summary = simulation.switch.signaler.summary()
+    elif engine == 5:
+        network = SocketNetwork(topology, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                                tracer=tracer, latency=latency, class_weights=class_weights,
+                                check_credit=check_credit, seed=seed, recorder=recorder)
+        metrics = start_metrics(metrics_port, lambda: (network.switch, network.devices), simulation_logger)
+        elapsed = network.run()
+        log_throughput(simulation_logger, network.switch.packets_forwarded, elapsed)
+        simulation_logger.info(network.summary(elapsed))
+        summary = network.switch.signaler.summary()
+    else:
+        switch, devices = build_network(topology, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION,
+                                        DURATION, tracer=tracer, latency=latency, class_weights=class_weights,
+                                        check_credit=check_credit, seed=seed, recorder=recorder)
+        # Locks are wrapped before any thread starts, so every acquisition is timed.
+        profiler = RuntimeProfiler(switch, devices) if profile else None
+        metrics = start_metrics(metrics_port, lambda: (switch, devices), simulation_logger)
+        run_threaded(switch, devices, simulation_logger, DURATION, profiler)
+        summary = switch.signaler.summary()
+        if profiler is not None:
+            profiler.dump(os.path.join(log_dir, "profile.json"))
+            with open(os.path.join(log_dir, "profile.txt"), "w") as f:
+                profiler.report(f)
+
+    simulation_logger.info(summary)
+    if metrics is not None:
+        metrics.stop()
+    if tracer is not None:
+        tracer.close()
+    if recorder is not None:
+        recorder.close()
+    if record_path is not None:
+        simulation_logger.info(f"Switch ingress recorded to {record_path}.")
+
+    if latency is not None:
+        with open(os.path.join(log_dir, "latency.txt"), "w") as f:
+            latency.report(f)
 
     simulation_logger.info("Simulation completed.")
-    print("Simulation completed.")
\ No newline at end of file
+    close_logger(simulation_logger)
+    close_logger(memory_logger)
+    return latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the simulation; its parameters are asked for interactively.")
+    parser.add_argument("--profile", action="store_true",
+                        help="time locks and sample queue depths and thread CPU time (threaded engine only)")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=DEFAULT_METRICS_PORT,
+                        help=f"serve Prometheus metrics on localhost (default port {DEFAULT_METRICS_PORT})")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the devices' random streams")
+    parser.add_argument("--record", metavar="PATH", help="record the switch ingress for replay.py")
+    args = parser.parse_args()
+
+    get_simulation_duration()
+    get_simulation_RATIO()
+    get_topology()
+    get_engine_option()
+    get_trace_option()
+
+    latency = run_simulation(STATE, RATIO, PRIORITY_OPTION, DURATION, topology=TOPOLOGY, engine=ENGINE,
+                             trace_option=TRACE_OPTION, seed=args.seed, profile=args.profile,
+                             metrics_port=args.metrics_port, record_path=args.record)
+    print("Simulation completed.")
+    latency.report(sys.stdout, stages=["total"])
+    print("Full per-stage latency report written to latency.txt.")
@@ -0,0 +1,73 @@
+import threading
+
+
+class CreditLedger:
+    # Credit (in bits) of every destination port. Each destination has its own lock, so flows to
+    # different ports never contend; reading one credit is a plain dict lookup and needs no lock.
+    # The ledger also tracks which ports have a packet waiting for credit, updated under the same
+    # lock as the credit itself so a return of credit cannot be missed.
+    def __init__(self, capacities, check_invariants=False):
+        self.capacities = dict(capacities)
+        self.credits = dict(capacities)
+        self.locks = {destination: threading.Lock() for destination in capacities}
+        self.waiting = {}
+        self.check_invariants = check_invariants
+
+    def __getitem__(self, destination):
+        return self.credits[destination]
+
+    def debit(self, destination, amount):
+        with self.locks[destination]:
+            credit = self.credits[destination] - amount
+            self.credits[destination] = credit
+            if self.check_invariants:
+                self.check(destination)
+        return credit
+
+    def credit(self, destination, amount):
+        # Returns (credit actually added, new credit, whether a waiting packet may now fit).
+        with self.locks[destination]:
+            before = self.credits[destination]
+            credit = min(before + amount, self.capacities[destination])
+            self.credits[destination] = credit
+            unblocked = credit > before and destination in self.waiting
+            if unblocked:
+                del self.waiting[destination]
+            if self.check_invariants:
+                self.check(destination)
+        return credit - before, credit, unblocked
+
+    def debit_many(self, amounts):
+        return {destination: self.debit(destination, amount) for destination, amount in amounts.items()}
+
+    def credit_many(self, amounts):
+        return {destination: self.credit(destination, amount) for destination, amount in amounts.items()}
+
+    def wait_for(self, destination, amount):
+        # Registers a packet of `amount` bits as waiting, unless enough credit arrived meanwhile.
+        with self.locks[destination]:
+            if self.credits[destination] >= amount:
+                return False
+            self.waiting[destination] = None
+            return True
+
+    def is_waiting(self, destination):
+        return destination in self.waiting
+
+    def snapshot(self):
+        # Holds every lock at once (always in the same order) so the copy is one consistent state.
+        locks = [self.locks[destination] for destination in sorted(self.locks)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            return dict(self.credits)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def check(self, destination):
+        credit = self.credits[destination]
+        if not 0 <= credit <= self.capacities[destination]:
+            raise RuntimeError(f"Credit for Device {destination} is {credit} bits, outside "
+                               f"0..{self.capacities[destination]}.")
+
@@ -0,0 +1,211 @@
+import threading
+import time
+import random
+
+import sim_logging  # noqa: F401  registers the PROCESS log level
+from channels import IngressQueue
+from packet import (TYPE1, TYPE2, BACKPRESSURE, RESTORE, CRITICAL_BACKPRESSURE, PACKET_SIZE, PACKET_TYPE_NAMES,
+                    PACKET_POOL, CreditUpdate)
+
+TRANSMISSION_RATES = {
+    1: {2: 10, 3: 20, 4: 30},
+    2: {1: 10, 3: 20, 4: 30},
+    3: {1: 10, 2: 20, 4: 30},
+    4: {1: 10, 2: 20, 3: 30}
+}
+
+PROCESS_RATE = 10
+
+SEND_INTERVAL = 1
+PROCESS_INTERVAL = 1
+ALERT_TIMEOUT = 0.5
+
+
+def device_rng(seed, device_id):
+    # Every device draws from its own stream derived from the run's seed, so a device's packets do not
+    # depend on how the others' draws interleave with its own. Without a seed the stream is unseeded.
+    if seed is None:
+        return random.Random()
+    return random.Random(f"{seed}:{device_id}")
+
+
+class Device:
+    def __init__(self, device_id, switch_queue, logger, RATIO, DURATION, transmission_rates=None,
+                 process_rate=PROCESS_RATE, latency=None, credit_queue=None, rng=None):
+        self.device_id = device_id
+        self.received_packets = IngressQueue(device_id)
+        self.control_signals = IngressQueue(device_id)
+        self.switch_queue = switch_queue
+        # Where processed bits are returned to the switch as credit; None when running standalone.
+        self.credit_queue = credit_queue
+        self.running = True
+        if transmission_rates is None:
+            transmission_rates = TRANSMISSION_RATES[device_id]
+        self.max_rates = dict(transmission_rates)
+        self.current_rates = self.max_rates.copy()
+        # Last congestion state signalled per destination, kept until the rate has settled.
+        self.congestion = {}
+        self.signalled = {}
+        self.process_rate = process_rate
+        self.logger = logger
+        self.ratio_counter = 0
+        self.RATIO = RATIO
+        self.DURATION = DURATION
+        self.latency = latency
+        self.rng = rng if rng is not None else random.Random()
+        self.packets_dropped = 0
+        self.lock = threading.Lock()
+
+    def check_alerts(self):
+        start_time = time.time()
+        while self.running and time.time() - start_time < self.DURATION:
+            self.handle_signals(self.control_signals.get_all(ALERT_TIMEOUT))
+
+    def check_alerts_once(self):
+        self.handle_signals(self.control_signals.get_all())
+
+    def react(self, target_device, kind):
+        current_rate = self.current_rates[target_device]
+        if kind == BACKPRESSURE:
+            self.current_rates[target_device] = max(1, current_rate // 2)
+        elif kind == RESTORE:
+            self.current_rates[target_device] = min(self.max_rates[target_device], current_rate + 1)
+        elif kind == CRITICAL_BACKPRESSURE:
+            self.current_rates[target_device] = 0
+        return current_rate
+
+    def handle_signals(self, signals):
+        # The switch only signals congestion state changes, so only the latest state per destination
+        # in a batch matters. It is applied now and then again every send round until it changes.
+        latest = {}
+        for signal in signals:
+            latest[signal.target] = signal.kind
+
+        for target_device, kind in latest.items():
+            try:
+                with self.lock:
+                    current_rate = self.react(target_device, kind)
+                    self.congestion[target_device] = kind
+                    self.signalled[target_device] = None
+
+                if kind == BACKPRESSURE:
+                    if current_rate != 1:
+                        self.logger.warning(
+                            f"Device {self.device_id}: Received BACKPRESSURE signal. Slowing down "
+                            f"transmission to Device {target_device} to {self.current_rates[target_device]}."
+                        )
+                elif kind == RESTORE:
+                    if current_rate != self.max_rates[target_device]:
+                        self.logger.info(
+                            f"Device {self.device_id}: Received RESTORE signal. Speeding up transmission to "
+                            f"Device {target_device} to {self.current_rates[target_device]}."
+                        )
+                elif kind == CRITICAL_BACKPRESSURE:
+                    if current_rate != 0:
+                        self.logger.critical(
+                            f"Device {self.device_id}: Received CRITICAL_BACKPRESSURE signal. Stopping "
+                            f"transmission to Device {target_device}."
+                        )
+            except Exception as e:
+                self.logger.error(f"Device {self.device_id}: Error in handling alert: {e}")
+
+    def adjust_rates(self):
+        with self.lock:
+            for target_device, kind in list(self.congestion.items()):
+                if target_device not in self.signalled:
+                    self.react(target_device, kind)
+                if kind == RESTORE and self.current_rates[target_device] == self.max_rates[target_device]:
+                    del self.congestion[target_device]
+            self.signalled.clear()
+
+    def process_incoming(self):
+        start_time = time.time()
+        while self.running and time.time() - start_time < self.DURATION:
+            self.process_once()
+            time.sleep(PROCESS_INTERVAL)
+
+    def process_once(self):
+        buffer_contents = self.received_packets.snapshot()
+
+        if buffer_contents:
+            buffer_details = [{"id": packet.id, "type": PACKET_TYPE_NAMES[packet.type]} for packet in buffer_contents]
+            buffer_size = len(buffer_details)
+
+            buffer_details_str = str(buffer_details)
+            max_line_length = 120
+            wrapped_buffer_details = '\n'.join(
+                [buffer_details_str[i:i + max_line_length] for i in range(0, len(buffer_details_str),
+                                                                          max_line_length)]
+            )
+
+            self.logger.info(
+                f"Buffer Status: Device {self.device_id}: Buffer Content (IDs and Types):\n{wrapped_buffer_details}"
+                f" Total Packets: {buffer_size}"
+            )
+
+        processed_packets = self.received_packets.get_many(self.process_rate)
+
+        if processed_packets and self.latency is not None:
+            now = self.latency.clock()
+            for packet in processed_packets:
+                self.latency.packet_processed(packet, now)
+
+        if processed_packets:
+            packet_ids = [p.id for p in processed_packets]
+            self.logger.process(f"Device {self.device_id}: Processed packets: {packet_ids}.")
+            if self.credit_queue is not None:
+                # One update per processing round returns the whole batch's credit at once.
+                self.credit_queue.put(CreditUpdate(self.device_id, sum(p.size for p in processed_packets)))
+            # Nothing refers to a processed packet any more, so its object goes back to the pool.
+            PACKET_POOL.release(processed_packets)
+
+    def packets_enqueued(self, packets):
+        # Called by the ingress channel as each part of a batch goes in, so the wait for space counts
+        # towards the batch stage rather than the ingress stage.
+        now = self.latency.clock()
+        for packet in packets:
+            packet.enqueued = now
+            self.latency.packet_sent(packet, now)
+
+    def send_packets(self):
+        start_time = time.time()
+
+        while self.running and time.time() - start_time < self.DURATION:
+            self.send_once()
+            time.sleep(SEND_INTERVAL)
+
+    def send_once(self):
+        self.adjust_rates()
+        packets_to_send = []
+        acquire = PACKET_POOL.acquire
+
+        for target_device, rate in self.current_rates.items():
+            for _ in range(rate):
+                if self.ratio_counter <= 0:
+                    packet_type = TYPE1
+                    self.ratio_counter += 1
+                else:
+                    packet_type = TYPE2
+                    self.ratio_counter -= self.RATIO
+
+                packet_id = self.rng.randint(1000, 9999)
+                packets_to_send.append(acquire(packet_id, PACKET_SIZE, self.device_id, target_device, packet_type))
+
+        stamp = None
+        if self.latency is not None:
+            now = self.latency.clock()
+            for packet in packets_to_send:
+                packet.created = now
+            stamp = self.packets_enqueued
+        # One batch per round; if the switch's ingress stays full for a whole round the rest is dropped.
+        sent = self.switch_queue.put_many(packets_to_send, timeout=SEND_INTERVAL, stamp=stamp)
+
+        self.logger.info(
+            f"Device {self.device_id}: Sent {sent} packets to the switch."
+        )
+        if sent < len(packets_to_send):
+            self.logger.warning(
+                f"Device {self.device_id}: Switch ingress full, dropped {len(packets_to_send) - sent} packets."
+            )
+            self.packets_dropped += len(packets_to_send) - sent
+            PACKET_POOL.release(packets_to_send[sent:])
@@ -0,0 +1,278 @@
+import array
+import heapq
+import logging
+import queue
+import struct
+import sys
+import threading
+import time
+
+from packet import PACKET_TYPE_NAMES
+from sim_logging import PROCESS_LEVEL_NUM
+
+PACKET_SENT = 1
+BACKPRESSURE_SENT = 2
+CRITICAL_BACKPRESSURE_SENT = 3
+PACKET_DROPPED = 4
+PACKET_REQUEUED = 5
+CREDIT_RESTORED = 6
+RESTORE_SENT = 7
+BACKPRESSURE_CONTINUED = 8
+PACKET_HELD = 9
+
+# event -> (log level, message template)
+EVENT_FORMATS = {
+    PACKET_SENT: (
+        logging.INFO,
+        "Switch: {packet_type} packet from Device {source} to Device {target} sent. "
+        "Remaining buffer for Device {target}: {credit} bits."
+    ),
+    BACKPRESSURE_SENT: (
+        logging.WARNING,
+        "Switch: Backpressure signal sent to devices for Device {target} due to high buffer utilization."
+    ),
+    CRITICAL_BACKPRESSURE_SENT: (
+        logging.CRITICAL,
+        "Switch: Critical backpressure signal sent to all devices to stop sending to Device {target}"
+        "due to buffer overflow."
+    ),
+    PACKET_DROPPED: (
+        logging.WARNING,
+        "Switch: Packet from Device {source} to Device {target} dropped due to buffer overflow."
+        "Buffer space remaining: {credit} bits, Packet size: {amount} bits."
+    ),
+    PACKET_REQUEUED: (
+        logging.INFO,
+        "Switch: Re-queued packet {packet_id} from Device {source} back to incoming queue."
+    ),
+    CREDIT_RESTORED: (
+        PROCESS_LEVEL_NUM,
+        "Switch: Restored credit for Device {target} by {amount_bytes} bytes. "
+        "Current credit size: {credit_bytes} bytes."
+    ),
+    RESTORE_SENT: (
+        PROCESS_LEVEL_NUM,
+        "Switch: Sent RESTORE signal for Device {target} as buffer usage is below the threshold."
+    ),
+    BACKPRESSURE_CONTINUED: (
+        PROCESS_LEVEL_NUM,
+        "Switch: Continued backpressure for Device {target} due to high buffer utilization."
+    ),
+    PACKET_HELD: (
+        logging.INFO,
+        "Switch: Packet {packet_id} from Device {source} to Device {target} held in its virtual output queue. "
+        "Buffer space remaining: {credit} bits, Packet size: {amount} bits."
+    ),
+}
+
+COLUMNS = (
+    ("timestamp", "d"),
+    ("event", "B"),
+    ("packet_type", "B"),
+    ("source", "I"),
+    ("target", "I"),
+    ("packet_id", "q"),
+    ("credit", "q"),
+    ("amount", "q"),
+    ("actor", "H"),
+)
+
+MAGIC = b"CBFTRACE"
+FILE_HEADER = struct.Struct("<8sBc")
+# Record count, first timestamp and the byte length of the actor names that follow the header.
+CHUNK_HEADER = struct.Struct("<IdI")
+VERSION = 2
+DEFAULT_CAPACITY = 1 << 16
+
+
+def format_event(event, source, target, packet_id, credit, amount, packet_type):
+    level, template = EVENT_FORMATS[event]
+    message = template.format(source=source, target=target, packet_id=packet_id, credit=credit, amount=amount,
+                              packet_type=PACKET_TYPE_NAMES[packet_type], credit_bytes=credit / 8,
+                              amount_bytes=amount / 8)
+    return level, message
+
+
+class TextTrace:
+    # Formats every event straight into the logger, producing the classic simulation.log.
+    def __init__(self, logger):
+        self.logger = logger
+
+    def record(self, event, source, target, packet_id, credit, amount=0, packet_type=0):
+        level, message = format_event(event, source, target, packet_id, credit, amount, packet_type)
+        self.logger.log(level, message)
+
+    def close(self):
+        pass
+
+
+class TraceBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.columns = [array.array(code, bytes(capacity * array.array(code).itemsize)) for _, code in COLUMNS]
+        self.actor_id = 0
+
+
+class BinaryTrace:
+    # Fixed-width records go into per-thread, preallocated column buffers; a full buffer is
+    # handed to a background writer and replaced by a recycled one, so record() never formats,
+    # allocates or takes a lock. Each record names the thread that recorded it, as a number into a
+    # table of actor names that every chunk carries; an engine running several actors on one thread
+    # sets `actor` to a function returning the current one's name, as it sets `clock`.
+    def __init__(self, path, clock=time.time, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.clock = clock
+        self.capacity = capacity
+        self.actor = None
+        self.actor_ids = {}
+        self.actor_names = []
+        self.local = threading.local()
+        self.buffers = []
+        self.buffers_lock = threading.Lock()
+        self.free_buffers = queue.SimpleQueue()
+        self.full_buffers = queue.SimpleQueue()
+        self.records_written = 0
+
+        self.file = open(path, "wb")
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, b"<" if sys.byteorder == "little" else b">"))
+        self.writer = threading.Thread(target=self.write_buffers, name="TraceWriter", daemon=True)
+        self.writer.start()
+
+    def acquire_buffer(self):
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = TraceBuffer(self.capacity)
+        with self.buffers_lock:
+            self.buffers.append(buffer)
+        buffer.actor_id = self.actor_id(threading.current_thread().name)
+        self.local.buffer = buffer
+        return buffer
+
+    def actor_id(self, name):
+        actor_id = self.actor_ids.get(name)
+        if actor_id is None:
+            # Only the first record of a new actor takes the lock.
+            with self.buffers_lock:
+                actor_id = self.actor_ids.get(name)
+                if actor_id is None:
+                    actor_id = self.actor_ids[name] = len(self.actor_names)
+                    self.actor_names.append(name)
+        return actor_id
+
+    def record(self, event, source, target, packet_id, credit, amount=0, packet_type=0):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            buffer = self.acquire_buffer()
+        i = buffer.count
+        timestamps, events, packet_types, sources, targets, packet_ids, credits, amounts, actors = buffer.columns
+        timestamps[i] = self.clock()
+        events[i] = event
+        packet_types[i] = packet_type
+        sources[i] = source
+        targets[i] = target
+        packet_ids[i] = packet_id
+        credits[i] = credit
+        amounts[i] = amount
+        actors[i] = buffer.actor_id if self.actor is None else self.actor_id(self.actor())
+        buffer.count = i + 1
+        if buffer.count == buffer.capacity:
+            self.hand_off(buffer)
+            self.acquire_buffer()
+
+    def hand_off(self, buffer):
+        with self.buffers_lock:
+            self.buffers.remove(buffer)
+        self.full_buffers.put(buffer)
+
+    def write_buffers(self):
+        while True:
+            buffer = self.full_buffers.get()
+            if buffer is None:
+                return
+            if buffer.count:
+                # Names are only ever appended, so the table as of now covers every actor in the chunk.
+                names = "\n".join(self.actor_names[:]).encode()
+                self.file.write(CHUNK_HEADER.pack(buffer.count, buffer.columns[0][0], len(names)) + names)
+                for column in buffer.columns:
+                    self.file.write(memoryview(column)[:buffer.count].cast("B"))
+                self.records_written += buffer.count
+            buffer.count = 0
+            self.free_buffers.put(buffer)
+
+    def close(self):
+        with self.buffers_lock:
+            buffers, self.buffers = self.buffers, []
+        for buffer in buffers:
+            self.full_buffers.put(buffer)
+        self.full_buffers.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+def read_chunks(path):
+    # Yields (first timestamp, offset, count, actor names) for every chunk without loading the records.
+    with open(path, "rb") as f:
+        magic, version, byteorder = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} binary trace.")
+        chunk_size = sum(array.array(code).itemsize for _, code in COLUMNS)
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if not header:
+                return
+            count, first_timestamp, names_size = CHUNK_HEADER.unpack(header)
+            names = f.read(names_size).decode().split("\n")
+            yield first_timestamp, f.tell(), count, names
+            f.seek(count * chunk_size, 1)
+
+
+def load_chunk(f, offset, count):
+    f.seek(offset)
+    columns = []
+    for _, code in COLUMNS:
+        column = array.array(code)
+        column.frombytes(f.read(count * column.itemsize))
+        columns.append(column)
+    return zip(*columns)
+
+
+def read_records(path):
+    # Yields (timestamp, event, packet type, source, target, packet id, credit, amount, actor name).
+    # Each chunk is time-ordered (it comes from a single thread), so chunks are merged lazily:
+    # a chunk is only loaded once the merge reaches its first timestamp, keeping memory bounded
+    # by the number of chunks that overlap in time.
+    chunks = sorted(read_chunks(path))
+    # The chunk written last knows every actor.
+    names = max((chunk[3] for chunk in chunks), key=len, default=[])
+    with open(path, "rb") as f:
+        heap = []
+        next_chunk = 0
+        while heap or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and (not heap or chunks[next_chunk][0] <= heap[0][0]):
+                _, offset, count, _ = chunks[next_chunk]
+                records = load_chunk(f, offset, count)
+                record = next(records, None)
+                if record is not None:
+                    heapq.heappush(heap, (record[0], next_chunk, record, records))
+                next_chunk += 1
+            _, order, record, records = heapq.heappop(heap)
+            yield record[:-1] + (names[record[-1]],)
+            following = next(records, None)
+            if following is not None:
+                heapq.heappush(heap, (following[0], order, following, records))
+
+
+def render_text(path, output):
+    for timestamp, event, packet_type, source, target, packet_id, credit, amount, actor in read_records(path):
+        level, message = format_event(event, source, target, packet_id, credit, amount, packet_type)
+        asctime = time.strftime("%H:%M:%S", time.localtime(timestamp))
+        output.write(f"[{asctime}] [{actor}] [{logging.getLevelName(level)}] {message}\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python event_trace.py <trace file>  (writes the text log to stdout)")
+        sys.exit(1)
+    render_text(sys.argv[1], sys.stdout)
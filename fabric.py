@@ -0,0 +1,380 @@
+import argparse
+import collections
+import os
+import sys
+
+from channels import ReadySet, IngressQueue
+from controller import setup_loggers, close_logger
+from device import Device, SEND_INTERVAL, PROCESS_INTERVAL, device_rng
+from event_trace import (PACKET_SENT, PACKET_HELD, BACKPRESSURE_SENT, CRITICAL_BACKPRESSURE_SENT, RESTORE_SENT)
+from packet import signal
+from simulator import ALERT_LATENCY, DEFAULT_SEED, EventScheduler, VirtualClock, VirtualTimeFilter
+from switch import Switch, PROCESS_RATE
+from topology import Topology
+
+# Bits of buffer a switch has for each incoming link, i.e. the credit its upstream neighbour starts with.
+LINK_BUFFER_SIZE = 8 * 1024 * 8
+DEVICE_BUFFER_SIZE = 8 * 1024 * 8
+SHAPES = ("chain", "star", "fat-tree")
+
+
+class FabricTopology:
+    # Switches joined by links, with every device attached to one switch. Switches get ids after the
+    # device ids, so a port is always an int: a device id or the id of the neighbouring switch. Routes
+    # are shortest paths; where several next hops are equally short (a fat-tree's spines) the
+    # destination device picks one, so each flow keeps a single path.
+    def __init__(self, devices, switch_names, links, attachments, link_buffer_size=LINK_BUFFER_SIZE):
+        self.devices = devices
+        self.names = dict(switch_names)
+        self.switch_ids = list(self.names)
+        self.attachments = dict(attachments)
+        self.link_buffer_size = link_buffer_size
+        for device_id in devices.device_ids:
+            if self.attachments.get(device_id) not in self.names:
+                raise ValueError(f"Device {device_id} is not attached to a switch.")
+            self.names[device_id] = f"D{device_id}"
+
+        self.neighbors = {switch_id: [] for switch_id in self.switch_ids}
+        for a, b in links:
+            if a not in self.neighbors or b not in self.neighbors or a == b:
+                raise ValueError(f"Invalid link {a}-{b}.")
+            self.neighbors[a].append(b)
+            self.neighbors[b].append(a)
+        self.hosts = {switch_id: [] for switch_id in self.switch_ids}
+        for device_id in devices.device_ids:
+            self.hosts[self.attachments[device_id]].append(device_id)
+
+        self.routes = {switch_id: {} for switch_id in self.switch_ids}
+        for home in self.switch_ids:
+            distances = self.distances_to(home)
+            for device_id in self.hosts[home]:
+                for switch_id in self.switch_ids:
+                    if switch_id == home:
+                        self.routes[switch_id][device_id] = device_id
+                    elif switch_id not in distances:
+                        raise ValueError(f"{self.names[switch_id]} cannot reach {self.names[home]}.")
+                    else:
+                        next_hops = sorted(neighbor for neighbor in self.neighbors[switch_id]
+                                           if distances.get(neighbor) == distances[switch_id] - 1)
+                        self.routes[switch_id][device_id] = next_hops[device_id % len(next_hops)]
+
+        # ports[switch][port] = the neighbours (devices or switches) that send traffic out of that port.
+        self.ports = {switch_id: {port: {} for port in self.neighbors[switch_id] + self.hosts[switch_id]}
+                      for switch_id in self.switch_ids}
+        for source_device, rates in devices.transmission_rates.items():
+            for target_device in rates:
+                previous, switch_id = source_device, self.attachments[source_device]
+                while True:
+                    port = self.routes[switch_id][target_device]
+                    self.ports[switch_id][port][previous] = None
+                    if port == target_device:
+                        break
+                    previous, switch_id = switch_id, port
+
+    def distances_to(self, home):
+        distances = {home: 0}
+        frontier = collections.deque([home])
+        while frontier:
+            switch_id = frontier.popleft()
+            for neighbor in self.neighbors[switch_id]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[switch_id] + 1
+                    frontier.append(neighbor)
+        return distances
+
+    def buffer_sizes(self, switch_id):
+        return {port: self.devices.buffer_sizes[port] if port in self.devices.buffer_sizes else self.link_buffer_size
+                for port in self.ports[switch_id]}
+
+
+class SwitchPorts:
+    # What Switch needs from a topology, for one switch of a fabric.
+    def __init__(self, buffer_sizes, senders):
+        self.buffer_sizes = buffer_sizes
+        self.senders = senders
+
+
+def fabric_topology(shape, switches, devices_per_switch, spines=2, buffer_size=DEVICE_BUFFER_SIZE, rate=10,
+                    fanout=3, process_rate=PROCESS_RATE, link_buffer_size=LINK_BUFFER_SIZE):
+    # chain: S1 - S2 - ... - Sn. star: core S1 linked to S2..Sn. fat-tree: `switches` leaves, each linked
+    # to every one of `spines` spines. Devices sit on the chain's switches, the star's leaves or the
+    # fat-tree's leaves; device i sends to the devices `devices_per_switch * k` places further on
+    # (k = 1..fanout), which lands them on other switches.
+    if shape == "chain":
+        names = [f"S{index + 1}" for index in range(switches)]
+        links = [(index, index + 1) for index in range(switches - 1)]
+        hosting = list(range(switches))
+    elif shape == "star":
+        names = [f"S{index + 1}" for index in range(switches)]
+        links = [(0, index) for index in range(1, switches)]
+        hosting = list(range(1, switches))
+    elif shape == "fat-tree":
+        names = [f"Spine{index + 1}" for index in range(spines)] + [f"Leaf{index + 1}" for index in range(switches)]
+        links = [(spine, spines + leaf) for leaf in range(switches) for spine in range(spines)]
+        hosting = [spines + leaf for leaf in range(switches)]
+    else:
+        raise ValueError(f"Unknown fabric shape {shape!r}; expected one of {', '.join(SHAPES)}.")
+    if not hosting or devices_per_switch < 1:
+        raise ValueError("A fabric needs at least one switch with devices attached.")
+
+    num_devices = len(hosting) * devices_per_switch
+    device_ids = list(range(1, num_devices + 1))
+    switch_ids = [num_devices + 1 + index for index in range(len(names))]
+    attachments = {device_id: switch_ids[hosting[index // devices_per_switch]]
+                   for index, device_id in enumerate(device_ids)}
+    transmission_rates = {device_id: {} for device_id in device_ids}
+    for index, device_id in enumerate(device_ids):
+        for step in range(1, fanout + 1):
+            target_device = device_ids[(index + devices_per_switch * step) % num_devices]
+            if target_device != device_id:
+                transmission_rates[device_id][target_device] = rate
+    devices = Topology({device_id: buffer_size for device_id in device_ids}, transmission_rates,
+                       {device_id: process_rate for device_id in device_ids})
+    return FabricTopology(devices, dict(zip(switch_ids, names)),
+                          [(switch_ids[a], switch_ids[b]) for a, b in links], attachments, link_buffer_size)
+
+
+class PortStats:
+    def __init__(self):
+        self.forwarded = 0
+        self.held = 0
+        self.signals = 0
+        self.signals_received = 0
+        self.min_credit = None
+        self.first_congested = None
+        self.congested_since = None
+        self.congested_time = 0.0
+
+
+class LinkTrace:
+    # Tracer of one fabric switch that keeps per-port statistics instead of writing log lines, so a
+    # fabric of dozens of switches can be reported on per link.
+    def __init__(self, switch_id, stats, clock):
+        self.switch_id = switch_id
+        self.stats = stats
+        self.clock = clock
+
+    def record(self, event, source, target, packet_id, credit, amount=0, packet_type=0):
+        stats = self.stats[(self.switch_id, target)]
+        if event == PACKET_SENT:
+            stats.forwarded += 1
+            if stats.min_credit is None or credit < stats.min_credit:
+                stats.min_credit = credit
+        elif event == PACKET_HELD:
+            stats.held += 1
+        elif event in (BACKPRESSURE_SENT, CRITICAL_BACKPRESSURE_SENT):
+            stats.signals += 1
+            if stats.congested_since is None:
+                stats.congested_since = self.clock()
+                if stats.first_congested is None:
+                    stats.first_congested = stats.congested_since
+        elif event == RESTORE_SENT:
+            stats.signals += 1
+            if stats.congested_since is not None:
+                stats.congested_time += self.clock() - stats.congested_since
+                stats.congested_since = None
+
+    def close(self):
+        pass
+
+
+class DeviceSignals:
+    # A switch signals about its ports, but a device rates its traffic per destination: a signal about a
+    # port becomes one signal for each of the device's destinations routed through that port.
+    def __init__(self, control_signals, destinations_by_port):
+        self.control_signals = control_signals
+        self.destinations_by_port = destinations_by_port
+
+    def put(self, message, timeout=None):
+        return self.control_signals.put_many([signal(message.kind, target_device)
+                                              for target_device in self.destinations_by_port.get(message.target, ())])
+
+
+class SwitchSignals:
+    # Signals from a downstream switch are counted on the downstream port they are about, not relayed.
+    # Per-hop backpressure comes from the link's credit instead: packets held downstream return no credit,
+    # so the upstream switch's port to that link congests in turn and its own signaler throttles its
+    # senders. Relaying the signal as well would throttle every destination behind the link, not only
+    # the congested one.
+    def __init__(self, stats, downstream):
+        self.stats = stats
+        self.downstream = downstream
+
+    def put(self, message, timeout=None):
+        self.stats[(self.downstream, message.target)].signals_received += 1
+        return 1
+
+
+class FabricSimulation:
+    # The discrete-event engine for a fabric: every switch is woken on demand like the single switch of
+    # simulator.py, and a switch's events also wake its neighbours, which may have received packets or
+    # credit from it.
+    def __init__(self, fabric, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                 seed=DEFAULT_SEED, epoch=0.0, class_weights=None, check_credit=False):
+        self.fabric = fabric
+        self.simulation_logger = simulation_logger
+        self.memory_logger = memory_logger
+        self.DURATION = DURATION
+        self.seed = seed
+        self.clock = VirtualClock()
+        self.scheduler = EventScheduler(self.clock)
+        self.log_filter = VirtualTimeFilter(self.scheduler, epoch)
+        self.pending_alerts = ReadySet()
+        self.stats = {(switch_id, port): PortStats()
+                      for switch_id in fabric.switch_ids for port in fabric.ports[switch_id]}
+
+        incoming_queues = {}
+        credit_updates = {}
+        for switch_id in fabric.switch_ids:
+            ingress_ready = ReadySet()
+            incoming_queues[switch_id] = {port: IngressQueue(port, ingress_ready) for port in fabric.ports[switch_id]}
+            credit_updates[switch_id] = IngressQueue(switch_id)
+
+        devices = fabric.devices
+        self.devices = []
+        for device_id in devices.device_ids:
+            home = fabric.attachments[device_id]
+            device = Device(device_id, incoming_queues[home][device_id], memory_logger, RATIO, DURATION,
+                            transmission_rates=devices.transmission_rates[device_id],
+                            process_rate=devices.process_rates[device_id], credit_queue=credit_updates[home],
+                            rng=device_rng(seed, device_id))
+            device.control_signals = IngressQueue(device_id, self.pending_alerts)
+            self.devices.append(device)
+        devices_by_id = {device.device_id: device for device in self.devices}
+        self.devices_by_id = devices_by_id
+
+        self.switches = {}
+        for switch_id in fabric.switch_ids:
+            routes = fabric.routes[switch_id]
+            outgoing_queues = {}
+            control_queues = {}
+            for port in fabric.ports[switch_id]:
+                if port in devices_by_id:
+                    outgoing_queues[port] = devices_by_id[port].received_packets
+                    destinations_by_port = {}
+                    for target_device in devices.transmission_rates[port]:
+                        destinations_by_port.setdefault(routes[target_device], []).append(target_device)
+                    control_queues[port] = DeviceSignals(devices_by_id[port].control_signals, destinations_by_port)
+                else:
+                    outgoing_queues[port] = incoming_queues[port][switch_id]
+                    control_queues[port] = SwitchSignals(self.stats, switch_id)
+            self.switches[switch_id] = Switch(
+                incoming_queues[switch_id], outgoing_queues, control_queues, simulation_logger, STATE,
+                PRIORITY_OPTION, topology=SwitchPorts(fabric.buffer_sizes(switch_id), fabric.ports[switch_id]),
+                tracer=LinkTrace(switch_id, self.stats, self.clock.time), class_weights=class_weights,
+                check_credit=check_credit, credit_updates=credit_updates[switch_id], routes=routes,
+                switch_id=switch_id,
+                upstream_credit_queues={neighbor: credit_updates[neighbor] for neighbor in fabric.neighbors[switch_id]})
+        self.listen_scheduled = set()
+        self.restore_scheduled = set()
+
+    def deliver_alerts(self):
+        for device_id in self.pending_alerts.take():
+            self.scheduler.schedule(ALERT_LATENCY, f"Device{device_id}AlertHandler",
+                                    self.devices_by_id[device_id].check_alerts_once)
+
+    def request_listen(self, switch_id):
+        if switch_id not in self.listen_scheduled and len(self.switches[switch_id].ingress_ready):
+            self.listen_scheduled.add(switch_id)
+            self.scheduler.schedule(0, f"{self.fabric.names[switch_id]}Listener",
+                                    lambda: self.switch_listen(switch_id))
+
+    def request_restore(self, switch_id):
+        if switch_id not in self.restore_scheduled and self.switches[switch_id].credit_updates.qsize():
+            self.restore_scheduled.add(switch_id)
+            self.scheduler.schedule(0, f"{self.fabric.names[switch_id]}BufferRestorer",
+                                    lambda: self.switch_restore(switch_id))
+
+    def switch_listen(self, switch_id):
+        self.listen_scheduled.discard(switch_id)
+        self.switches[switch_id].listen_once()
+        self.wake_around(switch_id)
+
+    def switch_restore(self, switch_id):
+        self.restore_scheduled.discard(switch_id)
+        self.switches[switch_id].restore_once()
+        self.wake_around(switch_id)
+
+    def wake_around(self, switch_id):
+        self.deliver_alerts()
+        for neighbor in [switch_id] + self.fabric.neighbors[switch_id]:
+            self.request_listen(neighbor)
+            self.request_restore(neighbor)
+
+    def device_send(self, device):
+        device.send_once()
+        self.request_listen(self.fabric.attachments[device.device_id])
+
+    def device_process(self, device):
+        device.process_once()
+        self.request_restore(self.fabric.attachments[device.device_id])
+
+    def run(self):
+        self.simulation_logger.addFilter(self.log_filter)
+        self.memory_logger.addFilter(self.log_filter)
+        try:
+            for device in self.devices:
+                self.scheduler.schedule_periodic(SEND_INTERVAL, f"Device{device.device_id}Sender",
+                                                 lambda device=device: self.device_send(device), first_delay=0)
+                self.scheduler.schedule_periodic(PROCESS_INTERVAL, f"Device{device.device_id}Processor",
+                                                 lambda device=device: self.device_process(device), first_delay=0)
+            self.scheduler.run(self.DURATION - 1e-9)
+            for stats in self.stats.values():
+                if stats.congested_since is not None:
+                    stats.congested_time += self.DURATION - stats.congested_since
+        finally:
+            self.simulation_logger.removeFilter(self.log_filter)
+            self.memory_logger.removeFilter(self.log_filter)
+
+    def report(self, output=sys.stdout):
+        # Links in the order they first became congested, which shows how congestion spread.
+        names = self.fabric.names
+        output.write(f"{'link':>16} {'forwarded':>10} {'held':>7} {'signals':>8} {'to switches':>11} "
+                     f"{'first congested s':>18} {'congested s':>12} {'min credit':>11}\n")
+        rows = sorted(self.stats.items(), key=lambda item: (item[1].first_congested is None,
+                                                             item[1].first_congested or 0, item[0]))
+        for (switch_id, port), stats in rows:
+            first = f"{stats.first_congested:.2f}" if stats.first_congested is not None else "-"
+            min_credit = stats.min_credit if stats.min_credit is not None else "-"
+            output.write(f"{f'{names[switch_id]}->{names[port]}':>16} {stats.forwarded:>10} {stats.held:>7} "
+                         f"{stats.signals:>8} {stats.signals_received:>11} {first:>18} "
+                         f"{stats.congested_time:>12.2f} {min_credit:>11}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of a multi-switch fabric with hop-by-hop "
+                                                 "credit flow control.")
+    parser.add_argument("--shape", choices=SHAPES, default="chain")
+    parser.add_argument("--switches", type=int, default=4,
+                        help="switches in the chain / star (including the core), or leaves of the fat-tree")
+    parser.add_argument("--spines", type=int, default=2, help="spine switches of the fat-tree")
+    parser.add_argument("--devices-per-switch", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--rate", type=int, default=10)
+    parser.add_argument("--buffer-size", type=int, default=DEVICE_BUFFER_SIZE, help="device port buffer in bits")
+    parser.add_argument("--link-buffer-size", type=int, default=LINK_BUFFER_SIZE,
+                        help="per-link buffer in bits")
+    parser.add_argument("--process-rate", type=int, default=PROCESS_RATE)
+    parser.add_argument("--state", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--priority", type=int, choices=[1, 2, 3], default=1)
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--log-dir", default=".")
+    args = parser.parse_args()
+
+    fabric = fabric_topology(args.shape, args.switches, args.devices_per_switch, spines=args.spines,
+                             buffer_size=args.buffer_size, rate=args.rate, fanout=args.fanout,
+                             process_rate=args.process_rate, link_buffer_size=args.link_buffer_size)
+    os.makedirs(args.log_dir, exist_ok=True)
+    simulation_logger, memory_logger = setup_loggers(args.log_dir)
+    simulation = FabricSimulation(fabric, simulation_logger, memory_logger, args.state, 4 if args.state == 2 else 1,
+                                  args.priority, args.duration, seed=args.seed)
+    simulation.run()
+    close_logger(simulation_logger)
+    close_logger(memory_logger)
+    print(f"{args.shape}: {len(fabric.switch_ids)} switches, {len(fabric.devices)} devices, {args.duration} s.")
+    simulation.report()
+
+
+if __name__ == "__main__":
+    main()
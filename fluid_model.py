@@ -0,0 +1,193 @@
+import argparse
+import itertools
+import logging
+
+import numpy as np
+
+from event_trace import PACKET_SENT
+from signaling import CONGESTED_BELOW, CLEAR_AT
+from simulator import DiscreteEventSimulation
+from topology import default_topology
+
+PACKET_SIZE = 512
+# Congestion states, as announced by the switch's signaler.
+CLEAR, CONGESTED, STOPPED = 0, 1, 2
+
+
+def stack_topologies(topologies):
+    # Turns a list of same-sized topologies into (configs x ports) / (configs x ports x ports) arrays.
+    device_ids = topologies[0].device_ids
+    index = {device_id: position for position, device_id in enumerate(device_ids)}
+    num_configs, num_ports = len(topologies), len(device_ids)
+
+    buffer_sizes = np.zeros((num_configs, num_ports), dtype=np.int64)
+    process_rates = np.zeros((num_configs, num_ports), dtype=np.int64)
+    max_rates = np.zeros((num_configs, num_ports, num_ports), dtype=np.int64)
+    for config, topology in enumerate(topologies):
+        if topology.device_ids != device_ids:
+            raise ValueError("All topologies in a sweep must have the same devices.")
+        for device_id in device_ids:
+            buffer_sizes[config, index[device_id]] = topology.buffer_sizes[device_id]
+            process_rates[config, index[device_id]] = topology.process_rates[device_id]
+            for target_device, rate in topology.transmission_rates[device_id].items():
+                max_rates[config, index[device_id], index[target_device]] = rate
+    return device_ids, buffer_sizes, max_rates, process_rates
+
+
+def forward(credit, demand):
+    accepted = np.minimum(np.floor(demand + 1e-9), credit // PACKET_SIZE).astype(np.int64)
+    return accepted, credit - accepted * PACKET_SIZE
+
+
+def congestion_state(state, credit, congested_below, clear_at):
+    # Same hysteresis as signaling.CongestionSignaler; re-evaluating an unchanged credit is a no-op.
+    in_band = np.where(state == STOPPED, CONGESTED, state)
+    state = np.where(credit >= clear_at, CLEAR, in_band)
+    state = np.where(credit < congested_below, CONGESTED, state)
+    return np.where(credit <= 0, STOPPED, state)
+
+
+def simulate_fluid(buffer_sizes, max_rates, process_rates, steps):
+    # One step is one second: every sender applies the last congestion state announced for each
+    # destination (clear: +1, congested: halve, stopped: 0) and sends current_rates packets, devices
+    # process what the switch forwarded earlier, the switch forwards what credit allows, then the
+    # processed bits come back as credit and ports that were left waiting forward again with it. Flows
+    # are fluid within a destination, but credit is spent in whole packets as in the packet engine.
+    buffer_sizes = np.asarray(buffer_sizes, dtype=np.int64)
+    max_rates = np.asarray(max_rates, dtype=np.int64)
+    process_rates = np.asarray(process_rates, dtype=np.int64)
+    num_configs, num_ports = buffer_sizes.shape
+
+    is_sender = max_rates > 0
+    rates = max_rates.copy()
+    credit = buffer_sizes.copy()
+    state = np.full((num_configs, num_ports), CLEAR, dtype=np.int64)
+    backlog = np.zeros(max_rates.shape, dtype=np.float64)
+    device_queue = np.zeros((num_configs, num_ports), dtype=np.int64)
+    congested_below = CONGESTED_BELOW * buffer_sizes
+    clear_at = CLEAR_AT * buffer_sizes
+
+    credit_series = np.zeros((num_configs, num_ports, steps), dtype=np.int64)
+    delivered_series = np.zeros((num_configs, num_ports, steps), dtype=np.int64)
+    backlog_series = np.zeros((num_configs, num_ports, steps), dtype=np.float64)
+    rate_series = np.zeros((num_configs, num_ports, steps), dtype=np.int64)
+
+    for step in range(steps):
+        announced = state[:, None, :]
+        rates = np.where(announced == CLEAR, np.minimum(max_rates, rates + 1), rates)
+        rates = np.where(announced == CONGESTED, np.maximum(1, rates // 2), rates)
+        rates = np.where(is_sender & (announced != STOPPED), rates, 0)
+
+        offered = backlog + rates
+        demand = offered.sum(axis=1)
+        processed = np.minimum(device_queue, process_rates)
+        device_queue = device_queue - processed
+
+        accepted, credit = forward(credit, demand)
+        state = congestion_state(state, credit, congested_below, clear_at)
+        credit = np.minimum(credit + processed * PACKET_SIZE, buffer_sizes)
+        state = congestion_state(state, credit, congested_below, clear_at)
+        retried, credit = forward(credit, demand - accepted)
+        state = congestion_state(state, credit, congested_below, clear_at)
+
+        accepted = accepted + retried
+        share = np.divide(accepted, demand, out=np.zeros_like(demand), where=demand > 0)
+        backlog = np.maximum(offered * (1 - share[:, None, :]), 0)
+        device_queue = device_queue + accepted
+
+        credit_series[:, :, step] = credit
+        delivered_series[:, :, step] = accepted
+        backlog_series[:, :, step] = backlog.sum(axis=1)
+        rate_series[:, :, step] = rates.sum(axis=1)
+
+    return {
+        "credit": credit_series,
+        "delivered": delivered_series,
+        "backlog": backlog_series,
+        "offered_rate": rate_series,
+        "device_queue": device_queue,
+    }
+
+
+def sweep(base_topology, buffer_scales, rate_scales, process_rates, steps):
+    configurations = list(itertools.product(buffer_scales, rate_scales, process_rates))
+    device_ids = base_topology.device_ids
+    _, base_buffers, base_rates, _ = stack_topologies([base_topology])
+
+    buffer_factor = np.array([config[0] for config in configurations], dtype=np.float64)[:, None]
+    rate_factor = np.array([config[1] for config in configurations], dtype=np.float64)[:, None, None]
+    process = np.array([config[2] for config in configurations], dtype=np.int64)[:, None]
+
+    buffer_sizes = np.round(base_buffers * buffer_factor).astype(np.int64)
+    max_rates = np.round(base_rates * rate_factor).astype(np.int64)
+    process_rates = np.broadcast_to(process, buffer_sizes.shape)
+    return configurations, device_ids, simulate_fluid(buffer_sizes, max_rates, process_rates, steps)
+
+
+class DeliveryCounter:
+    # Minimal tracer that counts forwarded packets per destination and second for cross-checking.
+    def __init__(self, clock, device_ids, steps):
+        self.clock = clock
+        self.index = {device_id: position for position, device_id in enumerate(device_ids)}
+        self.delivered = np.zeros((len(device_ids), steps), dtype=np.int64)
+
+    def record(self, event, source, target, packet_id, credit, amount=0, packet_type=0):
+        if event == PACKET_SENT:
+            self.delivered[self.index[target], int(self.clock())] += 1
+
+    def close(self):
+        pass
+
+
+def cross_check(topology, steps, STATE=1, RATIO=1, PRIORITY_OPTION=1):
+    # Runs the packet-level discrete-event engine on the same topology and compares per-destination
+    # delivered packets with the fluid model.
+    quiet_logger = logging.getLogger("FluidCrossCheck")
+    quiet_logger.addHandler(logging.NullHandler())
+    quiet_logger.propagate = False
+    quiet_logger.setLevel(logging.CRITICAL + 1)
+
+    counter = DeliveryCounter(lambda: 0, topology.device_ids, steps)
+    simulation = DiscreteEventSimulation(quiet_logger, quiet_logger, STATE, RATIO, PRIORITY_OPTION, steps,
+                                         topology=topology, tracer=counter)
+    simulation.run()
+
+    device_ids, buffer_sizes, max_rates, process_rates = stack_topologies([topology])
+    fluid = simulate_fluid(buffer_sizes, max_rates, process_rates, steps)["delivered"][0]
+    packet = counter.delivered
+    return device_ids, packet, fluid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized fluid model of the credit-based flow control.")
+    parser.add_argument("--steps", type=int, default=60, help="simulated seconds")
+    parser.add_argument("--buffer-scales", type=float, nargs="+", default=[0.5, 1, 2, 4])
+    parser.add_argument("--rate-scales", type=float, nargs="+", default=[0.5, 1, 2])
+    parser.add_argument("--process-rates", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--cross-check", action="store_true",
+                        help="compare the default topology against the discrete-event engine")
+    args = parser.parse_args()
+
+    topology = default_topology()
+    if args.cross_check:
+        device_ids, packet, fluid = cross_check(topology, args.steps)
+        print(f"{'device':>8} {'packet engine':>14} {'fluid model':>12} {'error':>8}")
+        for position, device_id in enumerate(device_ids):
+            total_packet, total_fluid = packet[position].sum(), fluid[position].sum()
+            error = abs(total_fluid - total_packet) / max(total_packet, 1)
+            print(f"{device_id:>8} {total_packet:>14} {total_fluid:>12} {error:>8.1%}")
+        return
+
+    configurations, device_ids, result = sweep(topology, args.buffer_scales, args.rate_scales,
+                                               args.process_rates, args.steps)
+    throughput = result["delivered"].sum(axis=(1, 2)) / args.steps
+    min_credit = result["credit"].min(axis=(1, 2))
+    backlog = result["backlog"][:, :, -1].sum(axis=1)
+    print(f"{'buffer x':>9} {'rate x':>7} {'process':>8} {'pkt/s':>9} {'min credit':>11} {'final backlog':>14}")
+    for config, (buffer_scale, rate_scale, process_rate) in enumerate(configurations):
+        print(f"{buffer_scale:>9g} {rate_scale:>7g} {process_rate:>8} {throughput[config]:>9.1f} "
+              f"{min_credit[config]:>11} {backlog[config]:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
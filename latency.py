@@ -0,0 +1,136 @@
+import math
+import time
+
+from packet import PACKET_TYPE_NAMES
+
+SUB_BUCKETS = 16
+MIN_EXPONENT = -23
+MAX_EXPONENT = 15
+MIN_VALUE = 2.0 ** (MIN_EXPONENT - 1)
+NUM_BUCKETS = (MAX_EXPONENT - MIN_EXPONENT + 1) * SUB_BUCKETS + 1
+
+STAGES = ("batch", "ingress", "delivery", "total")
+STAGE_DESCRIPTIONS = {
+    "batch": "in the sender's batch (including waits for ingress space)",
+    "ingress": "in the switch ingress queue (including re-queues)",
+    "delivery": "in the destination's received_packets",
+    "total": "created to processed",
+}
+PERCENTILES = (0.5, 0.99, 0.999)
+
+
+class LogHistogram:
+    # Log-bucketed histogram: 16 buckets per power of two (about 4% relative error), covering
+    # 60 ns to several hours. Bucket 0 holds everything below that, including exact zeros.
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        if value < MIN_VALUE:
+            index = 0
+        else:
+            mantissa, exponent = math.frexp(value)
+            index = (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS) + 1
+            if index >= NUM_BUCKETS:
+                index = NUM_BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def bucket_upper_bound(self, index):
+        if index == 0:
+            return 0.0
+        exponent, sub_bucket = divmod(index - 1, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS), exponent + MIN_EXPONENT)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class LatencyRecorder:
+    # Histograms are keyed by (stage, source, target, packet type). Each key is only ever written
+    # by one thread (the sender, the switch listener or the destination's processor), so recording
+    # needs no lock; per-flow and per-type views are merged when the report is built.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}
+
+    def record(self, stage, source, target, packet_type, seconds):
+        key = (stage, source, target, packet_type)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LogHistogram()
+        histogram.record(seconds)
+
+    def packet_sent(self, packet, now):
+        self.record("batch", packet.source, packet.target, packet.type, now - packet.created)
+
+    def packet_forwarded(self, packet, now):
+        self.record("ingress", packet.source, packet.target, packet.type, now - packet.enqueued)
+
+    def packet_processed(self, packet, now):
+        self.record("delivery", packet.source, packet.target, packet.type, now - packet.forwarded)
+        self.record("total", packet.source, packet.target, packet.type, now - packet.created)
+
+    def absorb(self, histograms):
+        # Adds histograms recorded by another recorder, e.g. in another process of a multi-process run.
+        for key, histogram in histograms.items():
+            merged = self.histograms.get(key)
+            if merged is None:
+                merged = self.histograms[key] = LogHistogram()
+            merged.merge(histogram)
+
+    def merged(self, stage, key_function):
+        result = {}
+        for (histogram_stage, source, target, packet_type), histogram in list(self.histograms.items()):
+            if histogram_stage != stage:
+                continue
+            key = key_function(source, target, packet_type)
+            merged = result.get(key)
+            if merged is None:
+                merged = result[key] = LogHistogram()
+            merged.merge(histogram)
+        return result
+
+    def by_type(self, stage="total"):
+        return self.merged(stage, lambda source, target, packet_type: packet_type)
+
+    def by_flow(self, stage="total"):
+        return self.merged(stage, lambda source, target, packet_type: (source, target))
+
+    def report(self, output, stages=STAGES):
+        for stage in stages:
+            output.write(f"\nLatency {stage} ({STAGE_DESCRIPTIONS[stage]}), milliseconds:\n")
+            output.write(f"{'key':>14} {'count':>8} {'mean':>9} {'p50':>9} {'p99':>9} {'p99.9':>9} {'max':>9}\n")
+            rows = [(PACKET_TYPE_NAMES[packet_type], histogram)
+                    for packet_type, histogram in sorted(self.by_type(stage).items())]
+            rows += [(f"{source}->{target}", histogram)
+                     for (source, target), histogram in sorted(self.by_flow(stage).items())]
+            for key, histogram in rows:
+                p50, p99, p999 = (histogram.percentile(fraction) * 1000 for fraction in PERCENTILES)
+                output.write(f"{key:>14} {histogram.count:>8} {histogram.mean() * 1000:>9.2f} {p50:>9.2f} "
+                             f"{p99:>9.2f} {p999:>9.2f} {histogram.max * 1000:>9.2f}\n")
@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from packet import SignalKind
+
+METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9464
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics(switch, devices):
+    # Everything is aggregated here, at scrape time. The hot path only bumps plain counters that each
+    # have a single writer (packets_forwarded and packets_requeued on the serving thread, packets_dropped
+    # on the device's sender), and reading those and the rates needs no lock in CPython. The credits come
+    # from one consistent ledger snapshot, which only briefly takes the per-port locks.
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    credits = switch.credits.snapshot()
+    metric("cbfc_port_credit_bits", "gauge", "Credit left in each destination port's buffer.",
+           [({"port": port}, credit) for port, credit in credits.items()])
+    metric("cbfc_port_buffer_bits", "gauge", "Buffer size of each destination port.",
+           [({"port": port}, size) for port, size in switch.buffer_sizes.items()])
+    metric("cbfc_ingress_queue_depth", "gauge", "Packets waiting in the switch ingress, per source.",
+           [({"source": source}, queue.qsize()) for source, queue in switch.incoming_queues.items()])
+    metric("cbfc_egress_queue_depth", "gauge", "Packets queued at the switch for each port, waiting for credit.",
+           [({"port": port}, len(queue)) for port, queue in switch.output_queues.items()])
+    metric("cbfc_device_queue_depth", "gauge", "Forwarded packets waiting to be processed by each device.",
+           [({"device": device.device_id}, device.received_packets.qsize()) for device in devices])
+    metric("cbfc_packets_forwarded_total", "counter", "Packets forwarded by the switch.",
+           [({}, switch.packets_forwarded)])
+    metric("cbfc_packets_requeued_total", "counter", "Times a port's head packet was held back for lack of credit.",
+           [({}, switch.packets_requeued)])
+    metric("cbfc_packets_dropped_total", "counter", "Packets a device dropped because the switch ingress was full.",
+           [({"device": device.device_id}, device.packets_dropped) for device in devices])
+    metric("cbfc_signals_sent_total", "counter", "Congestion signals sent to devices, by kind.",
+           [({"kind": SignalKind(kind).name}, count) for kind, count in list(switch.signaler.signals_by_kind.items())])
+    metric("cbfc_device_rate_packets", "gauge", "Packets per send round each device currently sends to each target.",
+           [({"device": device.device_id, "target": target}, rate)
+            for device in devices for target, rate in list(device.current_rates.items())])
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    # Serves Prometheus text-format metrics for a running simulation on localhost. `network` returns
+    # the (switch, devices) being run, or None while they do not exist yet (the asyncio engine builds
+    # them inside its loop). The server runs in a daemon thread and never touches the simulation's locks.
+    def __init__(self, network, port=DEFAULT_METRICS_PORT):
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = outer.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.network = network
+        self.server = ThreadingHTTPServer((METRICS_HOST, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def render(self):
+        network = self.network()
+        return render_metrics(*network) if network is not None else ""
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -0,0 +1,98 @@
+from enum import IntEnum
+
+PACKET_SIZE = 512
+MAX_POOLED_PACKETS = 1 << 16
+
+
+class PacketType(IntEnum):
+    UNKNOWN = 0
+    TYPE1 = 1
+    TYPE2 = 2
+
+
+class SignalKind(IntEnum):
+    BACKPRESSURE = 1
+    RESTORE = 2
+    CRITICAL_BACKPRESSURE = 3
+
+
+TYPE1 = PacketType.TYPE1
+TYPE2 = PacketType.TYPE2
+BACKPRESSURE = SignalKind.BACKPRESSURE
+RESTORE = SignalKind.RESTORE
+CRITICAL_BACKPRESSURE = SignalKind.CRITICAL_BACKPRESSURE
+
+PACKET_TYPE_NAMES = {PacketType.UNKNOWN: "unknown", TYPE1: "type1", TYPE2: "type2"}
+
+
+class Packet:
+    __slots__ = ("id", "size", "source", "target", "type", "created", "enqueued", "forwarded")
+
+    def __repr__(self):
+        return f"Packet(id={self.id}, source={self.source}, target={self.target}, type={PACKET_TYPE_NAMES[self.type]})"
+
+
+class Signal:
+    # Signals carry no per-send state, so one shared instance per (kind, target) is reused forever;
+    # they are read-only, since changing one would change every signal of that kind and target.
+    __slots__ = ("kind", "target")
+
+    def __init__(self, kind, target):
+        object.__setattr__(self, "kind", kind)
+        object.__setattr__(self, "target", target)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Signal is read-only; use signal() to get the one for another kind or target.")
+
+    def __repr__(self):
+        return f"Signal({self.kind.name}, target={self.target})"
+
+
+class CreditUpdate:
+    # Sent by a device to the switch after a processing round: the bits it drained from its buffer.
+    __slots__ = ("destination", "amount")
+
+    def __init__(self, destination, amount):
+        self.destination = destination
+        self.amount = amount
+
+    def __repr__(self):
+        return f"CreditUpdate(destination={self.destination}, amount={self.amount})"
+
+
+SIGNALS = {}
+
+
+def signal(kind, target):
+    cached = SIGNALS.get((kind, target))
+    if cached is None:
+        cached = SIGNALS[(kind, target)] = Signal(kind, target)
+    return cached
+
+
+class PacketPool:
+    # Free list of Packet objects. list.append/pop are atomic, so senders can acquire and
+    # processors can release from different threads without a lock.
+    def __init__(self, max_pooled=MAX_POOLED_PACKETS):
+        self.free = []
+        self.max_pooled = max_pooled
+
+    def acquire(self, packet_id, size, source, target, packet_type):
+        try:
+            packet = self.free.pop()
+        except IndexError:
+            packet = Packet()
+        packet.id = packet_id
+        packet.size = size
+        packet.source = source
+        packet.target = target
+        packet.type = packet_type
+        packet.created = packet.enqueued = packet.forwarded = 0.0
+        return packet
+
+    def release(self, packets):
+        if len(self.free) < self.max_pooled:
+            self.free.extend(packets)
+
+
+PACKET_POOL = PacketPool()
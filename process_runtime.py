@@ -0,0 +1,152 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from device import Device, device_rng
+from event_trace import BinaryTrace
+from latency import LatencyRecorder
+from packet import PACKET_SIZE
+from shared_channels import (PACKET_CODEC, PACKET_RECORD, SIGNAL_CODEC, SIGNAL_RECORD, RingChannel, SharedCreditArray,
+                             SharedReadySet, SharedRing, allocate)
+from switch import Switch
+from topology import INGRESS_CAPACITY
+from traffic_record import IngressRecorder
+
+# Signals are only sent on congestion state changes, so a device's control ring rarely holds more than a few.
+CONTROL_CAPACITY = 1024
+RESULT_TIMEOUT = 1
+
+
+class SharedNetwork:
+    # Every ring, lock and event of a multi-process run. It is built before the processes are forked,
+    # so the switch and each device inherit the same shared memory block and synchronization objects.
+    def __init__(self, topology, context, ingress_capacity=INGRESS_CAPACITY):
+        device_ids = topology.device_ids
+        # The switch never has more than a port's buffer in flight towards it, so a delivery ring of that
+        # many packets can never fill up.
+        delivery_capacities = {device_id: max(1, topology.buffer_sizes[device_id] // PACKET_SIZE)
+                               for device_id in device_ids}
+        layout = []
+        for device_id in device_ids:
+            layout.append((PACKET_RECORD, ingress_capacity))
+            layout.append((PACKET_RECORD, delivery_capacities[device_id]))
+            layout.append((SIGNAL_RECORD, CONTROL_CAPACITY))
+        self.memory, self.views = allocate([SharedRing.nbytes(record, capacity) for record, capacity in layout]
+                                           + [SharedCreditArray.nbytes(len(device_ids))])
+        rings = [SharedRing(view, record, capacity, context.Lock())
+                 for view, (record, capacity) in zip(self.views, layout)]
+
+        self.stop_event = context.Event()
+        self.ingress_ready = SharedReadySet(context.Event())
+        self.incoming_queues = {}
+        self.outgoing_queues = {}
+        self.control_queues = {}
+        for index, device_id in enumerate(device_ids):
+            ingress, delivery, control = rings[3 * index:3 * index + 3]
+            self.incoming_queues[device_id] = RingChannel(device_id, ingress, PACKET_CODEC,
+                                                          ready_set=self.ingress_ready)
+            self.outgoing_queues[device_id] = RingChannel(device_id, delivery, PACKET_CODEC)
+            self.control_queues[device_id] = RingChannel(device_id, control, SIGNAL_CODEC, event=context.Event())
+        self.ingress_ready.channels = self.incoming_queues
+        self.credit_updates = SharedCreditArray(self.views[-1], device_ids, context.Event())
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.memory.close()
+        self.memory.unlink()
+
+
+def run_switch_process(network, topology, logger, STATE, PRIORITY_OPTION, DURATION, trace_path, measure_latency,
+                       class_weights, check_credit, record_path, results):
+    tracer = BinaryTrace(trace_path) if trace_path is not None else None
+    recorder = IngressRecorder(record_path, DURATION, STATE, PRIORITY_OPTION) if record_path is not None else None
+    latency = LatencyRecorder() if measure_latency else None
+    switch = Switch(network.incoming_queues, network.outgoing_queues, network.control_queues, logger, STATE,
+                    PRIORITY_OPTION, topology=topology, tracer=tracer, latency=latency, class_weights=class_weights,
+                    check_credit=check_credit, credit_updates=network.credit_updates, recorder=recorder)
+    threads = [threading.Thread(target=switch.listen, name="SwitchListener"),
+               threading.Thread(target=switch.restore_buffers, name="BufferRestorer")]
+    for thread in threads:
+        thread.start()
+    network.stop_event.wait()
+    switch.stop()
+    for thread in threads:
+        thread.join()
+    if tracer is not None:
+        tracer.close()
+    if recorder is not None:
+        recorder.close()
+    results.put(("switch", switch.signaler.summary(), switch.packets_forwarded,
+                 latency.histograms if latency is not None else {}))
+
+
+def run_device_process(network, device, results):
+    threads = [threading.Thread(target=device.send_packets, name=f"Device{device.device_id}Sender"),
+               threading.Thread(target=device.process_incoming, name=f"Device{device.device_id}Processor"),
+               threading.Thread(target=device.check_alerts, name=f"Device{device.device_id}AlertHandler")]
+    for thread in threads:
+        thread.start()
+    network.stop_event.wait()
+    device.running = False
+    for thread in threads:
+        thread.join()
+    results.put(("device", device.device_id, device.latency.histograms if device.latency is not None else {}))
+
+
+def run_multiprocess(topology, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                     trace_path=None, latency=None, class_weights=None, check_credit=False, seed=None,
+                     record_path=None):
+    # Runs the switch and every device in processes of their own, talking only through shared memory.
+    # Processes are forked so they inherit the shared block and the open log files; the loggers'
+    # files are opened for appending, so records from different processes do not overwrite each other.
+    # Returns the switch's signal summary and how many packets it forwarded; latency histograms
+    # recorded in the processes are merged into `latency`.
+    context = multiprocessing.get_context("fork")
+    network = SharedNetwork(topology, context)
+    results = context.Queue()
+    try:
+        processes = [context.Process(target=run_switch_process, name="Switch",
+                                     args=(network, topology, simulation_logger, STATE, PRIORITY_OPTION, DURATION,
+                                           trace_path, latency is not None, class_weights, check_credit,
+                                           record_path, results))]
+        for device_id in topology.device_ids:
+            device = Device(device_id, network.incoming_queues[device_id], memory_logger, RATIO, DURATION,
+                            transmission_rates=topology.transmission_rates[device_id],
+                            process_rate=topology.process_rates[device_id],
+                            latency=LatencyRecorder() if latency is not None else None,
+                            credit_queue=network.credit_updates, rng=device_rng(seed, device_id))
+            device.received_packets = network.outgoing_queues[device_id]
+            device.control_signals = network.control_queues[device_id]
+            processes.append(context.Process(target=run_device_process, name=f"Device{device_id}",
+                                             args=(network, device, results)))
+
+        for process in processes:
+            process.start()
+        time.sleep(DURATION)
+        simulation_logger.info("Stopping simulation...")
+        network.stop_event.set()
+
+        summary = None
+        forwarded = 0
+        reports = 0
+        while reports < len(processes):
+            try:
+                report = results.get(timeout=RESULT_TIMEOUT)
+            except queue.Empty:
+                if any(process.exitcode for process in processes):
+                    raise RuntimeError("A simulation process failed before reporting its results.")
+                continue
+            reports += 1
+            if report[0] == "switch":
+                _, summary, forwarded, histograms = report
+            else:
+                histograms = report[2]
+            if latency is not None:
+                latency.absorb(histograms)
+        for process in processes:
+            process.join()
+    finally:
+        network.close()
+    return summary, forwarded
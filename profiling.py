@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.1
+# Cumulative times in the dump are rounded to microseconds.
+DIGITS = 6
+
+
+class TimedLock:
+    # Drop-in for threading.Lock that records how long acquirers waited and how long it was held. The
+    # statistics are only updated while the lock is held, so they need no synchronization of their own.
+    def __init__(self, name, lock=None):
+        self.name = name
+        self.lock = lock if lock is not None else threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        contended = not self.lock.acquire(False)
+        if contended and not (blocking and self.lock.acquire(True, timeout)):
+            return False
+        now = time.perf_counter()
+        waited = now - start
+        self.acquisitions += 1
+        self.contended += contended
+        self.wait_total += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+        self.acquired_at = now
+        return True
+
+    def release(self):
+        held = time.perf_counter() - self.acquired_at
+        self.hold_total += held
+        if held > self.hold_max:
+            self.hold_max = held
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def thread_cpu_clock(thread):
+    # Per-thread CPU clocks need pthread_getcpuclockid, which not every platform has (e.g. macOS).
+    try:
+        return time.pthread_getcpuclockid(thread.ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class RuntimeProfiler:
+    # Opt-in instrumentation of a threaded run: wraps the switch, credit ledger, signaler and device
+    # locks in TimedLocks, and samples every SAMPLE_INTERVAL seconds the depth of each ingress and
+    # received_packets queue, the CPU time of each watched thread and the cumulative lock wait / hold
+    # times. Must be created before the run's threads start.
+    def __init__(self, switch, devices, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.locks = []
+        switch.lock = self.timed("Switch.lock", switch.lock)
+        switch.signaler.lock = self.timed("CongestionSignaler.lock", switch.signaler.lock)
+        switch.signaler.delivery_lock = self.timed("CongestionSignaler.delivery", switch.signaler.delivery_lock)
+        for destination in sorted(switch.credits.locks):
+            switch.credits.locks[destination] = self.timed(f"CreditLedger[{destination}]",
+                                                           switch.credits.locks[destination])
+        for device in devices:
+            device.lock = self.timed(f"Device{device.device_id}.lock", device.lock)
+
+        self.queues = {f"ingress{device_id}": queue for device_id, queue in sorted(switch.incoming_queues.items())}
+        for device in devices:
+            self.queues[f"received{device.device_id}"] = device.received_packets
+        self.thread_clocks = {}
+        self.times = []
+        self.depths = {name: [] for name in self.queues}
+        self.cpu = {}
+        self.lock_waits = {lock.name: [] for lock in self.locks}
+        self.lock_holds = {lock.name: [] for lock in self.locks}
+        self.start_time = None
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_loop, name="Profiler")
+
+    def timed(self, name, lock):
+        timed_lock = TimedLock(name, lock)
+        self.locks.append(timed_lock)
+        return timed_lock
+
+    def start(self, threads):
+        # `threads` must already be running, since a thread's CPU clock only exists once it has started.
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+        for thread in list(threads) + [self.sampler]:
+            clock = thread_cpu_clock(thread)
+            if clock is not None:
+                self.thread_clocks[thread.name] = clock
+                self.cpu[thread.name] = []
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.times.append(round(time.perf_counter() - self.start_time, 3))
+        for name, queue in self.queues.items():
+            self.depths[name].append(queue.qsize())
+        for name, clock in self.thread_clocks.items():
+            try:
+                self.cpu[name].append(round(time.clock_gettime(clock), DIGITS))
+            except OSError:
+                # The thread has exited; its last sample stands.
+                self.cpu[name].append(self.cpu[name][-1] if self.cpu[name] else None)
+        for lock in self.locks:
+            self.lock_waits[lock.name].append(round(lock.wait_total, DIGITS))
+            self.lock_holds[lock.name].append(round(lock.hold_total, DIGITS))
+
+    def stop(self):
+        self.stop_event.set()
+        self.sampler.join()
+        self.sample()
+
+    def dump(self, path):
+        # Columnar time series: one list per queue, thread and lock, aligned with "time".
+        with open(path, "w") as f:
+            json.dump({
+                "interval": self.interval,
+                "time": self.times,
+                "queue_depth": self.depths,
+                "thread_cpu_s": self.cpu,
+                "lock_wait_s": self.lock_waits,
+                "lock_hold_s": self.lock_holds,
+                "locks": {lock.name: {"acquisitions": lock.acquisitions, "contended": lock.contended,
+                                      "wait_max_s": round(lock.wait_max, DIGITS),
+                                      "hold_max_s": round(lock.hold_max, DIGITS)} for lock in self.locks},
+            }, f, separators=(",", ":"))
+
+    def report(self, output):
+        output.write(f"{'lock':>26} {'acquired':>9} {'contended':>10} {'wait ms':>9} {'max wait ms':>12} "
+                     f"{'hold ms':>9} {'max hold ms':>12}\n")
+        for lock in sorted(self.locks, key=lambda lock: -lock.wait_total):
+            output.write(f"{lock.name:>26} {lock.acquisitions:>9} {lock.contended:>10} "
+                         f"{lock.wait_total * 1000:>9.2f} {lock.wait_max * 1000:>12.3f} "
+                         f"{lock.hold_total * 1000:>9.2f} {lock.hold_max * 1000:>12.3f}\n")
+
+        output.write(f"\n{'queue':>26} {'mean depth':>11} {'max depth':>10}\n")
+        for name, depths in self.depths.items():
+            if depths:
+                output.write(f"{name:>26} {sum(depths) / len(depths):>11.1f} {max(depths):>10}\n")
+
+        if self.cpu:
+            output.write(f"\n{'thread':>26} {'cpu s':>9}\n")
+            totals = {name: next((value for value in reversed(samples) if value is not None), 0.0)
+                      for name, samples in self.cpu.items()}
+            for name, total in sorted(totals.items(), key=lambda item: -item[1]):
+                output.write(f"{name:>26} {total:>9.3f}\n")
+        else:
+            output.write("\nPer-thread CPU time is not available on this platform.\n")
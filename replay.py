@@ -0,0 +1,166 @@
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+
+from controller import setup_loggers, close_logger, stop_simulation, log_throughput
+from device import SEND_INTERVAL, PROCESS_INTERVAL
+from latency import LatencyRecorder
+from packet import PACKET_POOL, PacketType
+from simulator import DiscreteEventSimulation
+from topology import build_network, default_topology, load_topology
+from traffic_record import read_batches, read_run
+
+
+def feed(switch, source, records, latency=None):
+    # Puts one recorded batch into the switch ingress of `source`, as that device's sender would have.
+    acquire = PACKET_POOL.acquire
+    packets = [acquire(packet_id, size, source, target, PacketType(packet_type))
+               for packet_id, target, packet_type, size in records]
+    if latency is not None:
+        now = latency.clock()
+        for packet in packets:
+            packet.created = packet.enqueued = now
+    switch.incoming_queues[source].put_many(packets)
+
+
+class ReplaySimulation(DiscreteEventSimulation):
+    # The discrete-event engine with each device's sender replaced by its recorded traffic, while devices
+    # still process and return credit on their own schedule. Batches enter at the device's send ticks, in
+    # the same event order as the sender that produced them, so a recording made by this engine replays
+    # exactly; a batch recorded between ticks (by a real-time engine) enters at the nearest one. Simulated
+    # time costs nothing, so this replays as fast as the CPU allows.
+    def __init__(self, batches, simulation_logger, memory_logger, STATE, PRIORITY_OPTION, DURATION, topology=None,
+                 latency=None, class_weights=None, check_credit=False):
+        super().__init__(simulation_logger, memory_logger, STATE, 1, PRIORITY_OPTION, DURATION, topology=topology,
+                         latency=latency, class_weights=class_weights, check_credit=check_credit)
+        self.latency = latency
+        self.pending = {device.device_id: collections.deque() for device in self.devices}
+        for when, source, records in batches:
+            self.pending[source].append((when, records))
+
+    def replay_due(self, source):
+        due = self.pending[source]
+        horizon = self.clock.now + SEND_INTERVAL / 2
+        while due and due[0][0] < horizon:
+            feed(self.switch, source, due.popleft()[1], self.latency)
+        self.request_listen()
+
+    def setup(self):
+        scheduler = self.scheduler
+        for device in self.devices:
+            scheduler.schedule_periodic(SEND_INTERVAL, f"Device{device.device_id}Sender",
+                                        lambda device=device: self.replay_due(device.device_id), first_delay=0)
+            scheduler.schedule_periodic(PROCESS_INTERVAL, f"Device{device.device_id}Processor",
+                                        lambda device=device: self.device_process(device), first_delay=0)
+
+
+def replay_paced(switch, devices, batches, simulation_logger, DURATION, latency=None):
+    # The threaded engine with the senders replaced by one thread that feeds every batch at its
+    # original offset from the start of the run.
+    stopped = threading.Event()
+
+    def feed_batches():
+        start_time = time.time()
+        for when, source, records in batches:
+            if stopped.wait(max(0.0, start_time + when - time.time())):
+                return
+            feed(switch, source, records, latency)
+
+    threads = [threading.Thread(target=switch.listen, name="SwitchListener"),
+               threading.Thread(target=switch.restore_buffers, name="BufferRestorer")]
+    for device in devices:
+        threads.append(threading.Thread(target=device.process_incoming, name=f"Device{device.device_id}Processor"))
+        threads.append(threading.Thread(target=device.check_alerts, name=f"Device{device.device_id}AlertHandler"))
+    threads.append(threading.Thread(target=feed_batches, name="TrafficReplayer"))
+
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+
+    stopped.set()
+    stop_simulation(switch, devices, simulation_logger)
+    for thread in threads:
+        thread.join()
+    log_throughput(simulation_logger, switch.packets_forwarded, time.time() - start_time)
+
+
+def run_replay(path, STATE=None, PRIORITY_OPTION=None, paced=False, DURATION=None, topology=None, log_dir=".",
+               measure_latency=True, class_weights=None, check_credit=False):
+    # Returns how many packets the switch forwarded and the latency recorder (None if not measured).
+    # STATE, PRIORITY_OPTION and DURATION default to the recorded run's.
+    if topology is None:
+        topology = default_topology()
+    run = read_run(path)
+    if run is None:
+        # Version 1 recordings do not know how long their run was.
+        if DURATION is None:
+            raise ValueError(f"{path} does not record its run's duration; pass DURATION (--duration).")
+        run = (DURATION, 1, 1)
+    recorded_duration, recorded_state, recorded_priority = run
+    DURATION = recorded_duration if DURATION is None else DURATION
+    STATE = recorded_state if STATE is None else STATE
+    PRIORITY_OPTION = recorded_priority if PRIORITY_OPTION is None else PRIORITY_OPTION
+    batches = read_batches(path)
+    devices_seen = {source for _, source, _ in batches} | {record[1] for _, _, records in batches for record in records}
+    unknown = devices_seen - set(topology.device_ids)
+    if unknown:
+        raise ValueError(f"{path} uses devices {sorted(unknown)}, which are not in the topology.")
+    batches = [batch for batch in batches if batch[0] < DURATION]
+
+    simulation_logger, memory_logger = setup_loggers(log_dir)
+    latency = LatencyRecorder() if measure_latency else None
+    simulation_logger.info(f"Replaying {sum(len(records) for _, _, records in batches)} packets from {path}...")
+
+    if paced:
+        switch, devices = build_network(topology, simulation_logger, memory_logger, STATE, 1, PRIORITY_OPTION,
+                                        DURATION, latency=latency, class_weights=class_weights,
+                                        check_credit=check_credit, ingress_capacity=0)
+        replay_paced(switch, devices, batches, simulation_logger, DURATION, latency)
+    else:
+        simulation = ReplaySimulation(batches, simulation_logger, memory_logger, STATE, PRIORITY_OPTION, DURATION,
+                                      topology=topology, latency=latency, class_weights=class_weights,
+                                      check_credit=check_credit)
+        simulation.run()
+        switch = simulation.switch
+    simulation_logger.info(switch.signaler.summary())
+
+    if latency is not None:
+        with open(os.path.join(log_dir, "latency.txt"), "w") as f:
+            latency.report(f)
+
+    simulation_logger.info("Simulation completed.")
+    close_logger(simulation_logger)
+    close_logger(memory_logger)
+    return switch.packets_forwarded, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feed a recorded switch ingress (controller.py --record) back into "
+                                                 "a switch, to compare priority modes or switch changes on identical "
+                                                 "traffic.")
+    parser.add_argument("recording")
+    parser.add_argument("--state", type=int, choices=[1, 2], help="default: the recorded run's")
+    parser.add_argument("--priority", type=int, choices=[1, 2, 3], help="default: the recorded run's")
+    parser.add_argument("--paced", action="store_true",
+                        help="replay in real time at the original pacing instead of in simulated time")
+    parser.add_argument("--duration", type=int,
+                        help="seconds to replay (default: the recorded run's; required for version 1 recordings)")
+    parser.add_argument("--topology", help="topology JSON file the recording was made with")
+    parser.add_argument("--log-dir", default=".")
+    args = parser.parse_args()
+
+    topology = load_topology(args.topology) if args.topology else None
+    os.makedirs(args.log_dir, exist_ok=True)
+    start_time = time.perf_counter()
+    forwarded, latency = run_replay(args.recording, args.state, args.priority, paced=args.paced,
+                                    DURATION=args.duration, topology=topology, log_dir=args.log_dir)
+    print(f"Forwarded {forwarded} packets in {time.perf_counter() - start_time:.2f} s.")
+    latency.report(sys.stdout, stages=["total"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import collections
+
+from channels import VirtualOutputQueues
+from packet import TYPE1, TYPE2, PACKET_SIZE
+
+DEFAULT_CLASS_WEIGHTS = {TYPE1: 2, TYPE2: 1}
+# Bucket index per packet class, 0 served first; unlisted classes go to the last bucket.
+DEFAULT_CLASS_PRIORITIES = {TYPE1: 0, TYPE2: 1}
+
+
+class DeficitRoundRobin:
+    # Deficit round robin over one virtual output queue set per packet class. Each turn a class earns
+    # weight * quantum of size credit and sends head packets while their size fits in its deficit, so
+    # bandwidth is shared by size in proportion to the weights. Classes without packets are not in the
+    # round, so head() and pop() are O(1) amortized.
+    def __init__(self, weights=None, quantum=PACKET_SIZE):
+        if weights is None:
+            weights = DEFAULT_CLASS_WEIGHTS
+        # A class earning no deficit per turn would make head() spin forever.
+        for packet_class, weight in weights.items():
+            if weight <= 0:
+                raise ValueError(f"Class weight for {packet_class} must be positive, got {weight}.")
+        if quantum <= 0:
+            raise ValueError(f"Quantum must be positive, got {quantum}.")
+        self.weights = weights
+        self.quantum = quantum
+        self.classes = {}
+        self.deficits = {}
+        self.active = collections.deque()
+        self.in_turn = False
+        self.length = 0
+
+    def push(self, source, packet):
+        packet_class = packet.type
+        class_queue = self.classes.get(packet_class)
+        if class_queue is None:
+            class_queue = self.classes[packet_class] = VirtualOutputQueues()
+            self.deficits[packet_class] = 0
+        if not class_queue:
+            self.active.append(packet_class)
+        class_queue.push(source, packet)
+        self.length += 1
+
+    def head(self):
+        # Settles whose turn it is; calling it again without pop() returns the same packet, so a
+        # packet refused for lack of credit keeps its place in the round.
+        while True:
+            packet_class = self.active[0]
+            if not self.in_turn:
+                self.deficits[packet_class] += self.weights.get(packet_class, 1) * self.quantum
+                self.in_turn = True
+            source, packet = self.classes[packet_class].head()
+            if packet.size <= self.deficits[packet_class]:
+                return source, packet
+            self.active.rotate(-1)
+            self.in_turn = False
+
+    def pop(self):
+        source, packet = self.head()
+        packet_class = self.active[0]
+        class_queue = self.classes[packet_class]
+        class_queue.pop()
+        self.deficits[packet_class] -= packet.size
+        self.length -= 1
+        if not class_queue:
+            # An idle class keeps no deficit, as in standard DRR.
+            self.deficits[packet_class] = 0
+            self.active.popleft()
+            self.in_turn = False
+        return source, packet
+
+    def __len__(self):
+        return self.length
+
+
+class PriorityBuckets:
+    # One bucket per priority level, kept across listen ticks. Like VirtualOutputQueues, a bucket holds
+    # a FIFO per source and serves its backlogged sources round-robin, so a busy source cannot starve the
+    # others of the same class. In strict mode the head comes from the highest non-empty bucket;
+    # otherwise it is the oldest of the buckets' heads, found by comparing arrival numbers. Both cost
+    # O(number of levels) per operation.
+    def __init__(self, priorities=None, strict=True):
+        if priorities is None:
+            priorities = DEFAULT_CLASS_PRIORITIES
+        self.priorities = priorities
+        self.buckets = [VirtualOutputQueues() for _ in range(max(priorities.values()) + 1)]
+        self.strict = strict
+        self.arrivals = 0
+        self.length = 0
+
+    def push(self, source, packet):
+        level = self.priorities.get(packet.type, len(self.buckets) - 1)
+        self.buckets[level].push(source, (self.arrivals, packet))
+        self.arrivals += 1
+        self.length += 1
+
+    def head_bucket(self):
+        oldest = None
+        oldest_arrival = None
+        for bucket in self.buckets:
+            if bucket:
+                if self.strict:
+                    return bucket
+                arrival = bucket.head()[1][0]
+                if oldest is None or arrival < oldest_arrival:
+                    oldest = bucket
+                    oldest_arrival = arrival
+        return oldest
+
+    def head(self):
+        source, (_, packet) = self.head_bucket().head()
+        return source, packet
+
+    def pop(self):
+        source, (_, packet) = self.head_bucket().pop()
+        self.length -= 1
+        return source, packet
+
+    def __len__(self):
+        return self.length
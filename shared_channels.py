@@ -0,0 +1,229 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+from packet import PACKET_POOL, CreditUpdate, Packet, SignalKind, signal
+
+# Packet id, size, source, target, type and the created / enqueued / forwarded timestamps.
+PACKET_RECORD = struct.Struct("<qIIIBddd")
+SIGNAL_RECORD = struct.Struct("<BI")
+# Records consumed (head) and produced (tail) so far; both only ever grow.
+RING_HEADER = struct.Struct("<QQ")
+COUNTER = struct.Struct("<Q")
+CACHE_LINE = 64
+# How often a producer that found its ring full tries again.
+FULL_RETRY_INTERVAL = 0.001
+
+
+def encode_packet(packet):
+    return (packet.id, packet.size, packet.source, packet.target, packet.type, packet.created, packet.enqueued,
+            packet.forwarded)
+
+
+def decode_packet(fields):
+    packet = PACKET_POOL.acquire(*fields[:5])
+    packet.created, packet.enqueued, packet.forwarded = fields[5:]
+    return packet
+
+
+def peek_packet(fields):
+    # For snapshots, which are only looked at: a fresh object, since nothing would return a pooled one.
+    packet = Packet()
+    packet.id, packet.size, packet.source, packet.target, packet.type = fields[:5]
+    packet.created, packet.enqueued, packet.forwarded = fields[5:]
+    return packet
+
+
+def encode_signal(message):
+    return message.kind, message.target
+
+
+def decode_signal(fields):
+    return signal(SignalKind(fields[0]), fields[1])
+
+
+# (record format, encode, decode, decode for snapshots)
+PACKET_CODEC = (PACKET_RECORD, encode_packet, decode_packet, peek_packet)
+SIGNAL_CODEC = (SIGNAL_RECORD, encode_signal, decode_signal, decode_signal)
+
+
+def allocate(sizes):
+    # One shared memory block split into cache-line aligned views, so a run maps a single block (and
+    # keeps a single file descriptor) however many rings it has. The views must be released before
+    # the block is closed.
+    offsets = []
+    total = 0
+    for size in sizes:
+        offsets.append(total)
+        total += -(-size // CACHE_LINE) * CACHE_LINE
+    memory = shared_memory.SharedMemory(create=True, size=max(total, CACHE_LINE))
+    return memory, [memory.buf[offset:offset + size] for offset, size in zip(offsets, sizes)]
+
+
+class SharedRing:
+    # Bounded FIFO of fixed-size records in shared memory, for one producer and one consumer process.
+    # Each side takes the ring's (multiprocessing) lock once per batch, which also makes the records
+    # written under it visible to the other process before the updated index is.
+    def __init__(self, buffer, record, capacity, lock):
+        self.buffer = buffer
+        self.record = record
+        self.capacity = capacity
+        self.lock = lock
+
+    @staticmethod
+    def nbytes(record, capacity):
+        return RING_HEADER.size + record.size * capacity
+
+    def push_many(self, records):
+        # Returns how many of `records` fitted.
+        buffer = self.buffer
+        pack_into = self.record.pack_into
+        size = self.record.size
+        with self.lock:
+            head, tail = RING_HEADER.unpack_from(buffer)
+            count = min(len(records), self.capacity - (tail - head))
+            for index in range(count):
+                pack_into(buffer, RING_HEADER.size + (tail + index) % self.capacity * size, *records[index])
+            COUNTER.pack_into(buffer, COUNTER.size, tail + count)
+        return count
+
+    def pop_many(self, max_items=None, consume=True):
+        buffer = self.buffer
+        unpack_from = self.record.unpack_from
+        size = self.record.size
+        with self.lock:
+            head, tail = RING_HEADER.unpack_from(buffer)
+            count = tail - head if max_items is None else min(tail - head, max_items)
+            records = [unpack_from(buffer, RING_HEADER.size + (head + index) % self.capacity * size)
+                       for index in range(count)]
+            if consume:
+                COUNTER.pack_into(buffer, 0, head + count)
+        return records
+
+    def __len__(self):
+        with self.lock:
+            head, tail = RING_HEADER.unpack_from(self.buffer)
+        return tail - head
+
+
+class RingChannel:
+    # IngressQueue's interface over a SharedRing, turning objects into records and back with a codec.
+    # A consumer blocked in get_many is woken through `event` (a multiprocessing.Event); like
+    # IngressQueue, every put also reports the owner to `ready_set`.
+    def __init__(self, owner, ring, codec, event=None, ready_set=None):
+        self.owner = owner
+        self.ring = ring
+        _, self.encode, self.decode, self.peek = codec
+        self.event = event
+        self.ready_set = ready_set
+
+    def put(self, item, timeout=None):
+        return self.put_many((item,), timeout)
+
+    def put_many(self, items, timeout=None, stamp=None):
+        # Returns how many items were enqueued; fewer than len(items) only if the timeout expired. With a
+        # `stamp`, the items not yet pushed are stamped and encoded again before every retry.
+        items = list(items)
+        if stamp is not None:
+            stamp(items)
+        records = [self.encode(item) for item in items]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        count = 0
+        while True:
+            if count and stamp is not None:
+                stamp(items[count:])
+                records[count:] = [self.encode(item) for item in items[count:]]
+            pushed = self.ring.push_many(records[count:] if count else records)
+            if pushed:
+                count += pushed
+                if self.event is not None:
+                    self.event.set()
+                if self.ready_set is not None:
+                    self.ready_set.mark(self.owner)
+            if count == len(records) or (deadline is not None and time.monotonic() >= deadline):
+                return count
+            time.sleep(FULL_RETRY_INTERVAL)
+
+    def get_many(self, max_items=None, timeout=0):
+        if self.event is not None:
+            if timeout and not len(self.ring):
+                self.event.wait(timeout)
+            # Cleared before reading, so a put landing after the read sets it again.
+            self.event.clear()
+        return [self.decode(fields) for fields in self.ring.pop_many(max_items)]
+
+    def get_all(self, timeout=0):
+        return self.get_many(None, timeout)
+
+    def snapshot(self):
+        return [self.peek(fields) for fields in self.ring.pop_many(consume=False)]
+
+    def qsize(self):
+        return len(self.ring)
+
+    def empty(self):
+        return not len(self.ring)
+
+
+class SharedReadySet:
+    # ReadySet for channels fed from other processes: every producer sets one shared event, and the
+    # consumer finds out which of its channels hold records by looking at each of them.
+    def __init__(self, event, channels=None):
+        self.event = event
+        self.channels = channels if channels is not None else {}
+        self.closed = False
+
+    def mark(self, owner):
+        self.event.set()
+
+    def wake(self):
+        self.event.set()
+
+    def take(self):
+        self.event.clear()
+        return {owner: None for owner, channel in self.channels.items() if not channel.empty()}
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout) or self.closed
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+
+class SharedCreditArray:
+    # Credit returned by the devices, as one cumulative bit counter per device in shared memory. A
+    # device only ever adds to its own counter, so writers need no lock; the switch turns the growth
+    # of each counter since its last look into a CreditUpdate, which makes this a drop-in for the
+    # switch's credit_updates channel.
+    def __init__(self, buffer, device_ids, event):
+        self.buffer = buffer
+        self.offsets = {device_id: index * COUNTER.size for index, device_id in enumerate(device_ids)}
+        self.seen = dict.fromkeys(device_ids, 0)
+        self.event = event
+
+    @staticmethod
+    def nbytes(count):
+        return COUNTER.size * count
+
+    def put(self, update):
+        offset = self.offsets[update.destination]
+        COUNTER.pack_into(self.buffer, offset, COUNTER.unpack_from(self.buffer, offset)[0] + update.amount)
+        self.event.set()
+
+    def returned(self):
+        return {device_id: COUNTER.unpack_from(self.buffer, offset)[0] for device_id, offset in self.offsets.items()}
+
+    def get_all(self, timeout=0):
+        if timeout:
+            self.event.wait(timeout)
+        self.event.clear()
+        updates = []
+        for device_id, total in self.returned().items():
+            if total != self.seen[device_id]:
+                updates.append(CreditUpdate(device_id, total - self.seen[device_id]))
+                self.seen[device_id] = total
+        return updates
+
+    def qsize(self):
+        return sum(total != self.seen[device_id] for device_id, total in self.returned().items())
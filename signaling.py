@@ -0,0 +1,94 @@
+import threading
+
+from event_trace import BACKPRESSURE_SENT, CRITICAL_BACKPRESSURE_SENT, RESTORE_SENT
+from packet import BACKPRESSURE, RESTORE, CRITICAL_BACKPRESSURE, signal
+
+# A port becomes congested when its credit falls below CONGESTED_BELOW of its buffer, stopped at zero
+# credit, and only counts as clear again once credit is back to CLEAR_AT, so it cannot flap around
+# a single threshold.
+CONGESTED_BELOW = 0.4
+CLEAR_AT = 0.6
+
+SIGNAL_EVENTS = {
+    BACKPRESSURE: BACKPRESSURE_SENT,
+    CRITICAL_BACKPRESSURE: CRITICAL_BACKPRESSURE_SENT,
+    RESTORE: RESTORE_SENT,
+}
+
+
+class CongestionSignaler:
+    # Tracks a congestion state per destination port (RESTORE = clear, BACKPRESSURE = congested,
+    # CRITICAL_BACKPRESSURE = stopped) and tells the port's senders only when that state changes.
+    # update() may be called many times within a window (one listen batch or one batch of credit
+    # updates); flush() then sends at most one signal per port, and none if the port ended the
+    # window in the state its senders already know. The credit is read from the ledger under the
+    # signaler's lock, so the debiting and restoring threads can never apply a stale value out of order.
+    def __init__(self, credits, senders, control_queues, tracer):
+        self.credits = credits
+        self.congested_below = {port: CONGESTED_BELOW * size for port, size in credits.capacities.items()}
+        self.clear_at = {port: CLEAR_AT * size for port, size in credits.capacities.items()}
+        self.senders = senders
+        self.control_queues = control_queues
+        self.tracer = tracer
+        self.state = {}
+        self.announced = {}
+        self.changed = {}
+        self.signals_sent = 0
+        self.signals_by_kind = {kind: 0 for kind in SIGNAL_EVENTS}
+        self.signals_replaced = 0
+        self.lock = threading.Lock()
+        self.delivery_lock = threading.Lock()
+
+    def update(self, port, replaced=0):
+        # `replaced` counts the signals the old per-packet / per-restore scheme would have broadcast here.
+        with self.lock:
+            credit = self.credits[port]
+            state = self.state.get(port, RESTORE)
+            if credit <= 0:
+                new_state = CRITICAL_BACKPRESSURE
+            elif credit < self.congested_below[port]:
+                new_state = BACKPRESSURE
+            elif credit >= self.clear_at[port]:
+                new_state = RESTORE
+            elif state == CRITICAL_BACKPRESSURE:
+                new_state = BACKPRESSURE
+            else:
+                new_state = state
+            if new_state != state:
+                self.state[port] = new_state
+                self.changed[port] = credit
+            self.signals_replaced += replaced * len(self.senders[port])
+
+    def flush(self):
+        # Only the state swap happens under `lock`, so update() on the hot path never waits for queue puts or
+        # trace records. Deliveries are serialized by `delivery_lock`, taken before `lock` is released, so
+        # two flushes (listener and restorer) always deliver in the order they announced.
+        self.lock.acquire()
+        try:
+            changed, self.changed = self.changed, {}
+            announcements = []
+            for port, credit in changed.items():
+                state = self.state[port]
+                if state == self.announced.get(port, RESTORE):
+                    continue
+                self.announced[port] = state
+                self.signals_sent += len(self.senders[port])
+                self.signals_by_kind[state] += len(self.senders[port])
+                announcements.append((port, state, credit))
+            self.delivery_lock.acquire()
+        finally:
+            self.lock.release()
+        try:
+            for port, state, credit in announcements:
+                message = signal(state, port)
+                for device_id in self.senders[port]:
+                    self.control_queues[device_id].put(message)
+                self.tracer.record(SIGNAL_EVENTS[state], 0, port, 0, credit)
+        finally:
+            self.delivery_lock.release()
+
+    def summary(self):
+        saved = self.signals_replaced - self.signals_sent
+        share = 100 * saved / self.signals_replaced if self.signals_replaced else 0.0
+        return (f"Switch: Sent {self.signals_sent} congestion signals instead of {self.signals_replaced} "
+                f"({saved} saved, {share:.1f}%).")
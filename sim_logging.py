@@ -0,0 +1,12 @@
+import logging
+
+PROCESS_LEVEL_NUM = 25
+logging.addLevelName(PROCESS_LEVEL_NUM, "PROCESS")
+
+
+def process(self, message, *args, **kws):
+    if self.isEnabledFor(PROCESS_LEVEL_NUM):
+        self._log(PROCESS_LEVEL_NUM, message, args, **kws)
+
+
+logging.Logger.process = process
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import logging
+import time
+
+from channels import ReadySet
+from device import SEND_INTERVAL, PROCESS_INTERVAL
+from topology import build_network, default_topology
+
+DEFAULT_SEED = 0
+
+# Delay between a signal being queued and the device's AlertHandler reacting to it.
+ALERT_LATENCY = 0.0001
+
+
+class VirtualClock:
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+
+class EventScheduler:
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+        self.sequence = itertools.count()
+        self.current_actor = "MainThread"
+        self.events_processed = 0
+
+    def schedule(self, delay, actor, callback):
+        heapq.heappush(self.events, (self.clock.now + delay, next(self.sequence), actor, callback))
+
+    def schedule_periodic(self, interval, actor, callback, first_delay=None):
+        def fire():
+            callback()
+            self.schedule(interval, actor, fire)
+
+        self.schedule(interval if first_delay is None else first_delay, actor, fire)
+
+    def run(self, until):
+        while self.events and self.events[0][0] <= until:
+            when, _, actor, callback = heapq.heappop(self.events)
+            self.clock.now = when
+            self.current_actor = actor
+            callback()
+            self.events_processed += 1
+        self.clock.now = until
+        self.current_actor = "MainThread"
+
+
+class VirtualTimeFilter(logging.Filter):
+    # Rewrites each record's timestamp and thread name so that logs produced by the
+    # event engine look exactly like the threaded ones, but are driven by simulated time.
+    def __init__(self, scheduler, epoch):
+        super().__init__()
+        self.scheduler = scheduler
+        self.epoch = epoch
+
+    def filter(self, record):
+        record.created = self.epoch + self.scheduler.clock.now
+        record.msecs = (record.created - int(record.created)) * 1000
+        record.threadName = self.scheduler.current_actor
+        return True
+
+
+class DiscreteEventSimulation:
+    def __init__(self, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION, topology=None,
+                 seed=DEFAULT_SEED, epoch=0.0, tracer=None, latency=None, class_weights=None,
+                 check_credit=False, recorder=None):
+        self.simulation_logger = simulation_logger
+        self.memory_logger = memory_logger
+        self.DURATION = DURATION
+        self.seed = seed
+        self.clock = VirtualClock()
+        self.scheduler = EventScheduler(self.clock)
+        self.log_filter = VirtualTimeFilter(self.scheduler, epoch)
+
+        if topology is None:
+            topology = default_topology()
+        if tracer is not None:
+            tracer.clock = lambda: epoch + self.clock.now
+            tracer.actor = lambda: self.scheduler.current_actor
+        if latency is not None:
+            latency.clock = self.clock.time
+        if recorder is not None:
+            recorder.clock = self.clock.time
+            recorder.start = self.clock.now
+        # Devices that were signalled since the last switch event; only they need an alert pass.
+        self.pending_alerts = ReadySet()
+        self.switch, self.devices = build_network(topology, simulation_logger, memory_logger, STATE, RATIO,
+                                                  PRIORITY_OPTION, DURATION, signal_ready=self.pending_alerts,
+                                                  tracer=tracer, latency=latency, class_weights=class_weights,
+                                                  check_credit=check_credit, ingress_capacity=0, seed=seed,
+                                                  recorder=recorder)
+        self.devices_by_id = {device.device_id: device for device in self.devices}
+        self.listen_scheduled = False
+        self.restore_scheduled = False
+
+    def deliver_alerts(self):
+        for device_id in self.pending_alerts.take():
+            self.scheduler.schedule(ALERT_LATENCY, f"Device{device_id}AlertHandler",
+                                    self.devices_by_id[device_id].check_alerts_once)
+
+    def request_listen(self):
+        # The listener is woken by enqueues rather than polled, exactly like the threaded switch.
+        if not self.listen_scheduled and len(self.switch.ingress_ready):
+            self.listen_scheduled = True
+            self.scheduler.schedule(0, "SwitchListener", self.switch_listen)
+
+    def switch_listen(self):
+        self.listen_scheduled = False
+        self.restore_scheduled = False
+        self.switch.listen_once()
+        self.deliver_alerts()
+
+    def request_restore(self):
+        # Credit comes back only when a device reports what it processed, so the restorer runs on demand.
+        if not self.restore_scheduled and self.switch.credit_updates.qsize():
+            self.restore_scheduled = True
+            self.scheduler.schedule(0, "BufferRestorer", self.switch_restore)
+
+    def switch_restore(self):
+        self.restore_scheduled = False
+        self.switch.restore_once()
+        self.deliver_alerts()
+        self.request_listen()
+
+    def device_send(self, device):
+        device.send_once()
+        self.request_listen()
+
+    def device_process(self, device):
+        device.process_once()
+        self.request_restore()
+
+    def setup(self):
+        scheduler = self.scheduler
+        for device in self.devices:
+            scheduler.schedule_periodic(SEND_INTERVAL, f"Device{device.device_id}Sender",
+                                        lambda device=device: self.device_send(device), first_delay=0)
+            scheduler.schedule_periodic(PROCESS_INTERVAL, f"Device{device.device_id}Processor",
+                                        lambda device=device: self.device_process(device), first_delay=0)
+
+    def run(self):
+        self.simulation_logger.addFilter(self.log_filter)
+        self.memory_logger.addFilter(self.log_filter)
+        try:
+            self.scheduler.current_actor = "SwitchListener"
+            self.simulation_logger.info("Switch: Listening for incoming packets...")
+            self.scheduler.current_actor = "BufferRestorer"
+            self.simulation_logger.info("Switch: Buffer restoration thread started.")
+            self.setup()
+
+            wall_start = time.perf_counter()
+            # Components are stopped at DURATION, so events at exactly DURATION are not executed.
+            self.scheduler.run(self.DURATION - 1e-9)
+            wall_time = time.perf_counter() - wall_start
+
+            self.switch.running = False
+            for device in self.devices:
+                device.running = False
+        finally:
+            self.simulation_logger.removeFilter(self.log_filter)
+            self.memory_logger.removeFilter(self.log_filter)
+
+        speedup = self.DURATION / wall_time if wall_time > 0 else float('inf')
+        self.simulation_logger.info(
+            f"Discrete-event engine: simulated {self.DURATION} s in {wall_time:.3f} s "
+            f"({speedup:.0f}x real time, {self.scheduler.events_processed} events)."
+        )
+        return wall_time
@@ -0,0 +1,240 @@
+import selectors
+import socket
+import struct
+import threading
+import time
+
+from channels import ReadySet, IngressQueue
+from device import Device, device_rng
+from packet import PACKET_POOL, CreditUpdate, SignalKind, signal
+from switch import Switch, LISTEN_TIMEOUT
+
+# Every frame has the same size: kind, packet type / signal kind, padding, source, target, packet size or
+# credit amount, packet id and the created / enqueued / forwarded timestamps.
+FRAME = struct.Struct("<BBHIIQqddd")
+PACKET_FRAME = 1
+SIGNAL_FRAME = 2
+CREDIT_FRAME = 3
+RECEIVE_BUFFER_SIZE = 1 << 16
+
+
+def encode_packet(packet):
+    return (PACKET_FRAME, packet.type, 0, packet.source, packet.target, packet.size, packet.id, packet.created,
+            packet.enqueued, packet.forwarded)
+
+
+def decode_packet(frame):
+    _, packet_type, _, source, target, size, packet_id, created, enqueued, forwarded = frame
+    packet = PACKET_POOL.acquire(packet_id, size, source, target, packet_type)
+    packet.created, packet.enqueued, packet.forwarded = created, enqueued, forwarded
+    return packet
+
+
+def encode_signal(message):
+    return SIGNAL_FRAME, message.kind, 0, 0, message.target, 0, 0, 0.0, 0.0, 0.0
+
+
+def encode_credit(update):
+    return CREDIT_FRAME, 0, 0, 0, update.destination, update.amount, 0, 0.0, 0.0, 0.0
+
+
+class SocketLink:
+    # One end of a TCP connection carrying fixed-size frames. A batch of frames is packed into one
+    # buffer and written with as few send() calls as the kernel accepts; receive() does one recv() and
+    # returns the complete frames, keeping a partial one for the next call. Syscalls are counted.
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+        self.buffer = bytearray(RECEIVE_BUFFER_SIZE)
+        self.partial = b""
+        self.send_calls = 0
+        self.receive_calls = 0
+        self.frames_sent = 0
+
+    def send_frames(self, frames):
+        data = bytearray(FRAME.size * len(frames))
+        for index, fields in enumerate(frames):
+            FRAME.pack_into(data, index * FRAME.size, *fields)
+        view = memoryview(data)
+        with self.lock:
+            while view:
+                view = view[self.sock.send(view):]
+                self.send_calls += 1
+            self.frames_sent += len(frames)
+
+    def receive(self):
+        # Returns None once the peer has closed the connection.
+        try:
+            count = self.sock.recv_into(self.buffer)
+        except OSError:
+            return None
+        self.receive_calls += 1
+        if not count:
+            return None
+        data = self.partial + self.buffer[:count]
+        complete = len(data) - len(data) % FRAME.size
+        self.partial = bytes(data[complete:])
+        return list(FRAME.iter_unpack(data[:complete]))
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class SocketChannel:
+    # The sending half of IngressQueue's interface over a SocketLink: each put_many is one framed batch.
+    # Backpressure comes from the kernel: a send blocks while the peer's socket buffer is full.
+    def __init__(self, link, encode):
+        self.link = link
+        self.encode = encode
+
+    def put(self, item, timeout=None):
+        return self.put_many((item,), timeout)
+
+    def put_many(self, items, timeout=None, stamp=None):
+        if stamp is not None:
+            stamp(items)
+        frames = [self.encode(item) for item in items]
+        if frames:
+            self.link.send_frames(frames)
+        return len(frames)
+
+
+class SocketNetwork:
+    # The switch and every device of a run in one process, but connected pairwise over loopback TCP, so
+    # each hand-off pays real kernel I/O costs. The switch is a single selector loop that reads all
+    # devices, applies their credit returns and then serves the arrived packets; each device gets a
+    # receiver thread that sorts incoming frames into its data and control channels. TCP rather than UDP,
+    # since a lost credit frame would shrink a port's buffer for good.
+    def __init__(self, topology, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                 tracer=None, latency=None, class_weights=None, check_credit=False, seed=None, recorder=None):
+        self.simulation_logger = simulation_logger
+        self.DURATION = DURATION
+        self.switch_links = {}
+        self.device_links = {}
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            for device_id in topology.device_ids:
+                device_socket = socket.create_connection(server.getsockname())
+                switch_socket, _ = server.accept()
+                self.device_links[device_id] = SocketLink(device_socket)
+                self.switch_links[device_id] = SocketLink(switch_socket)
+
+        self.devices = [
+            Device(device_id, SocketChannel(self.device_links[device_id], encode_packet), memory_logger, RATIO,
+                   DURATION, transmission_rates=topology.transmission_rates[device_id],
+                   process_rate=topology.process_rates[device_id], latency=latency,
+                   credit_queue=SocketChannel(self.device_links[device_id], encode_credit),
+                   rng=device_rng(seed, device_id))
+            for device_id in topology.device_ids
+        ]
+        # Frames are moved into the ingress by the same loop that drains it, so it must not block when full.
+        ingress_ready = ReadySet()
+        incoming_queues = {device_id: IngressQueue(device_id, ingress_ready) for device_id in topology.device_ids}
+        outgoing_queues = {device_id: SocketChannel(link, encode_packet)
+                           for device_id, link in self.switch_links.items()}
+        control_queues = {device_id: SocketChannel(link, encode_signal)
+                          for device_id, link in self.switch_links.items()}
+        self.switch = Switch(incoming_queues, outgoing_queues, control_queues, simulation_logger, STATE,
+                             PRIORITY_OPTION, topology=topology, tracer=tracer, latency=latency,
+                             class_weights=class_weights, check_credit=check_credit, recorder=recorder)
+        self.select_calls = 0
+
+    def switch_loop(self):
+        switch = self.switch
+        selector = selectors.DefaultSelector()
+        for device_id, link in self.switch_links.items():
+            selector.register(link.sock, selectors.EVENT_READ, device_id)
+        self.simulation_logger.info("Switch: Listening for incoming packets...")
+        while switch.running:
+            events = selector.select(LISTEN_TIMEOUT)
+            self.select_calls += 1
+            credit_updates = []
+            for key, _ in events:
+                device_id = key.data
+                frames = self.switch_links[device_id].receive()
+                if frames is None:
+                    selector.unregister(key.fileobj)
+                    continue
+                packets = []
+                for frame in frames:
+                    if frame[0] == PACKET_FRAME:
+                        packets.append(decode_packet(frame))
+                    elif frame[0] == CREDIT_FRAME:
+                        credit_updates.append(CreditUpdate(frame[4], frame[5]))
+                if packets:
+                    switch.incoming_queues[device_id].put_many(packets)
+            if credit_updates:
+                switch.apply_credit_updates(credit_updates)
+            if len(switch.ingress_ready):
+                switch.listen_once()
+        selector.close()
+
+    def device_receive(self, device):
+        link = self.device_links[device.device_id]
+        while True:
+            frames = link.receive()
+            if frames is None:
+                return
+            packets = []
+            signals = []
+            for frame in frames:
+                if frame[0] == PACKET_FRAME:
+                    packets.append(decode_packet(frame))
+                elif frame[0] == SIGNAL_FRAME:
+                    signals.append(signal(SignalKind(frame[1]), frame[4]))
+            if packets:
+                device.received_packets.put_many(packets)
+            if signals:
+                device.control_signals.put_many(signals)
+
+    def run(self):
+        switch_thread = threading.Thread(target=self.switch_loop, name="SwitchListener")
+        device_threads = []
+        receiver_threads = []
+        for device in self.devices:
+            device_threads.append(threading.Thread(target=device.send_packets,
+                                                   name=f"Device{device.device_id}Sender"))
+            device_threads.append(threading.Thread(target=device.process_incoming,
+                                                   name=f"Device{device.device_id}Processor"))
+            device_threads.append(threading.Thread(target=device.check_alerts,
+                                                   name=f"Device{device.device_id}AlertHandler"))
+            receiver_threads.append(threading.Thread(target=self.device_receive, args=(device,),
+                                                     name=f"Device{device.device_id}Receiver"))
+
+        start_time = time.time()
+        switch_thread.start()
+        for thread in device_threads + receiver_threads:
+            thread.start()
+        time.sleep(self.DURATION)
+
+        self.simulation_logger.info("Stopping simulation...")
+        for device in self.devices:
+            device.running = False
+        for thread in device_threads:
+            thread.join()
+        self.switch.running = False
+        switch_thread.join()
+        # Closing the switch's ends gives every receiver an end of stream.
+        for link in self.switch_links.values():
+            link.close()
+        for thread in receiver_threads:
+            thread.join()
+        for link in self.device_links.values():
+            link.close()
+        return time.time() - start_time
+
+    def summary(self, elapsed):
+        links = list(self.switch_links.values()) + list(self.device_links.values())
+        frames = sum(link.frames_sent for link in links)
+        send_calls = sum(link.send_calls for link in links)
+        receive_calls = sum(link.receive_calls for link in links)
+        syscalls = send_calls + receive_calls + self.select_calls
+        packets = self.switch.packets_forwarded
+        per_packet = syscalls / packets if packets else 0.0
+        return (f"Transport: {frames} frames over loopback TCP ({frames / elapsed:.1f} frames/s), "
+                f"{syscalls} socket syscalls ({send_calls} send, {receive_calls} recv, {self.select_calls} select), "
+                f"{per_packet:.2f} per forwarded packet.")
@@ -0,0 +1,181 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyze_logs import LogAnalyzer
+from controller import run_simulation
+from packet import TYPE1, TYPE2
+from simulator import DEFAULT_SEED
+from topology import Topology, default_topology, load_topology
+
+STATE_RATIOS = {1: 1, 2: 4}
+
+GRID_DEFAULTS = {
+    "STATE": [1],
+    "RATIO": [None],
+    "PRIORITY_OPTION": [1],
+    "BUFFER_SIZES": [None],
+    "PROCESS_RATE": [None],
+    "DURATION": [60],
+}
+
+SUMMARY_FIELDS = ["run", "STATE", "RATIO", "PRIORITY_OPTION", "BUFFER_SIZES", "PROCESS_RATE", "DURATION",
+                  "forwarded", "packets_per_s", "drops", "requeues", "held", "backpressure_episodes", "congested_s",
+                  "processed", "p99_type1_ms", "p99_type2_ms", "wall_s"]
+
+
+def expand_grid(grid):
+    grid = {**GRID_DEFAULTS, **grid}
+    points = []
+    seen = set()
+    for STATE, RATIO, PRIORITY_OPTION, buffer_sizes, process_rate, DURATION in itertools.product(
+            grid["STATE"], grid["RATIO"], grid["PRIORITY_OPTION"], grid["BUFFER_SIZES"], grid["PROCESS_RATE"],
+            grid["DURATION"]):
+        if RATIO is None:
+            RATIO = STATE_RATIOS[STATE]
+        if STATE == 1:
+            # Priority options only apply to state 2, exactly as in the interactive controller.
+            PRIORITY_OPTION = 1
+        point = {
+            "STATE": STATE,
+            "RATIO": RATIO,
+            "PRIORITY_OPTION": PRIORITY_OPTION,
+            "BUFFER_SIZES": buffer_sizes,
+            "PROCESS_RATE": process_rate,
+            "DURATION": DURATION,
+        }
+        key = json.dumps(point, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            points.append(point)
+    return points
+
+
+def point_topology(base_topology, point):
+    buffer_sizes = base_topology.buffer_sizes
+    if point["BUFFER_SIZES"] is not None:
+        buffer_sizes = {int(device_id): size for device_id, size in point["BUFFER_SIZES"].items()}
+    process_rates = base_topology.process_rates
+    if point["PROCESS_RATE"] is not None:
+        process_rates = {device_id: point["PROCESS_RATE"] for device_id in buffer_sizes}
+    return Topology(buffer_sizes, base_topology.transmission_rates, process_rates)
+
+
+def p99_ms(histograms, key):
+    if key not in histograms:
+        return ""
+    return round(histograms[key].percentile(0.99) * 1000, 1)
+
+
+def run_point(run_name, point, topology_path, engine, out_dir, seed):
+    log_dir = os.path.join(out_dir, run_name)
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, "point.json"), "w") as f:
+        json.dump(point, f, indent=2)
+
+    base_topology = load_topology(topology_path) if topology_path else default_topology()
+    topology = point_topology(base_topology, point)
+
+    start = time.perf_counter()
+    latency = run_simulation(point["STATE"], point["RATIO"], point["PRIORITY_OPTION"], point["DURATION"],
+                             topology=topology, engine=engine, log_dir=log_dir, seed=seed)
+    wall_time = time.perf_counter() - start
+
+    analyzer = LogAnalyzer()
+    analyzer.feed_text_log(os.path.join(log_dir, "simulation.log"))
+    analyzer.feed_text_log(os.path.join(log_dir, "memory.log"))
+    analyzer.finish()
+
+    forwarded = sum(stats.packets for stats in analyzer.flows.values())
+    episodes = [duration for durations in analyzer.episodes.values() for duration in durations]
+    total_latency = latency.by_type("total")
+    return {
+        "run": run_name,
+        **point,
+        "BUFFER_SIZES": json.dumps(point["BUFFER_SIZES"]) if point["BUFFER_SIZES"] is not None else "default",
+        "PROCESS_RATE": point["PROCESS_RATE"] if point["PROCESS_RATE"] is not None else "default",
+        "forwarded": forwarded,
+        "packets_per_s": round(forwarded / point["DURATION"], 2),
+        "drops": sum(stats.drops for stats in analyzer.flows.values()),
+        "requeues": sum(stats.requeues for stats in analyzer.flows.values()),
+        "held": sum(stats.held for stats in analyzer.flows.values()),
+        "backpressure_episodes": len(episodes),
+        "congested_s": sum(episodes),
+        "processed": sum(analyzer.device_processed.values()),
+        "p99_type1_ms": p99_ms(total_latency, TYPE1),
+        "p99_type2_ms": p99_ms(total_latency, TYPE2),
+        "wall_s": round(wall_time, 3),
+    }
+
+
+def load_grid(args):
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    for key, value in (("STATE", args.state), ("RATIO", args.ratio), ("PRIORITY_OPTION", args.priority),
+                       ("PROCESS_RATE", args.process_rate), ("DURATION", args.duration)):
+        if value:
+            grid[key] = value
+    if args.buffer_scale:
+        base_topology = load_topology(args.topology) if args.topology else default_topology()
+        grid["BUFFER_SIZES"] = [
+            {device_id: int(size * scale) for device_id, size in base_topology.buffer_sizes.items()}
+            for scale in args.buffer_scale
+        ]
+    return grid
+
+
+def print_table(rows, output=sys.stdout):
+    columns = [field for field in SUMMARY_FIELDS if field != "BUFFER_SIZES"]
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    output.write(" ".join(f"{column:>{widths[column]}}" for column in columns) + "\n")
+    for row in rows:
+        output.write(" ".join(f"{str(row[column]):>{widths[column]}}" for column in columns) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of simulations in parallel and summarize them.")
+    parser.add_argument("--grid", help="JSON file mapping STATE/RATIO/PRIORITY_OPTION/BUFFER_SIZES/PROCESS_RATE/"
+                                       "DURATION to lists of values")
+    parser.add_argument("--state", type=int, nargs="+", choices=[1, 2])
+    parser.add_argument("--ratio", type=int, nargs="+")
+    parser.add_argument("--priority", type=int, nargs="+", choices=[1, 2, 3])
+    parser.add_argument("--process-rate", type=int, nargs="+")
+    parser.add_argument("--buffer-scale", type=float, nargs="+", help="multiply every buffer size")
+    parser.add_argument("--duration", type=int, nargs="+")
+    parser.add_argument("--topology", help="topology JSON file used as the base of every point")
+    parser.add_argument("--engine", type=int, choices=[1, 2], default=2,
+                        help="1: real-time threads, 2: discrete-event engine (default)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="sweep_runs", help="directory for per-run logs and summary.csv")
+    args = parser.parse_args()
+
+    points = expand_grid(load_grid(args))
+    os.makedirs(args.out, exist_ok=True)
+    print(f"Running {len(points)} simulations on {args.workers} workers...")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_point, f"run{index:04d}", point, args.topology, args.engine, args.out,
+                                   args.seed)
+                   for index, point in enumerate(points)]
+        for future in as_completed(futures):
+            rows.append(future.result())
+    rows.sort(key=lambda row: row["run"])
+
+    with open(os.path.join(args.out, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import threading
 import time
 
+from channels import IngressQueue, VirtualOutputQueues
+from credit import CreditLedger
+from event_trace import TextTrace, PACKET_SENT, PACKET_HELD, CREDIT_RESTORED
+from packet import CreditUpdate
+from scheduling import DeficitRoundRobin, PriorityBuckets
+from signaling import CongestionSignaler
+
 BUFFER_SIZES = {
     1: 1 * 1024 * 8,
     2: 1 * 1024 * 8,
@@ -10,155 +17,201 @@ BUFFER_SIZES = {
 
 PROCESS_RATE = 10
 
-DEVICES_NUMBER = 4
+# Priority option 2 only prefers type 1 once a port's credit falls below this fraction of its buffer.
+PRIORITY_CREDIT_FRACTION = 0.10
+
+LISTEN_TIMEOUT = 0.5
+CREDIT_TIMEOUT = 0.5
 
 PROGRAM_START_TIME = time.time()
 
 
 class Switch:
-    def __init__(self, incoming_queues, outgoing_queues, logger, STATE, PRIORITY_OPTION):
+    def __init__(self, incoming_queues, outgoing_queues, control_queues, logger, STATE, PRIORITY_OPTION,
+                 topology=None, tracer=None, latency=None, class_weights=None, check_credit=False,
+                 credit_updates=None, routes=None, switch_id=None, upstream_credit_queues=None, recorder=None):
+        if topology is None:
+            from topology import default_topology
+            topology = default_topology()
         self.incoming_queues = incoming_queues
         self.outgoing_queues = outgoing_queues
+        self.control_queues = control_queues
         self.STATE = STATE
         self.PRIORITY_MODE = PRIORITY_OPTION
 
-        self.buffers = {
-            1: BUFFER_SIZES[1],
-            2: BUFFER_SIZES[2],
-            3: BUFFER_SIZES[3],
-            4: BUFFER_SIZES[4]
-        }
+        self.buffer_sizes = dict(topology.buffer_sizes)
+        self.credits = CreditLedger(topology.buffer_sizes, check_invariants=check_credit)
+        self.senders = topology.senders
+        # In a multi-switch fabric (fabric.py) ports are next hops: `routes` maps a packet's destination
+        # device to its port, and credit for packets that came in from another switch goes back to that
+        # switch's credit_updates, addressed to `switch_id`, once they leave. None for a single switch.
+        self.routes = routes
+        self.switch_id = switch_id
+        self.upstream_credit_queues = upstream_credit_queues
+        # All incoming queues are IngressQueues reporting to one shared ReadySet.
+        self.ingress_ready = next(iter(incoming_queues.values())).ready_set
+        # Packets wait per (source, destination) until their destination has credit, so a full port
+        # never holds up a source's traffic to other ports.
+        self.priority_thresholds = {}
+        if STATE == 2 and PRIORITY_OPTION == 3:
+            self.output_queues = {device_id: DeficitRoundRobin(class_weights) for device_id in self.buffer_sizes}
+        elif STATE == 2:
+            self.output_queues = {device_id: PriorityBuckets(strict=PRIORITY_OPTION == 1)
+                                  for device_id in self.buffer_sizes}
+            if PRIORITY_OPTION == 2:
+                self.priority_thresholds = {device_id: PRIORITY_CREDIT_FRACTION * size
+                                            for device_id, size in self.buffer_sizes.items()}
+        else:
+            self.output_queues = {device_id: VirtualOutputQueues() for device_id in self.buffer_sizes}
+        # Destinations whose waiting packet may fit again after returned credit.
+        self.unblocked_destinations = {}
+        # Devices report the bits they processed here; credit is only ever returned from these updates.
+        self.credit_updates = credit_updates if credit_updates is not None else IngressQueue("switch")
         self.running = True
         self.logger = logger
+        self.tracer = tracer if tracer is not None else TextTrace(logger)
+        self.signaler = CongestionSignaler(self.credits, self.senders, control_queues, self.tracer)
+        self.latency = latency
+        # Optional IngressRecorder (traffic_record.py) that captures every batch taken from the ingress.
+        self.recorder = recorder
+        # Written only by the serving thread; read without a lock by metrics.py.
+        self.packets_forwarded = 0
+        self.packets_requeued = 0
         self.lock = threading.Lock()
 
     def listen(self):
         self.logger.info("Switch: Listening for incoming packets...")
         while self.running:
-            packets_to_process = {}
-
-            for device_id, q in self.incoming_queues.items():
-                if not q.empty():
-                    packet = q.get()
-                    target_device = packet["target"]
-                    if target_device not in packets_to_process:
-                        packets_to_process[target_device] = []
-                    packets_to_process[target_device].append((device_id, packet))
-
-            if self.STATE == 1:
-                pass
-            else:
-                for target_device, packets in packets_to_process.items():
-                    if self.PRIORITY_MODE == 1:
-                        packets.sort(key=lambda pkt: pkt[1]["type"] == 2)
-                    elif self.PRIORITY_MODE == 2:
-                        buffer_usage = self.buffers[target_device]
-                        if buffer_usage < 0.10 * BUFFER_SIZES[target_device]:
-                            packets.sort(key=lambda pkt: pkt[1]["type"] == 2)
-                    elif self.PRIORITY_MODE == 3:
-                        with self.lock:
-                            type1_packets = [pkt for pkt in packets if pkt[1]["type"] == "type1"]
-                            type2_packets = [pkt for pkt in packets if pkt[1]["type"] == "type2"]
-
-                            combined_packets = []
-                            type1_index, type2_index = 0, 0
-
-                            while type1_index < len(type1_packets) or type2_index < len(type2_packets):
-                                if type1_index < len(type1_packets):
-                                    combined_packets.append(type1_packets[type1_index])
-                                    type1_index += 1
-                                if type1_index < len(type1_packets):
-                                    combined_packets.append(type1_packets[type1_index])
-                                    type1_index += 1
-                                if type2_index < len(type2_packets):
-                                    combined_packets.append(type2_packets[type2_index])
-                                    type2_index += 1
-
-                            packets[:] = combined_packets
-
-            for target_device, packets in packets_to_process.items():
-                for device_id, packet in packets:
-                    self.process_packet(device_id, packet)
-
-            time.sleep(0.05)
-
-    def broadcast(self, message, exclude=None):
-        if exclude is None:
-            exclude = []
-        for device_id in self.outgoing_queues:
-            if device_id not in exclude:
-                self.outgoing_queues[device_id].put(message)
-
-    def process_packet(self, source_device, packet):
-        target_device = packet['target']
-        packet_size = packet['size']
-
-        BACKPRESSURE_THRESHOLD = 0.4 * BUFFER_SIZES[target_device]
-        CRITICAL_THRESHOLD = 0
-        packet_type = packet.get('type', 'unknown')
+            if self.ingress_ready.wait(LISTEN_TIMEOUT):
+                self.listen_once()
+
+    def stop(self):
+        self.running = False
+        self.ingress_ready.close()
+
+    def listen_once(self):
+        arrived = {}
+        output_queues = self.output_queues
+        routes = self.routes
+        recorder = self.recorder
+
+        for device_id in sorted(self.ingress_ready.take()):
+            packets = self.incoming_queues[device_id].get_all()
+            if recorder is not None:
+                recorder.record(device_id, packets)
+            for packet in packets:
+                port = packet.target if routes is None else routes[packet.target]
+                output_queues[port].push(device_id, packet)
+                arrived[port] = None
 
         with self.lock:
-            if self.buffers[target_device] >= packet_size:
-                self.buffers[target_device] -= packet_size
-                self.outgoing_queues[target_device].put(packet)
-                self.logger.info(
-                    f"Switch: {packet_type} packet from Device {source_device} to Device {target_device} sent. "
-                    f"Remaining buffer for Device {target_device}: {self.buffers[target_device]} bits."
-                )
-
-                if self.buffers[target_device] < BACKPRESSURE_THRESHOLD and self.buffers[target_device] != 0:
-                    backpressure_packet = {"id": "BACKPRESSURE", "size": 0, "target": target_device}
-                    self.broadcast(backpressure_packet, exclude=[target_device])
-
-                    self.logger.warning(
-                        f"Switch: Backpressure signal sent to devices for Device {target_device} "
-                        f"due to high buffer utilization."
-                    )
-
-                if self.buffers[target_device] == CRITICAL_THRESHOLD:
-                    critical_backpressure_packet = {"id": "CRITICAL_BACKPRESSURE", "size": 0, "target": target_device}
-                    self.broadcast(critical_backpressure_packet, exclude=[target_device])
-                    self.logger.critical(
-                        f"Switch: Critical backpressure signal sent to all devices to stop sending to Device "
-                        f"{target_device}"
-                        f"due to buffer overflow."
-                    )
-
-            else:
-                self.logger.warning(
-                    f"Switch: Packet from Device {source_device} to Device {target_device} dropped due to buffer "
-                    f"overflow."
-                    f"Buffer space remaining: {self.buffers[target_device]} bits, Packet size: {packet_size} bits."
-                )
-                self.incoming_queues[source_device].put(packet)
-                self.logger.info(
-                    f"Switch: Re-queued packet {packet['id']} from Device {source_device} back to incoming queue."
-                )
+            unblocked, self.unblocked_destinations = self.unblocked_destinations, {}
+        self.serve([target_device for target_device in {**arrived, **unblocked}
+                    if not self.credits.is_waiting(target_device)])
+        self.signaler.flush()
+
+    def serve(self, target_devices):
+        # Only this thread debits, and credit can only grow meanwhile, so each round takes packets for
+        # every port against one lock-free read of its credit and debits the whole round as one batch.
+        while target_devices:
+            batches = {}
+            taken = {}
+            for target_device in target_devices:
+                batch = self.take(target_device)
+                if batch:
+                    batches[target_device] = batch
+                    taken[target_device] = sum(packet.size for _, packet, _ in batch)
+            self.credits.debit_many(taken)
+
+            retry = []
+            for target_device in target_devices:
+                if target_device in batches:
+                    self.forward(target_device, batches[target_device])
+                output_queue = self.output_queues[target_device]
+                if output_queue:
+                    source_device, packet = output_queue.head()
+                    if not self.credits.wait_for(target_device, packet.size):
+                        # Credit came back meanwhile; serve this port again next round.
+                        retry.append(target_device)
+                        continue
+                    self.packets_requeued += 1
+                    self.tracer.record(PACKET_HELD, source_device, target_device, packet.id,
+                                       self.credits[target_device], packet.size, packet.type)
+            target_devices = retry
+
+    def take(self, target_device):
+        # Pops the head packets that fit in the port's credit, each with the credit left after it.
+        output_queue = self.output_queues[target_device]
+        priority_threshold = self.priority_thresholds.get(target_device)
+        available = self.credits[target_device]
+        batch = []
+        while output_queue:
+            if priority_threshold is not None:
+                output_queue.strict = available < priority_threshold
+            source_device, packet = output_queue.head()
+            if packet.size > available:
+                break
+            output_queue.pop()
+            available -= packet.size
+            batch.append((source_device, packet, available))
+        return batch
+
+    def forward(self, target_device, batch):
+        outgoing_queue = self.outgoing_queues[target_device]
+        congested_below = self.signaler.congested_below[target_device]
+        replaced = 0
+
+        packets = [packet for _, packet, _ in batch]
+        if self.latency is not None:
+            now = self.latency.clock()
+            for packet in packets:
+                packet.forwarded = now
+        outgoing_queue.put_many(packets)
+        self.packets_forwarded += len(packets)
+
+        for source_device, packet, credit in batch:
+            if self.latency is not None:
+                self.latency.packet_forwarded(packet, now)
+            self.tracer.record(PACKET_SENT, source_device, target_device, packet.id, credit, packet.size,
+                               packet.type)
+            if credit < congested_below:
+                replaced += 1
+
+        self.signaler.update(target_device, replaced)
+        if self.upstream_credit_queues:
+            self.return_upstream_credit(batch)
+
+    def return_upstream_credit(self, batch):
+        # A packet leaving this switch frees its place in the buffer of the link it arrived on.
+        returned = {}
+        for source, packet, _ in batch:
+            if source in self.upstream_credit_queues:
+                returned[source] = returned.get(source, 0) + packet.size
+        for source, amount in returned.items():
+            self.upstream_credit_queues[source].put(CreditUpdate(self.switch_id, amount))
 
     def restore_buffers(self):
         self.logger.info("Switch: Buffer restoration thread started.")
         while self.running:
-            time.sleep(1)
-            for device_id in self.buffers.keys():
-                restored_size = PROCESS_RATE * 512
-                before_restore = self.buffers[device_id]
-                self.buffers[device_id] = min(self.buffers[device_id] + restored_size, BUFFER_SIZES[device_id])
-                restored = self.buffers[device_id] - before_restore
-                self.logger.process(
-                    f"Switch: Restored credit for Device {device_id} by {restored / 8} bytes. "
-                    f"Current credit size: {self.buffers[device_id] / 8} bytes."
-                )
-
-                BACKPRESSURE_THRESHOLD = 0.15 * BUFFER_SIZES[device_id]
-                if self.buffers[device_id] >= BACKPRESSURE_THRESHOLD:
-                    restore_packet = {"id": "RESTORE", "size": 0, "target": device_id}
-                    self.broadcast(restore_packet, exclude=[device_id])
-                    self.logger.process(
-                        f"Switch: Sent RESTORE signal for Device {device_id} as buffer usage is below the threshold."
-                    )
-                elif self.buffers[device_id] < BACKPRESSURE_THRESHOLD:
-                    backpressure_packet = {"id": "BACKPRESSURE", "size": 0, "target": device_id}
-                    self.broadcast(backpressure_packet, exclude=[device_id])
-                    self.logger.process(
-                        f"Switch: Continued backpressure for Device {device_id} due to high buffer utilization."
-                    )
\ No newline at end of file
+            updates = self.credit_updates.get_all(CREDIT_TIMEOUT)
+            if updates:
+                self.apply_credit_updates(updates)
+
+    def restore_once(self):
+        self.apply_credit_updates(self.credit_updates.get_all())
+
+    def apply_credit_updates(self, updates):
+        # Updates that arrived together are coalesced, so each destination is credited and signalled once.
+        returned = {}
+        for update in updates:
+            returned[update.destination] = returned.get(update.destination, 0) + update.amount
+
+        results = self.credits.credit_many(dict(sorted(returned.items())))
+        for device_id, (restored, credit, unblocked) in results.items():
+            if unblocked:
+                with self.lock:
+                    self.unblocked_destinations[device_id] = None
+                self.ingress_ready.wake()
+            self.tracer.record(CREDIT_RESTORED, 0, device_id, 0, credit, restored)
+            self.signaler.update(device_id, replaced=1)
+        self.signaler.flush()
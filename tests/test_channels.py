@@ -0,0 +1,76 @@
+import logging
+import threading
+
+import device as device_module
+from channels import IngressQueue
+from packet import PACKET_POOL, PACKET_SIZE, TYPE1
+from topology import build_network, default_topology
+
+
+def test_put_many_and_get_many_keep_fifo_order():
+    channel = IngressQueue(1)
+    assert channel.put_many(range(5)) == 5
+    assert channel.get_many(2) == [0, 1]
+    assert channel.qsize() == 3
+    assert channel.get_all() == [2, 3, 4]
+    assert channel.empty()
+
+
+def test_snapshot_does_not_consume():
+    channel = IngressQueue(1)
+    channel.put_many("abc")
+    assert channel.snapshot() == ["a", "b", "c"]
+    assert channel.get_all() == ["a", "b", "c"]
+
+
+def test_full_channel_times_out_with_partial_count():
+    channel = IngressQueue(1, capacity=3)
+    assert channel.put_many(range(5), timeout=0.01) == 3
+    assert channel.get_all() == [0, 1, 2]
+
+
+def test_full_channel_resumes_when_drained():
+    channel = IngressQueue(1, capacity=2)
+    result = []
+    producer = threading.Thread(target=lambda: result.append(channel.put_many(range(6), timeout=5)))
+    producer.start()
+    received = []
+    while len(received) < 6:
+        received += channel.get_many(timeout=1)
+    producer.join()
+    assert result == [6]
+    assert received == list(range(6))
+
+
+def test_blocked_put_many_times_out_with_partial_count():
+    channel = IngressQueue(1, capacity=4)
+    channel.put_many(range(3))
+
+    def drain_one():
+        channel.get_many(1)
+
+    # One slot frees up while the producer is blocked; the rest of the batch never fits.
+    consumer = threading.Timer(0.02, drain_one)
+    consumer.start()
+    assert channel.put_many(range(10, 15), timeout=0.1) == 2
+    consumer.join()
+    assert channel.get_all() == [1, 2, 10, 11]
+
+
+def test_sender_drops_what_a_full_ingress_did_not_take(monkeypatch):
+    monkeypatch.setattr(device_module, "SEND_INTERVAL", 0.02)
+    logger = logging.getLogger("ChannelsTestLogger")
+    logger.propagate = False
+    switch, devices = build_network(default_topology(), logger, logger, 1, 1, 1, 1, ingress_capacity=2)
+    device = devices[0]
+    ingress = switch.incoming_queues[device.device_id]
+    ingress.put_many([PACKET_POOL.acquire(index, PACKET_SIZE, device.device_id, 2, TYPE1) for index in range(2)])
+
+    free_before = len(PACKET_POOL.free)
+    device.send_once()
+    batch = sum(device.current_rates.values())
+    assert batch > 0
+    assert device.packets_dropped == batch
+    assert ingress.qsize() == 2
+    # Dropped packets go back to the pool, which the batch was taken from (or grew by).
+    assert len(PACKET_POOL.free) == max(free_before, batch)
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+from packet import CRITICAL_BACKPRESSURE, PACKET_POOL, PACKET_SIZE, RESTORE, TYPE1, CreditUpdate, signal
+from topology import build_network, default_topology
+
+PORT = 2
+
+
+def make_network():
+    logger = logging.getLogger("ControlChannelTestLogger")
+    logger.propagate = False
+    switch, devices = build_network(default_topology(), logger, logger, 1, 1, 1, 1)
+    return switch, {device.device_id: device for device in devices}
+
+
+def fill_port(switch, source):
+    for index in range(switch.buffer_sizes[PORT] // PACKET_SIZE):
+        switch.output_queues[PORT].push(source, PACKET_POOL.acquire(index, PACKET_SIZE, source, PORT, TYPE1))
+    switch.serve([PORT])
+
+
+def test_signal_reaches_every_sender_once_and_leaves_data_alone():
+    switch, devices = make_network()
+    senders = list(switch.senders[PORT])
+    fill_port(switch, senders[0])
+    switch.signaler.flush()
+    # Nothing changed since, so a second flush announces nothing.
+    switch.signaler.flush()
+
+    for device_id in senders:
+        device = devices[device_id]
+        assert device.control_signals.snapshot() == [signal(CRITICAL_BACKPRESSURE, PORT)]
+        device.check_alerts_once()
+        assert device.current_rates[PORT] == 0
+        assert device.congestion[PORT] == CRITICAL_BACKPRESSURE
+        assert device.control_signals.empty()
+    assert devices[PORT].received_packets.qsize() == switch.buffer_sizes[PORT] // PACKET_SIZE
+    for device_id, device in devices.items():
+        if device_id != PORT:
+            assert device.received_packets.empty()
+
+
+def test_restore_is_delivered_once_and_applied():
+    switch, devices = make_network()
+    sender = devices[next(iter(switch.senders[PORT]))]
+    fill_port(switch, sender.device_id)
+    switch.signaler.flush()
+    sender.check_alerts_once()
+
+    switch.apply_credit_updates([CreditUpdate(PORT, switch.buffer_sizes[PORT])])
+    # A further return leaves the port clear, so it is not announced again.
+    switch.apply_credit_updates([CreditUpdate(PORT, PACKET_SIZE)])
+    assert sender.control_signals.snapshot() == [signal(RESTORE, PORT)]
+    sender.check_alerts_once()
+    assert sender.current_rates[PORT] == 1
+    assert sender.congestion[PORT] == RESTORE
+    # The signal was applied on arrival; from the next send round on, the rate recovers one step per round.
+    sender.adjust_rates()
+    assert sender.current_rates[PORT] == 1
+    sender.adjust_rates()
+    assert sender.current_rates[PORT] == 2
+
+
+def test_alert_handler_thread_applies_signals():
+    switch, devices = make_network()
+    sender = devices[next(iter(switch.senders[PORT]))]
+    handler = threading.Thread(target=sender.check_alerts)
+    handler.start()
+    try:
+        fill_port(switch, sender.device_id)
+        switch.signaler.flush()
+        deadline = time.monotonic() + 5
+        while sender.current_rates[PORT] != 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert sender.current_rates[PORT] == 0
+    finally:
+        sender.running = False
+        handler.join()
+    assert sender.control_signals.empty()
@@ -0,0 +1,61 @@
+import pytest
+
+from credit import CreditLedger
+
+
+def test_debit_and_credit_never_exceed_capacity():
+    ledger = CreditLedger({1: 2048, 2: 1024})
+    assert ledger.debit(1, 512) == 1536
+    assert ledger.credit(1, 1024) == (512, 2048, False)
+    assert ledger[1] == 2048
+    assert ledger[2] == 1024
+
+
+def test_credit_unblocks_a_waiting_destination_once():
+    ledger = CreditLedger({1: 1024})
+    ledger.debit(1, 1024)
+    assert ledger.wait_for(1, 512)
+    assert ledger.is_waiting(1)
+    assert ledger.credit(1, 512) == (512, 512, True)
+    assert not ledger.is_waiting(1)
+    assert ledger.credit(1, 512) == (512, 1024, False)
+
+
+def test_wait_for_does_not_wait_when_credit_suffices():
+    ledger = CreditLedger({1: 1024})
+    assert not ledger.wait_for(1, 512)
+    assert not ledger.is_waiting(1)
+
+
+def test_full_credit_does_not_unblock():
+    ledger = CreditLedger({1: 1024})
+    assert ledger.wait_for(1, 2048)
+    assert ledger.credit(1, 512) == (0, 1024, False)
+    assert ledger.is_waiting(1)
+
+
+def test_check_invariants_rejects_overdraft():
+    ledger = CreditLedger({1: 1024}, check_invariants=True)
+    ledger.debit(1, 1024)
+    with pytest.raises(RuntimeError):
+        ledger.debit(1, 1)
+
+
+def test_overdraft_is_allowed_without_checks():
+    ledger = CreditLedger({1: 1024})
+    assert ledger.debit(1, 1536) == -512
+
+
+def test_batched_debit_and_credit():
+    ledger = CreditLedger({1: 1024, 2: 2048})
+    assert ledger.debit_many({1: 512, 2: 1024}) == {1: 512, 2: 1024}
+    assert ledger.credit_many({1: 1024, 2: 512}) == {1: (512, 1024, False), 2: (512, 1536, False)}
+
+
+def test_snapshot_is_a_copy():
+    ledger = CreditLedger({1: 1024, 2: 2048})
+    ledger.debit(2, 512)
+    snapshot = ledger.snapshot()
+    ledger.debit(1, 512)
+    assert snapshot == {1: 1024, 2: 1536}
+    assert all(not lock.locked() for lock in ledger.locks.values())
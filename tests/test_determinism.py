@@ -0,0 +1,34 @@
+from controller import run_simulation
+from device import device_rng
+
+DURATION = 10
+
+
+def run(log_dir, seed, STATE=2, PRIORITY_OPTION=2):
+    run_simulation(STATE, 1, PRIORITY_OPTION, DURATION, engine=2, log_dir=str(log_dir), seed=seed,
+                   record_path=str(log_dir / "ingress.rec"))
+    with open(log_dir / "simulation.log") as f:
+        # The wall-clock prefix and the engine's own timing line differ from run to run.
+        log = [line[11:].replace(str(log_dir), "") for line in f if "Discrete-event engine" not in line]
+    return log, (log_dir / "ingress.rec").read_bytes()
+
+
+def test_same_seed_gives_identical_runs(tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    first = run(tmp_path / "first", 7)
+    second = run(tmp_path / "second", 7)
+    assert first[0] == second[0]
+    assert first[1] == second[1]
+
+
+def test_different_seeds_give_different_traffic(tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    assert run(tmp_path / "first", 7)[1] != run(tmp_path / "second", 8)[1]
+
+
+def test_device_streams_are_reproducible_and_distinct():
+    draws = [device_rng(7, 1).random(), device_rng(7, 1).random(), device_rng(7, 2).random()]
+    assert draws[0] == draws[1]
+    assert draws[0] != draws[2]
@@ -0,0 +1,85 @@
+import io
+import logging
+import threading
+
+from event_trace import (BinaryTrace, CREDIT_RESTORED, PACKET_SENT, RESTORE_SENT, TextTrace, read_records,
+                         render_text)
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / "run.trace"
+    now = [100.0]
+    trace = BinaryTrace(str(path), clock=lambda: now[0], capacity=4)
+    expected = []
+    # More records than one buffer holds, so full buffers are handed to the writer too.
+    for index in range(10):
+        now[0] = 100.0 + index
+        trace.record(PACKET_SENT, 1, 2, 1000 + index, 8192 - 512 * index, 512, 1)
+        expected.append((100.0 + index, PACKET_SENT, 1, 1, 2, 1000 + index, 8192 - 512 * index, 512,
+                         threading.current_thread().name))
+    trace.close()
+    assert list(read_records(str(path))) == expected
+
+
+def test_threads_are_merged_in_time_order(tmp_path):
+    path = tmp_path / "run.trace"
+    trace = BinaryTrace(str(path), clock=lambda: threading.current_thread().timestamp, capacity=3)
+
+    def record(timestamps):
+        thread = threading.current_thread()
+        for timestamp in timestamps:
+            thread.timestamp = timestamp
+            trace.record(CREDIT_RESTORED, 0, 1, 0, 0, 512)
+
+    threads = [threading.Thread(target=record, args=(timestamps,), name=name)
+               for timestamps, name in (([1.0, 3.0, 5.0, 7.0], "Odd"), ([2.0, 4.0, 6.0], "Even"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    trace.close()
+    records = list(read_records(str(path)))
+    assert [record[0] for record in records] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+    assert [record[-1] for record in records] == ["Odd", "Even"] * 3 + ["Odd"]
+
+
+def test_rendering_names_the_actor_that_recorded(tmp_path):
+    # One thread playing several actors, as in the discrete-event engine.
+    path = tmp_path / "run.trace"
+    trace = BinaryTrace(str(path), clock=lambda: 0.0)
+    actor = ["SwitchListener"]
+    trace.actor = lambda: actor[0]
+    trace.record(RESTORE_SENT, 0, 3, 0, 4096)
+    actor[0] = "BufferRestorer"
+    trace.record(RESTORE_SENT, 0, 4, 0, 8192)
+    trace.close()
+
+    output = io.StringIO()
+    render_text(str(path), output)
+    lines = output.getvalue().splitlines()
+    assert [line.split(" ", 2)[1] for line in lines] == ["[SwitchListener]", "[BufferRestorer]"]
+
+
+def test_rendering_matches_the_text_trace(tmp_path):
+    path = tmp_path / "run.trace"
+    trace = BinaryTrace(str(path), clock=lambda: 0.0)
+    stream = io.StringIO()
+    logger = logging.getLogger("EventTraceTestLogger")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("[%(threadName)s] [%(levelname)s] %(message)s"))
+    logger.addHandler(handler)
+    text = TextTrace(logger)
+    try:
+        for tracer in (trace, text):
+            tracer.record(PACKET_SENT, 1, 2, 1234, 7680, 512, 2)
+            tracer.record(CREDIT_RESTORED, 0, 2, 0, 8192, 512)
+    finally:
+        logger.removeHandler(handler)
+    trace.close()
+
+    output = io.StringIO()
+    render_text(str(path), output)
+    # Everything but the timestamp.
+    assert [line.split(" ", 1)[1] for line in output.getvalue().splitlines()] == stream.getvalue().splitlines()
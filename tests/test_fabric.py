@@ -0,0 +1,53 @@
+import logging
+
+from fabric import FabricSimulation, FabricTopology, fabric_topology
+from packet import PACKET_SIZE
+from topology import Topology
+
+BUFFER_SIZE = 32 * PACKET_SIZE
+S1, S2, S3 = 3, 4, 5
+
+
+def quiet_logger():
+    logger = logging.getLogger("FabricTestLogger")
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def run_chain(process_rate, DURATION=40):
+    # Device 1 on S1 sends to Device 2 on S3, through S2; Device 2 processes `process_rate` packets a second.
+    devices = Topology({1: BUFFER_SIZE, 2: BUFFER_SIZE}, {1: {2: 10}, 2: {}}, {1: 20, 2: process_rate})
+    fabric = FabricTopology(devices, {S1: "S1", S2: "S2", S3: "S3"}, [(S1, S2), (S2, S3)], {1: S1, 2: S3},
+                            BUFFER_SIZE)
+    logger = quiet_logger()
+    simulation = FabricSimulation(fabric, logger, logger, 1, 1, 1, DURATION)
+    simulation.run()
+    return simulation
+
+
+def test_downstream_congestion_throttles_the_upstream_switch():
+    simulation = run_chain(process_rate=2)
+    stats = simulation.stats
+    # Congestion starts at the slow device's port and spreads back one link at a time.
+    assert stats[(S3, 2)].first_congested < stats[(S2, S3)].first_congested < stats[(S1, S2)].first_congested
+    assert stats[(S1, S2)].min_credit < BUFFER_SIZE * 0.4
+    # S1 throttles its sender because of congestion two hops away.
+    sender = simulation.devices_by_id[1]
+    assert sender.current_rates[2] < sender.max_rates[2]
+    assert stats[(S1, S2)].forwarded < run_chain(process_rate=20).stats[(S1, S2)].forwarded
+
+
+def test_uncongested_chain_sends_at_full_rate():
+    simulation = run_chain(process_rate=20)
+    assert all(stats.first_congested is None for stats in simulation.stats.values())
+    sender = simulation.devices_by_id[1]
+    assert sender.current_rates[2] == sender.max_rates[2]
+
+
+def test_shapes_route_every_flow():
+    for shape in ("chain", "star", "fat-tree"):
+        fabric = fabric_topology(shape, 3, 2)
+        for switch_id in fabric.switch_ids:
+            assert set(fabric.routes[switch_id]) == set(fabric.devices.device_ids)
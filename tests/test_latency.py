@@ -0,0 +1,100 @@
+import logging
+import math
+import threading
+import time
+
+import pytest
+
+from latency import LatencyRecorder, LogHistogram
+from packet import PACKET_POOL, TYPE1
+from topology import build_network, default_topology
+
+# Buckets are 1/16 of a power of two wide, so a percentile may overstate its sample by one bucket.
+RELATIVE_ERROR = 1 / 16
+
+
+def test_percentiles_within_bucket_error():
+    histogram = LogHistogram()
+    values = [0.001 * index for index in range(1, 1001)]
+    for value in values:
+        histogram.record(value)
+    for fraction in (0.5, 0.99, 0.999):
+        exact = values[math.ceil(fraction * len(values)) - 1]
+        assert exact <= histogram.percentile(fraction) <= exact * (1 + RELATIVE_ERROR)
+    assert histogram.percentile(1.0) == pytest.approx(1.0)
+    assert histogram.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_zero_and_empty():
+    histogram = LogHistogram()
+    assert histogram.percentile(0.5) == 0.0
+    histogram.record(0.0)
+    assert histogram.percentile(0.99) == 0.0
+
+
+def test_percentile_never_exceeds_max():
+    histogram = LogHistogram()
+    histogram.record(0.3)
+    assert histogram.percentile(0.5) == 0.3
+
+
+def test_merge_adds_counts():
+    first, second = LogHistogram(), LogHistogram()
+    for value in (0.01, 0.02):
+        first.record(value)
+    second.record(4.0)
+    first.merge(second)
+    assert first.count == 3
+    assert first.max == 4.0
+    assert first.percentile(1.0) == 4.0
+
+
+def test_recorder_stages():
+    now = [0.0]
+    recorder = LatencyRecorder(clock=lambda: now[0])
+    packet = PACKET_POOL.acquire(1, 512, 1, 2, TYPE1)
+    packet.created = 0.25
+    packet.enqueued = 1.0
+    recorder.packet_sent(packet, 1.0)
+    recorder.packet_forwarded(packet, 1.5)
+    packet.forwarded = 1.5
+    recorder.packet_processed(packet, 3.0)
+    assert recorder.by_type("batch")[TYPE1].max == 0.75
+    assert recorder.by_type("ingress")[TYPE1].max == 0.5
+    assert recorder.by_type("delivery")[TYPE1].max == 1.5
+    assert recorder.by_flow("total")[(1, 2)].max == 2.75
+
+
+def test_wait_for_ingress_space_counts_as_batch_time():
+    logger = logging.getLogger("LatencyTestLogger")
+    logger.propagate = False
+    recorder = LatencyRecorder()
+    switch, devices = build_network(default_topology(), logger, logger, 1, 1, 1, 1, latency=recorder,
+                                    ingress_capacity=2)
+    device = devices[0]
+    ingress = switch.incoming_queues[device.device_id]
+    drained = []
+
+    def drain():
+        # The switch only starts taking packets once the sender has been blocked for a while.
+        time.sleep(0.05)
+        while sender.is_alive() or ingress.qsize():
+            packets = ingress.get_all(0.01)
+            now = recorder.clock()
+            for packet in packets:
+                recorder.packet_forwarded(packet, now)
+                drained.append((packet, now))
+
+    sender = threading.Thread(target=device.send_once)
+    drainer = threading.Thread(target=drain)
+    sender.start()
+    drainer.start()
+    sender.join()
+    drainer.join()
+
+    assert len(drained) > 2
+    assert recorder.merged("batch", lambda *key: None)[None].count == len(drained)
+    # The two packets that fitted waited in the ingress; the rest waited in the sender's batch instead.
+    for packet, forwarded in drained[2:]:
+        assert packet.enqueued - packet.created >= 0.05
+        assert forwarded - packet.enqueued < 0.05
@@ -0,0 +1,78 @@
+import logging
+import re
+import urllib.request
+
+from metrics import CONTENT_TYPE, MetricsServer, render_metrics
+from packet import PACKET_POOL, PACKET_SIZE, TYPE1
+from topology import build_network, default_topology
+
+FAMILIES = {
+    "cbfc_port_credit_bits": "gauge",
+    "cbfc_port_buffer_bits": "gauge",
+    "cbfc_ingress_queue_depth": "gauge",
+    "cbfc_egress_queue_depth": "gauge",
+    "cbfc_device_queue_depth": "gauge",
+    "cbfc_packets_forwarded_total": "counter",
+    "cbfc_packets_requeued_total": "counter",
+    "cbfc_packets_dropped_total": "counter",
+    "cbfc_signals_sent_total": "counter",
+    "cbfc_device_rate_packets": "gauge",
+}
+SAMPLE = re.compile(r'^([a-z_]+)(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?\d+(\.\d+)?$')
+
+
+def small_network():
+    logger = logging.getLogger("MetricsTestLogger")
+    logger.propagate = False
+    switch, devices = build_network(default_topology(), logger, logger, 2, 4, 3, 1)
+    # Three packets from Device 2 to Device 1 reach the switch and are forwarded.
+    devices[1].switch_queue.put_many([PACKET_POOL.acquire(index, PACKET_SIZE, 2, 1, TYPE1) for index in range(3)])
+    switch.listen_once()
+    return switch, devices
+
+
+def parse(text):
+    families = {}
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            families[name] = kind
+        elif not line.startswith("# HELP "):
+            match = SAMPLE.match(line)
+            assert match, line
+            assert match.group(1) in families, line
+            samples[line.rsplit(" ", 1)[0]] = float(line.rsplit(" ", 1)[1])
+    return families, samples
+
+
+def test_every_family_is_rendered_in_text_format():
+    switch, devices = small_network()
+    text = render_metrics(switch, devices)
+    assert text.endswith("\n")
+    families, _ = parse(text)
+    assert families == FAMILIES
+    for name in families:
+        assert text.count(f"# HELP {name} ") == 1
+
+
+def test_samples_follow_the_switch():
+    switch, devices = small_network()
+    _, samples = parse(render_metrics(switch, devices))
+    assert samples["cbfc_packets_forwarded_total"] == 3
+    assert samples['cbfc_port_credit_bits{port="1"}'] == switch.buffer_sizes[1] - 3 * PACKET_SIZE
+    assert samples['cbfc_port_buffer_bits{port="4"}'] == switch.buffer_sizes[4]
+    assert samples['cbfc_device_queue_depth{device="1"}'] == 3
+    assert samples['cbfc_ingress_queue_depth{source="2"}'] == 0
+
+
+def test_server_serves_metrics_over_http():
+    switch, devices = small_network()
+    server = MetricsServer(lambda: (switch, devices), port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert response.read().decode() == render_metrics(switch, devices)
+    finally:
+        server.stop()
@@ -0,0 +1,50 @@
+import pytest
+
+from packet import (BACKPRESSURE, RESTORE, TYPE1, TYPE2, Packet, PacketPool, PacketType, Signal, SignalKind,
+                    signal)
+
+
+def test_packet_has_no_instance_dict():
+    packet = PacketPool().acquire(1, 512, 1, 2, TYPE1)
+    assert not hasattr(packet, "__dict__")
+    with pytest.raises(AttributeError):
+        packet.priority = 1
+
+
+def test_released_packet_is_reused_with_every_field_reset():
+    pool = PacketPool()
+    packet = pool.acquire(1, 512, 1, 2, TYPE1)
+    packet.created, packet.enqueued, packet.forwarded = 1.0, 2.0, 3.0
+    pool.release([packet])
+
+    reused = pool.acquire(7, 1024, 3, 4, TYPE2)
+    assert reused is packet
+    assert (reused.id, reused.size, reused.source, reused.target, reused.type) == (7, 1024, 3, 4, TYPE2)
+    assert (reused.created, reused.enqueued, reused.forwarded) == (0.0, 0.0, 0.0)
+    assert not pool.free
+
+
+def test_pool_stops_growing_at_its_limit():
+    pool = PacketPool(max_pooled=2)
+    pool.release([Packet() for _ in range(2)])
+    pool.release([Packet()])
+    assert len(pool.free) == 2
+    fresh = [pool.acquire(index, 512, 1, 2, TYPE1) for index in range(3)]
+    assert len({id(packet) for packet in fresh}) == 3
+
+
+def test_types_and_kinds_are_small_integers():
+    assert [int(packet_type) for packet_type in PacketType] == [0, 1, 2]
+    assert [int(kind) for kind in SignalKind] == [1, 2, 3]
+
+
+def test_cached_signals_are_shared_and_read_only():
+    message = signal(BACKPRESSURE, 2)
+    assert signal(BACKPRESSURE, 2) is message
+    assert signal(RESTORE, 2) is not message
+    assert isinstance(message, Signal)
+    with pytest.raises(AttributeError):
+        message.kind = RESTORE
+    with pytest.raises(AttributeError):
+        message.target = 3
+    assert (message.kind, message.target) == (BACKPRESSURE, 2)
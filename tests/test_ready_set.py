@@ -0,0 +1,41 @@
+import threading
+
+from channels import IngressQueue, ReadySet
+
+
+def test_put_marks_owner_on_ready_set():
+    ready = ReadySet()
+    first = IngressQueue(1, ready)
+    second = IngressQueue(2, ready)
+    second.put("x")
+    first.put("y")
+    assert len(ready) == 2
+    assert set(ready.take()) == {1, 2}
+    assert len(ready) == 0
+
+
+def test_owner_is_marked_once_however_often_it_puts():
+    ready = ReadySet()
+    channel = IngressQueue(1, ready)
+    for item in range(3):
+        channel.put(item)
+    assert list(ready.take()) == [1]
+
+
+def test_wake_ends_a_wait_without_marking():
+    ready = ReadySet()
+    assert not ready.wait(0.01)
+    ready.wake()
+    assert ready.wait(0.01)
+    assert ready.take() == {}
+    assert not ready.wait(0.01)
+
+
+def test_close_releases_a_waiting_consumer():
+    ready = ReadySet()
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(ready.wait(5)))
+    consumer.start()
+    ready.close()
+    consumer.join(1)
+    assert result == [True]
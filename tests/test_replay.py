@@ -0,0 +1,39 @@
+import pytest
+
+from controller import run_simulation
+from replay import run_replay
+from traffic_record import FILE_HEADER, INGRESS_RECORD, MAGIC, read_run
+
+DURATION = 3
+
+
+def count_forwarded(log_path):
+    with open(log_path) as f:
+        return sum("sent. Remaining buffer" in line for line in f)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    run_simulation(1, 1, 1, DURATION, engine=2, log_dir=str(tmp_path), record_path=str(tmp_path / "ingress.rec"))
+    return tmp_path / "ingress.rec"
+
+
+def test_recording_keeps_the_run_parameters(recording):
+    assert read_run(str(recording)) == (DURATION, 1, 1)
+
+
+def test_replay_defaults_to_the_recorded_run(recording, tmp_path):
+    # The run's last seconds can be idle at the ingress; they still have to be replayed.
+    (tmp_path / "replay").mkdir()
+    forwarded, _ = run_replay(str(recording), log_dir=str(tmp_path / "replay"))
+    assert forwarded == count_forwarded(tmp_path / "simulation.log")
+
+
+def test_version_1_recording_needs_a_duration(tmp_path):
+    path = tmp_path / "old.rec"
+    path.write_bytes(FILE_HEADER.pack(MAGIC, 1) + INGRESS_RECORD.pack(0.0, 1234, 1, 2, 1, 512))
+    assert read_run(str(path)) is None
+    with pytest.raises(ValueError):
+        run_replay(str(path), log_dir=str(tmp_path))
+    forwarded, _ = run_replay(str(path), DURATION=1, log_dir=str(tmp_path))
+    assert forwarded == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from packet import PACKET_POOL, PACKET_SIZE, TYPE1, TYPE2, PacketType
+from scheduling import DeficitRoundRobin, PriorityBuckets
+
+
+def make_packet(packet_id, source, packet_type, size=PACKET_SIZE):
+    return PACKET_POOL.acquire(packet_id, size, source, 9, packet_type)
+
+
+def drain(scheduler):
+    order = []
+    while scheduler:
+        order.append(scheduler.pop())
+    return order
+
+
+def test_drr_shares_by_weight():
+    scheduler = DeficitRoundRobin({TYPE1: 2, TYPE2: 1})
+    for index in range(6):
+        scheduler.push(1, make_packet(index, 1, TYPE1))
+        scheduler.push(2, make_packet(100 + index, 2, TYPE2))
+    types = [packet.type for _, packet in drain(scheduler)]
+    assert types[:9] == [TYPE1, TYPE1, TYPE2] * 3
+    assert len(types) == 12
+
+
+def test_drr_head_is_stable_until_pop():
+    scheduler = DeficitRoundRobin()
+    scheduler.push(1, make_packet(1, 1, TYPE2))
+    scheduler.push(2, make_packet(2, 2, TYPE1))
+    first = scheduler.head()
+    assert scheduler.head()[1] is first[1]
+    assert scheduler.pop()[1] is first[1]
+    assert len(scheduler) == 1
+
+
+def test_drr_large_packet_waits_for_enough_deficit():
+    scheduler = DeficitRoundRobin({TYPE1: 1, TYPE2: 1})
+    scheduler.push(1, make_packet(1, 1, TYPE1, size=3 * PACKET_SIZE))
+    for index in range(4):
+        scheduler.push(2, make_packet(10 + index, 2, TYPE2))
+    ids = [packet.id for _, packet in drain(scheduler)]
+    # TYPE1 needs three turns of credit, so TYPE2 sends one packet per turn meanwhile.
+    assert ids == [10, 11, 1, 12, 13]
+
+
+@pytest.mark.parametrize("weights, quantum", [({TYPE1: 0, TYPE2: 1}, PACKET_SIZE),
+                                              ({TYPE1: -1}, PACKET_SIZE),
+                                              ({TYPE1: 1}, 0)])
+def test_drr_rejects_non_positive_weight_or_quantum(weights, quantum):
+    with pytest.raises(ValueError):
+        DeficitRoundRobin(weights, quantum)
+
+
+def test_strict_buckets_serve_higher_priority_first():
+    scheduler = PriorityBuckets()
+    scheduler.push(1, make_packet(1, 1, TYPE2))
+    scheduler.push(1, make_packet(2, 1, TYPE1))
+    scheduler.push(2, make_packet(3, 2, TYPE2))
+    scheduler.push(2, make_packet(4, 2, TYPE1))
+    assert [packet.id for _, packet in drain(scheduler)] == [2, 4, 1, 3]
+
+
+def test_non_strict_buckets_serve_in_arrival_order():
+    scheduler = PriorityBuckets(strict=False)
+    for packet_id, packet_type in [(1, TYPE2), (2, TYPE1), (3, TYPE2), (4, TYPE1)]:
+        scheduler.push(1, make_packet(packet_id, 1, packet_type))
+    assert [packet.id for _, packet in drain(scheduler)] == [1, 2, 3, 4]
+
+
+def test_sources_take_turns_within_a_bucket():
+    scheduler = PriorityBuckets()
+    for index in range(3):
+        scheduler.push(1, make_packet(index, 1, TYPE1))
+    scheduler.push(2, make_packet(10, 2, TYPE1))
+    scheduler.push(3, make_packet(20, 3, TYPE1))
+    assert [source for source, _ in drain(scheduler)] == [1, 2, 3, 1, 1]
+
+
+def test_unlisted_class_goes_to_last_bucket():
+    scheduler = PriorityBuckets({TYPE1: 0, TYPE2: 1})
+    scheduler.push(1, make_packet(1, 1, PacketType.UNKNOWN))
+    scheduler.push(1, make_packet(2, 1, TYPE1))
+    assert scheduler.head()[1].id == 2
+    assert len(scheduler) == 2
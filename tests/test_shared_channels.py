@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from packet import PACKET_POOL, TYPE1
+from shared_channels import PACKET_CODEC, PACKET_RECORD, SIGNAL_RECORD, RingChannel, SharedRing, allocate
+
+
+@pytest.fixture
+def make_ring():
+    blocks = []
+
+    def make(record, capacity):
+        memory, (view,) = allocate([SharedRing.nbytes(record, capacity)])
+        blocks.append((memory, view))
+        return SharedRing(view, record, capacity, threading.Lock())
+
+    yield make
+    for memory, view in blocks:
+        view.release()
+        memory.close()
+        memory.unlink()
+
+
+def test_push_many_stops_at_capacity(make_ring):
+    ring = make_ring(SIGNAL_RECORD, 3)
+    assert ring.push_many([(1, 1), (2, 2), (1, 3), (2, 4)]) == 3
+    assert len(ring) == 3
+    assert ring.pop_many() == [(1, 1), (2, 2), (1, 3)]
+    assert len(ring) == 0
+
+
+def test_records_wrap_around_the_ring(make_ring):
+    ring = make_ring(SIGNAL_RECORD, 4)
+    received = []
+    for start in range(0, 30, 3):
+        assert ring.push_many([(1, start), (2, start + 1), (3, start + 2)]) == 3
+        received += ring.pop_many(max_items=2)
+        received += ring.pop_many()
+    assert [target for _, target in received] == list(range(30))
+
+
+def test_pop_many_without_consume_peeks(make_ring):
+    ring = make_ring(SIGNAL_RECORD, 4)
+    ring.push_many([(1, 7), (2, 8)])
+    assert ring.pop_many(consume=False) == [(1, 7), (2, 8)]
+    assert ring.pop_many(max_items=1) == [(1, 7)]
+    assert len(ring) == 1
+
+
+def test_channel_round_trips_packets(make_ring):
+    channel = RingChannel(1, make_ring(PACKET_RECORD, 8), PACKET_CODEC)
+    packet = PACKET_POOL.acquire(42, 512, 1, 2, TYPE1)
+    packet.created, packet.enqueued, packet.forwarded = 1.5, 2.5, 3.5
+    assert channel.put_many([packet]) == 1
+    (received,) = channel.get_all()
+    assert (received.id, received.size, received.source, received.target, received.type) == (42, 512, 1, 2, TYPE1)
+    assert (received.created, received.enqueued, received.forwarded) == (1.5, 2.5, 3.5)
+
+
+def test_snapshot_leaves_the_pool_alone(make_ring):
+    channel = RingChannel(1, make_ring(PACKET_RECORD, 8), PACKET_CODEC)
+    channel.put_many([PACKET_POOL.acquire(index, 512, 1, 2, TYPE1) for index in range(3)])
+    PACKET_POOL.release([PACKET_POOL.acquire(99, 512, 1, 2, TYPE1)])
+    pooled = len(PACKET_POOL.free)
+    assert [packet.id for packet in channel.snapshot()] == [0, 1, 2]
+    assert len(PACKET_POOL.free) == pooled
+    assert channel.qsize() == 3
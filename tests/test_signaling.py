@@ -0,0 +1,91 @@
+import logging
+import sys
+import threading
+
+from event_trace import CREDIT_RESTORED
+from packet import BACKPRESSURE, CRITICAL_BACKPRESSURE, PACKET_POOL, PACKET_SIZE, RESTORE, TYPE1, CreditUpdate
+from signaling import CLEAR_AT, CONGESTED_BELOW
+from topology import build_network, default_topology
+
+
+def expected_states(credit, capacity):
+    # Between the two thresholds either state is right, depending on where the port came from.
+    if credit <= 0:
+        return {CRITICAL_BACKPRESSURE}
+    if credit < CONGESTED_BELOW * capacity:
+        return {BACKPRESSURE}
+    if credit >= CLEAR_AT * capacity:
+        return {RESTORE}
+    return {BACKPRESSURE, RESTORE}
+
+
+class InterleavingTrace:
+    # Runs `between` once, right after the restorer has credited a port and before it updates the signaler.
+    def __init__(self):
+        self.between = None
+
+    def record(self, event, *args):
+        if event == CREDIT_RESTORED and self.between is not None:
+            between, self.between = self.between, None
+            between()
+
+
+def make_switch(tracer=None):
+    logger = logging.getLogger("SignalingTestLogger")
+    logger.propagate = False
+    return build_network(default_topology(), logger, logger, 1, 1, 1, 1, tracer=tracer)[0]
+
+
+def fill_port(switch, port):
+    for index in range(switch.buffer_sizes[port] // PACKET_SIZE):
+        switch.output_queues[port].push(2, PACKET_POOL.acquire(index, PACKET_SIZE, 2, port, TYPE1))
+    switch.serve([port])
+
+
+def test_debit_between_restore_and_update_is_not_overwritten():
+    tracer = InterleavingTrace()
+    switch = make_switch(tracer)
+    port = 1
+    fill_port(switch, port)
+    switch.signaler.flush()
+    assert switch.signaler.announced[port] == CRITICAL_BACKPRESSURE
+
+    # The listener drains the port again while the restorer is between its credit and its update.
+    tracer.between = lambda: fill_port(switch, port)
+    switch.apply_credit_updates([CreditUpdate(port, switch.buffer_sizes[port])])
+    assert switch.credits[port] == 0
+    assert switch.signaler.state[port] == CRITICAL_BACKPRESSURE
+    assert switch.signaler.announced[port] == CRITICAL_BACKPRESSURE
+
+
+def test_state_follows_final_credit_when_debits_and_restores_race():
+    switch = make_switch()
+    port = 1
+    capacity = switch.buffer_sizes[port]
+    rounds = 2000
+
+    def send():
+        for index in range(rounds):
+            switch.output_queues[port].push(2, PACKET_POOL.acquire(index, PACKET_SIZE, 2, port, TYPE1))
+            switch.serve([port])
+            switch.signaler.flush()
+
+    def restore():
+        for _ in range(rounds):
+            switch.apply_credit_updates([CreditUpdate(port, PACKET_SIZE)])
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=send), threading.Thread(target=restore)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    credit = switch.credits[port]
+    assert 0 <= credit <= capacity
+    assert switch.signaler.state.get(port, RESTORE) in expected_states(credit, capacity)
+    assert switch.signaler.announced.get(port, RESTORE) == switch.signaler.state.get(port, RESTORE)
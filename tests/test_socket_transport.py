@@ -0,0 +1,40 @@
+import socket
+
+from packet import BACKPRESSURE, PACKET_POOL, TYPE2, CreditUpdate, signal
+from socket_transport import (CREDIT_FRAME, FRAME, PACKET_FRAME, SIGNAL_FRAME, SocketLink, decode_packet,
+                              encode_credit, encode_packet, encode_signal)
+
+
+def test_packet_frame_round_trip():
+    packet = PACKET_POOL.acquire(1 << 40, 512, 3, 4, TYPE2)
+    packet.created, packet.enqueued, packet.forwarded = 10.25, 10.5, 11.0
+    frame = FRAME.unpack(FRAME.pack(*encode_packet(packet)))
+    assert frame[0] == PACKET_FRAME
+    received = decode_packet(frame)
+    assert (received.id, received.size, received.source, received.target, received.type) == (1 << 40, 512, 3, 4, TYPE2)
+    assert (received.created, received.enqueued, received.forwarded) == (10.25, 10.5, 11.0)
+
+
+def test_signal_and_credit_frames_round_trip():
+    frame = FRAME.unpack(FRAME.pack(*encode_signal(signal(BACKPRESSURE, 2))))
+    assert (frame[0], frame[1], frame[4]) == (SIGNAL_FRAME, BACKPRESSURE, 2)
+    frame = FRAME.unpack(FRAME.pack(*encode_credit(CreditUpdate(5, 4096))))
+    assert (frame[0], frame[4], frame[5]) == (CREDIT_FRAME, 5, 4096)
+
+
+def test_link_keeps_partial_frames_for_the_next_receive():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        sender = socket.create_connection(server.getsockname())
+        link = SocketLink(server.accept()[0])
+    frames = [encode_credit(CreditUpdate(1, amount)) for amount in range(3)]
+    data = b"".join(FRAME.pack(*fields) for fields in frames)
+    received = []
+    # Split mid-frame, so each receive sees the end of one frame and the start of the next.
+    for start in range(0, len(data), FRAME.size + 7):
+        sender.sendall(data[start:start + FRAME.size + 7])
+        while len(received) < min(3, (start + FRAME.size + 7) // FRAME.size):
+            received += link.receive()
+    sender.close()
+    assert link.receive() is None
+    link.close()
+    assert [tuple(frame) for frame in received] == frames
@@ -0,0 +1,99 @@
+import json
+
+from channels import ReadySet, IngressQueue
+from device import Device, TRANSMISSION_RATES, device_rng
+from switch import Switch, BUFFER_SIZES, PROCESS_RATE
+
+# Packets a device's ingress channel holds before its sends block; the discrete-event engine, which cannot
+# block, passes 0 (unbounded).
+INGRESS_CAPACITY = 4096
+
+
+class Topology:
+    def __init__(self, buffer_sizes, transmission_rates, process_rates=None):
+        self.buffer_sizes = dict(buffer_sizes)
+        self.device_ids = list(self.buffer_sizes)
+        self.transmission_rates = {device_id: dict(transmission_rates.get(device_id, {}))
+                                   for device_id in self.device_ids}
+        if process_rates is None:
+            process_rates = {}
+        self.process_rates = {device_id: process_rates.get(device_id, PROCESS_RATE) for device_id in self.device_ids}
+
+        self.senders = {device_id: {} for device_id in self.device_ids}
+        for source_device, rates in self.transmission_rates.items():
+            for target_device, rate in rates.items():
+                if target_device not in self.senders:
+                    raise ValueError(f"Device {source_device} transmits to unknown Device {target_device}.")
+                if target_device == source_device:
+                    raise ValueError(f"Device {source_device} cannot transmit to itself.")
+                self.senders[target_device][source_device] = rate
+
+    def __len__(self):
+        return len(self.device_ids)
+
+
+def default_topology():
+    return Topology(BUFFER_SIZES, TRANSMISSION_RATES, {device_id: PROCESS_RATE for device_id in BUFFER_SIZES})
+
+
+def uniform_topology(num_devices, buffer_size=8 * 1024 * 8, rate=10, fanout=3, process_rate=PROCESS_RATE):
+    # Device i sends to the next `fanout` devices (wrapping around), which keeps the rate
+    # matrix sparse enough to model thousands of ports.
+    device_ids = list(range(1, num_devices + 1))
+    fanout = min(fanout, num_devices - 1)
+    transmission_rates = {
+        device_id: {device_ids[(index + step) % num_devices]: rate for step in range(1, fanout + 1)}
+        for index, device_id in enumerate(device_ids)
+    }
+    return Topology({device_id: buffer_size for device_id in device_ids}, transmission_rates,
+                    {device_id: process_rate for device_id in device_ids})
+
+
+def load_topology(path):
+    with open(path) as f:
+        config = json.load(f)
+
+    if "uniform" in config:
+        return uniform_topology(**config["uniform"])
+
+    default_process_rate = config.get("process_rate", PROCESS_RATE)
+    buffer_sizes = {}
+    transmission_rates = {}
+    process_rates = {}
+    for key, device_config in config["devices"].items():
+        device_id = int(key)
+        buffer_sizes[device_id] = device_config["buffer_size"]
+        transmission_rates[device_id] = {int(target): rate for target, rate in device_config.get("rates", {}).items()}
+        process_rates[device_id] = device_config.get("process_rate", default_process_rate)
+    return Topology(buffer_sizes, transmission_rates, process_rates)
+
+
+def build_network(topology, simulation_logger, memory_logger, STATE, RATIO, PRIORITY_OPTION, DURATION,
+                  signal_ready=None, tracer=None, latency=None, class_weights=None,
+                  check_credit=False, ingress_capacity=INGRESS_CAPACITY, ingress_ready=None, credit_ready=None,
+                  seed=None, recorder=None):
+    # The ready sets default to thread-based ones; an engine that waits differently passes its own.
+    if ingress_ready is None:
+        ingress_ready = ReadySet()
+    incoming_queues = {device_id: IngressQueue(device_id, ingress_ready, ingress_capacity)
+                       for device_id in topology.device_ids}
+    credit_updates = IngressQueue("switch", credit_ready)
+
+    devices = [
+        Device(device_id, incoming_queues[device_id], memory_logger, RATIO, DURATION,
+               transmission_rates=topology.transmission_rates[device_id],
+               process_rate=topology.process_rates[device_id], latency=latency, credit_queue=credit_updates,
+               rng=device_rng(seed, device_id))
+        for device_id in topology.device_ids
+    ]
+
+    if signal_ready is not None:
+        for device in devices:
+            device.control_signals = IngressQueue(device.device_id, signal_ready)
+
+    outgoing_queues = {device.device_id: device.received_packets for device in devices}
+    control_queues = {device.device_id: device.control_signals for device in devices}
+    switch = Switch(incoming_queues, outgoing_queues, control_queues, simulation_logger, STATE, PRIORITY_OPTION,
+                    topology=topology, tracer=tracer, latency=latency, class_weights=class_weights,
+                    check_credit=check_credit, credit_updates=credit_updates, recorder=recorder)
+    return switch, devices
@@ -0,0 +1,85 @@
+import struct
+import time
+
+# One record per packet taken from the switch ingress: seconds since the recording started, packet id,
+# source, target, packet type and size in bits.
+INGRESS_RECORD = struct.Struct("<dqIIBI")
+MAGIC = b"CBFINGRS"
+FILE_HEADER = struct.Struct("<8sB")
+# Since version 2 the file header is followed by the recorded run's DURATION, STATE and PRIORITY_OPTION.
+RUN_HEADER = struct.Struct("<IBB")
+VERSION = 2
+FLUSH_BYTES = 1 << 16
+
+
+class IngressRecorder:
+    # Captures the exact sequence the switch takes from its ingress, batch by batch, in a compact binary
+    # file that replay.py can feed back into a switch. Only the listening thread records, so no lock is
+    # taken; records are packed into a buffer that is written out every FLUSH_BYTES.
+    def __init__(self, path, DURATION, STATE, PRIORITY_OPTION, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.records = 0
+        self.buffer = bytearray()
+        self.file = open(path, "wb")
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION) + RUN_HEADER.pack(DURATION, STATE, PRIORITY_OPTION))
+
+    def record(self, source, packets):
+        if not packets:
+            return
+        elapsed = self.clock() - self.start
+        pack = INGRESS_RECORD.pack
+        for packet in packets:
+            self.buffer += pack(elapsed, packet.id, source, packet.target, packet.type, packet.size)
+        self.records += len(packets)
+        if len(self.buffer) >= FLUSH_BYTES:
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.file.close()
+
+
+def read_header(f, path):
+    # Returns the recorded (DURATION, STATE, PRIORITY_OPTION), or None for a version 1 recording.
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError(f"{path} is not an ingress recording.")
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC or not 1 <= version <= VERSION:
+        raise ValueError(f"{path} is not a version 1 to {VERSION} ingress recording.")
+    if version == 1:
+        return None
+    run = f.read(RUN_HEADER.size)
+    if len(run) < RUN_HEADER.size:
+        raise ValueError(f"{path} ends in a truncated header.")
+    return RUN_HEADER.unpack(run)
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        return read_header(f, path)
+
+
+def read_ingress(path):
+    # Yields (time, packet id, source, target, packet type, size) in recorded order.
+    with open(path, "rb") as f:
+        read_header(f, path)
+        data = f.read()
+    if len(data) % INGRESS_RECORD.size:
+        raise ValueError(f"{path} ends in a truncated record.")
+    yield from INGRESS_RECORD.iter_unpack(data)
+
+
+def read_batches(path):
+    # Groups consecutive records taken from the same source at the same moment back into the batch
+    # the switch drained: a list of (time, source, [(packet id, target, packet type, size), ...]).
+    batches = []
+    for when, packet_id, source, target, packet_type, size in read_ingress(path):
+        if not batches or batches[-1][0] != when or batches[-1][1] != source:
+            batches.append((when, source, []))
+        batches[-1][2].append((packet_id, target, packet_type, size))
+    return batches